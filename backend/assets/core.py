@@ -0,0 +1,181 @@
+import asyncio
+import base64
+import hashlib
+import re
+from botocore.exceptions import ClientError
+from config import (
+    ASSET_STORE_DIR,
+    ASSET_STORE_MAX_BYTES,
+    BEDROCK_ACCESS_KEY,
+    BEDROCK_SECRET_KEY,
+    IMAGE_OUPUT_S3_BUCKET,
+)
+from image_generation.core import get_s3_client
+from image_generation.local_store import LocalImageStore
+
+# Uploaded screenshots and videos are stored by content hash and referenced
+# by handles of the form "asset:<sha256>.<extension>"
+ASSET_HANDLE_PREFIX = "asset:"
+
+# With an S3 bucket (as on ECS, where a client's upload and its generation can
+# reach different tasks), assets are stored in S3 under this prefix and the
+# local store only caches them
+ASSET_S3_PREFIX = "assets/"
+
+ASSET_EXTENSIONS = {
+    "image/png": "png",
+    "image/jpeg": "jpg",
+    "image/webp": "webp",
+    "image/gif": "gif",
+    "video/mp4": "mp4",
+    "video/webm": "webm",
+    "video/quicktime": "mov",
+}
+ASSET_MIME_TYPES = {extension: mime_type for mime_type, extension in ASSET_EXTENSIONS.items()}
+
+ASSET_NAME_PATTERN = re.compile(r"^[0-9a-f]{64}\.[a-z0-9]+$")
+
+
+class AssetNotFound(Exception):
+    pass
+
+
+asset_store = LocalImageStore(ASSET_STORE_DIR, ASSET_STORE_MAX_BYTES, log_tag="ASSET STORE")
+
+
+def bytes_to_data_url(data: bytes, mime_type: str) -> str:
+    base64_data = base64.b64encode(data).decode("utf-8")
+    return f"data:{mime_type};base64,{base64_data}"
+
+
+def is_asset_handle(value: str) -> bool:
+    return value.startswith(ASSET_HANDLE_PREFIX)
+
+
+def is_valid_asset_name(name: str) -> bool:
+    return bool(ASSET_NAME_PATTERN.match(name)) and name.split(".")[1] in ASSET_MIME_TYPES
+
+
+def get_asset_mime_type(name: str) -> str:
+    return ASSET_MIME_TYPES[name.split(".")[1]]
+
+
+def get_asset_name(handle: str) -> str:
+    name = handle[len(ASSET_HANDLE_PREFIX) :]
+    if not is_asset_handle(handle) or not is_valid_asset_name(name):
+        raise AssetNotFound(handle)
+    return name
+
+
+def get_asset_s3_client():
+    return get_s3_client(BEDROCK_ACCESS_KEY or None, BEDROCK_SECRET_KEY or None)
+
+
+# Blocking; returns None if the asset isn't in S3
+def s3_get_asset(name: str) -> bytes | None:
+    try:
+        response = get_asset_s3_client().get_object(Bucket=IMAGE_OUPUT_S3_BUCKET, Key=ASSET_S3_PREFIX + name)  # type: ignore
+    except ClientError as e:
+        if e.response.get("Error", {}).get("Code") in ("NoSuchKey", "404"):
+            return None
+        raise
+    return response["Body"].read()  # type: ignore
+
+
+def s3_put_asset(name: str, data: bytes) -> None:
+    get_asset_s3_client().put_object(  # type: ignore
+        Bucket=IMAGE_OUPUT_S3_BUCKET,
+        Key=ASSET_S3_PREFIX + name,
+        Body=data,
+        ContentType=get_asset_mime_type(name),
+    )
+
+
+def save_asset(data: bytes, mime_type: str) -> str:
+    """
+    Stores the asset (unless it's already stored) and returns its handle.
+    Raises ValueError for unsupported types. Blocking.
+    """
+    extension = ASSET_EXTENSIONS.get(mime_type.split(";")[0].strip())
+    if extension is None:
+        raise ValueError(f"Unsupported asset type: {mime_type}")
+    name = f"{hashlib.sha256(data).hexdigest()}.{extension}"
+    if asset_store.exists(name):
+        # Cached assets were written to S3 (or read from it) first
+        asset_store.touch(name)
+    else:
+        if IMAGE_OUPUT_S3_BUCKET != "":
+            s3_put_asset(name, data)
+        asset_store.write(name, data)
+    return ASSET_HANDLE_PREFIX + name
+
+
+async def store_asset(data: bytes, mime_type: str) -> str:
+    return await asyncio.to_thread(save_asset, data, mime_type)
+
+
+def save_data_url(value: str) -> str:
+    """
+    Stores a data URL's content and returns its handle (handles and other
+    values are returned unchanged). Raises ValueError for unsupported types.
+    """
+    if not value.startswith("data:"):
+        return value
+    header, _, base64_data = value.partition(",")
+    mime_type = header[len("data:") :].split(";")[0]
+    return save_asset(base64.b64decode(base64_data), mime_type)
+
+
+async def store_data_url(value: str) -> str:
+    return await asyncio.to_thread(save_data_url, value)
+
+
+# Reads an asset from the local store, or from S3 (caching it locally) if it
+# isn't there. Raises AssetNotFound if it's in neither. Blocking.
+def load_asset(name: str) -> bytes:
+    try:
+        return asset_store.read(name)
+    except FileNotFoundError:
+        # Not cached here, or evicted by another thread since
+        pass
+    data = s3_get_asset(name) if IMAGE_OUPUT_S3_BUCKET != "" else None
+    if data is None:
+        raise AssetNotFound(ASSET_HANDLE_PREFIX + name)
+    asset_store.write(name, data)
+    return data
+
+
+# Path of the stored file, for readers that can take a file directly (e.g.
+# ffmpeg). Blocking, since the asset may have to be fetched from S3.
+def get_asset_path(handle: str) -> str:
+    name = get_asset_name(handle)
+    if asset_store.exists(name):
+        asset_store.touch(name)
+    else:
+        load_asset(name)
+    return asset_store.path(name)
+
+
+# The content of an asset handle or a data URL. Prompts keep the handles, and
+# this is only called when the model request is built. Raises AssetNotFound
+# for unknown handles. Blocking.
+def load_asset_or_data_url(value: str) -> bytes:
+    if is_asset_handle(value):
+        return load_asset(get_asset_name(value))
+    return base64.b64decode(value.split(",", 1)[-1])
+
+
+async def read_asset_or_data_url(value: str) -> bytes:
+    return await asyncio.to_thread(load_asset_or_data_url, value)
+
+
+# Hash of an asset's content, the same whether it's given as a handle or a data URL
+def get_asset_hash(value: str) -> str:
+    if is_asset_handle(value):
+        return value[len(ASSET_HANDLE_PREFIX) :].split(".")[0]
+    base64_data = value.split(",", 1)[-1]
+    try:
+        data = base64.b64decode(base64_data)
+    except ValueError:
+        data = value.encode()
+    return hashlib.sha256(data).hexdigest()
@@ -0,0 +1,115 @@
+import io
+import os
+import tempfile
+import unittest
+from unittest import mock
+from botocore.exceptions import ClientError
+from assets.core import (
+    AssetNotFound,
+    bytes_to_data_url,
+    get_asset_path,
+    get_asset_hash,
+    is_valid_asset_name,
+    read_asset_or_data_url,
+    store_asset,
+    store_data_url,
+)
+from image_generation.local_store import LocalImageStore
+
+
+class FakeS3Client:
+    def __init__(self):
+        self.objects: dict[str, bytes] = {}
+
+    def put_object(self, Bucket: str, Key: str, Body: bytes, ContentType: str):
+        self.objects[Key] = Body
+
+    def get_object(self, Bucket: str, Key: str):
+        if Key not in self.objects:
+            raise ClientError({"Error": {"Code": "NoSuchKey"}}, "GetObject")
+        return {"Body": io.BytesIO(self.objects[Key])}
+
+
+class TestAssets(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalImageStore(self.directory.name, max_bytes=1000)
+        self.patcher = mock.patch("assets.core.asset_store", self.store)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.directory.cleanup()
+
+    async def test_round_trips_asset_by_handle(self):
+        handle = await store_asset(b"png bytes", "image/png")
+        self.assertRegex(handle, r"^asset:[0-9a-f]{64}\.png$")
+        self.assertEqual(await store_asset(b"png bytes", "image/png"), handle)
+        self.assertEqual(await read_asset_or_data_url(handle), b"png bytes")
+
+    async def test_accepts_mime_type_parameters(self):
+        handle = await store_asset(b"video", "video/webm;codecs=vp9")
+        self.assertTrue(handle.endswith(".webm"))
+
+    async def test_rejects_unsupported_types(self):
+        with self.assertRaises(ValueError):
+            await store_asset(b"text", "text/html")
+
+    async def test_unknown_handle(self):
+        with self.assertRaises(AssetNotFound):
+            await read_asset_or_data_url("asset:" + "0" * 64 + ".png")
+        with self.assertRaises(AssetNotFound):
+            await read_asset_or_data_url("asset:../config.py")
+
+    async def test_reads_data_urls(self):
+        data_url = bytes_to_data_url(b"png bytes", "image/png")
+        self.assertEqual(await read_asset_or_data_url(data_url), b"png bytes")
+
+    async def test_hash_is_the_same_for_handle_and_data_url(self):
+        handle = await store_asset(b"png bytes", "image/png")
+        self.assertEqual(
+            get_asset_hash(handle), get_asset_hash(bytes_to_data_url(b"png bytes", "image/png"))
+        )
+
+    async def test_stores_data_urls_as_handles(self):
+        handle = await store_data_url(bytes_to_data_url(b"png bytes", "image/png"))
+        self.assertEqual(handle, await store_asset(b"png bytes", "image/png"))
+        self.assertEqual(await store_data_url(handle), handle)
+        self.assertEqual(await store_data_url(""), "")
+        with self.assertRaises(ValueError):
+            await store_data_url(bytes_to_data_url(b"<svg/>", "image/svg+xml"))
+
+    async def test_evicted_asset_is_not_found(self):
+        handle = await store_asset(b"png bytes", "image/png")
+        # Evicted by another thread after the lookup
+        os.remove(self.store.path(handle[len("asset:") :]))
+        with self.assertRaises(AssetNotFound):
+            await read_asset_or_data_url(handle)
+
+    async def test_shares_assets_through_s3(self):
+        s3_client = FakeS3Client()
+        with (
+            mock.patch("assets.core.IMAGE_OUPUT_S3_BUCKET", "bucket"),
+            mock.patch("assets.core.get_asset_s3_client", return_value=s3_client),
+        ):
+            handle = await store_asset(b"png bytes", "image/png")
+            self.assertEqual(list(s3_client.objects.values()), [b"png bytes"])
+
+            # Another task, without the asset in its local store
+            with tempfile.TemporaryDirectory() as directory:
+                other_store = LocalImageStore(directory, max_bytes=1000)
+                with mock.patch("assets.core.asset_store", other_store):
+                    self.assertEqual(await read_asset_or_data_url(handle), b"png bytes")
+                    self.assertTrue(os.path.exists(get_asset_path(handle)))
+                    with self.assertRaises(AssetNotFound):
+                        await read_asset_or_data_url("asset:" + "0" * 64 + ".png")
+
+    def test_valid_asset_names(self):
+        self.assertTrue(is_valid_asset_name("a" * 64 + ".mp4"))
+        self.assertFalse(is_valid_asset_name("a" * 64 + ".exe"))
+        self.assertFalse(is_valid_asset_name("../" + "a" * 61 + ".png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
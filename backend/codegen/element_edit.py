@@ -0,0 +1,255 @@
+import re
+from dataclasses import dataclass
+from html.parser import HTMLParser
+from typing import List, Tuple
+
+# Elements without an end tag
+VOID_ELEMENTS = {
+    "area", "base", "br", "col", "embed", "hr", "img", "input",
+    "link", "meta", "param", "source", "track", "wbr",
+}
+
+# Stacks whose generated code is the page markup itself (in the other stacks
+# the page is rendered by a framework, so DOM positions don't map to the code)
+ELEMENT_EDIT_STACKS = ["html_tailwind", "html_css", "bootstrap"]
+
+OUTLINE_MAX_DEPTH = 8
+OUTLINE_MAX_LINES = 200
+OUTLINE_MAX_TEXT = 40
+OUTLINE_MAX_CLASSES = 3
+
+# The frontend appends the selected element's outerHTML to the update
+# instruction after this text
+SELECTED_ELEMENT_MARKER = " referring to this element specifically: "
+
+
+@dataclass
+class Element:
+    tag: str
+    attrs: List[Tuple[str, str | None]]
+    # Path of child element indices from <body>, None outside of <body>
+    path: List[int] | None
+    depth: int
+    start: int
+    end: int = -1
+    text: str = ""
+
+
+@dataclass
+class ElementEdit:
+    html: str
+    element: Element
+    outline: str
+
+    @property
+    def element_html(self) -> str:
+        return self.html[self.element.start : self.element.end]
+
+
+class ElementLocator(HTMLParser):
+    """
+    Records the source span of every element in a document, and its path
+    from <body> as the browser would number it.
+    """
+
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=True)
+        self.html = html
+        # getpos() only counts "\n" as a line break (str.splitlines() also
+        # splits on characters such as "\x0c" and "\u2028")
+        self.line_offsets = [0]
+        for line in html.split("\n"):
+            self.line_offsets.append(self.line_offsets[-1] + len(line) + 1)
+
+        self.elements: List[Element] = []
+        self.stack: List[Element] = []
+        # Number of element children seen so far, per open element
+        self.child_counts: List[int] = []
+        self.valid = True
+
+        self.feed(html)
+        self.close()
+        if self.stack:
+            self.valid = False
+
+    def source_offset(self) -> int:
+        line, column = self.getpos()
+        return self.line_offsets[line - 1] + column
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str | None]]):
+        start = self.source_offset()
+        element = self._open(tag, attrs, start)
+        if tag in VOID_ELEMENTS:
+            element.end = start + len(self.get_starttag_text() or "")
+        else:
+            self.stack.append(element)
+            self.child_counts.append(0)
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, str | None]]):
+        start = self.source_offset()
+        element = self._open(tag, attrs, start)
+        element.end = start + len(self.get_starttag_text() or "")
+
+    def handle_endtag(self, tag: str):
+        if tag in VOID_ELEMENTS:
+            return
+        if not self.stack or self.stack[-1].tag != tag:
+            # Implied or misnested tags: positions can't be trusted
+            self.valid = False
+            return
+        element = self.stack.pop()
+        self.child_counts.pop()
+        end_tag_end = self.html.find(">", self.source_offset())
+        element.end = end_tag_end + 1
+
+    def handle_data(self, data: str):
+        if self.stack and not self.stack[-1].text:
+            self.stack[-1].text = " ".join(data.split())
+
+    def _open(self, tag: str, attrs: List[Tuple[str, str | None]], start: int) -> Element:
+        path = None
+        if self.stack and self.stack[-1].tag == "body":
+            path = [self.child_counts[-1]]
+        elif self.stack and self.stack[-1].path is not None:
+            path = self.stack[-1].path + [self.child_counts[-1]]
+        if self.child_counts:
+            self.child_counts[-1] += 1
+
+        element = Element(tag=tag, attrs=attrs, path=path, depth=len(self.stack), start=start)
+        self.elements.append(element)
+        return element
+
+
+class ElementSignature(HTMLParser):
+    """
+    The tags, attributes and text of a fragment, ignoring how the browser
+    serializes the DOM (quoting, entities, whitespace, void tags) and the
+    inline style that the select-and-edit highlight changes.
+    """
+
+    def __init__(self, html: str):
+        super().__init__(convert_charrefs=True)
+        self.items: List[Tuple[str, ...]] = []
+        self.feed(html)
+        self.close()
+
+    def handle_starttag(self, tag: str, attrs: List[Tuple[str, str | None]]):
+        attributes = sorted(f"{name}={value or ''}" for name, value in attrs if name != "style")
+        self.items.append(("start", tag, *attributes))
+
+    def handle_startendtag(self, tag: str, attrs: List[Tuple[str, str | None]]):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_ELEMENTS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag: str):
+        if tag not in VOID_ELEMENTS:
+            self.items.append(("end", tag))
+
+    def handle_data(self, data: str):
+        text = " ".join(data.split())
+        if text:
+            self.items.append(("text", text))
+
+
+def is_same_element(source_html: str, browser_html: str) -> bool:
+    return ElementSignature(source_html).items == ElementSignature(browser_html).items
+
+
+# The selected element's outerHTML, from an update instruction
+def get_selected_element_html(instruction: str) -> str | None:
+    if SELECTED_ELEMENT_MARKER not in instruction:
+        return None
+    return instruction.split(SELECTED_ELEMENT_MARKER, 1)[1]
+
+
+def find_element(html: str, path: List[int], tag_name: str) -> Element | None:
+    locator = ElementLocator(html)
+    if not locator.valid:
+        return None
+    for element in locator.elements:
+        if element.path == path:
+            return element if element.tag == tag_name and element.end > 0 else None
+    return None
+
+
+def describe_element(element: Element) -> str:
+    description = element.tag
+    attributes = dict(element.attrs)
+    if attributes.get("id"):
+        description += f"#{attributes['id']}"
+    classes = (attributes.get("class") or "").split()
+    if classes:
+        description += "." + ".".join(classes[:OUTLINE_MAX_CLASSES])
+        if len(classes) > OUTLINE_MAX_CLASSES:
+            description += "..."
+    if element.text:
+        text = element.text
+        if len(text) > OUTLINE_MAX_TEXT:
+            text = text[:OUTLINE_MAX_TEXT] + "..."
+        description += f' "{text}"'
+    return description
+
+
+# A compact, indented outline of the page body, so that the model knows where
+# the selected element sits without reading the whole document
+def build_page_outline(html: str, selected: Element) -> str:
+    locator = ElementLocator(html)
+    lines: List[str] = []
+    body_depth = None
+    for element in locator.elements:
+        if element.tag == "body":
+            body_depth = element.depth
+        if element.path is None or body_depth is None:
+            continue
+        depth = element.depth - body_depth - 1
+        if depth >= OUTLINE_MAX_DEPTH or element.tag in ("script", "style"):
+            continue
+        line = "  " * depth + describe_element(element)
+        if element.start == selected.start:
+            line += "  <-- selected element"
+        lines.append(line)
+
+    if len(lines) > OUTLINE_MAX_LINES:
+        lines = lines[:OUTLINE_MAX_LINES] + ["..."]
+    return "\n".join(lines)
+
+
+def get_element_edit(
+    html: str, path: List[int], tag_name: str, selected_html: str | None = None
+) -> ElementEdit | None:
+    """
+    Locates the selected element in the code. Nodes the browser inserts (e.g.
+    an implied <tbody>) or that scripts add shift the path, so if the
+    selected element's HTML is given, the element found has to match it.
+    """
+    element = find_element(html, path, tag_name)
+    if element is None:
+        return None
+    if selected_html is not None and not is_same_element(
+        html[element.start : element.end], selected_html
+    ):
+        return None
+    return ElementEdit(html=html, element=element, outline=build_page_outline(html, element))
+
+
+# The model is asked for the replacement element only, but may wrap it in a
+# markdown code block
+def extract_fragment(completion: str) -> str:
+    match = re.search(r"```(?:html)?\s*\n(.*?)```", completion, re.DOTALL)
+    if match:
+        completion = match.group(1)
+    return completion.strip()
+
+
+def apply_element_edit(edit: ElementEdit, completion: str) -> str | None:
+    """
+    Returns the document with the selected element replaced by the
+    completion, or None if the completion isn't a usable fragment.
+    """
+    fragment = extract_fragment(completion)
+    if not fragment.startswith("<") or "<html" in fragment or "<body" in fragment:
+        return None
+    if not ElementLocator(fragment).valid:
+        return None
+    return edit.html[: edit.element.start] + fragment + edit.html[edit.element.end :]
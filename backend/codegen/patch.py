@@ -0,0 +1,145 @@
+import re
+from dataclasses import dataclass
+from typing import Dict, List
+
+# Edits are written by the model as:
+#
+# <<<<<<< SEARCH
+# (exact lines from the current code)
+# =======
+# (lines to replace them with)
+# >>>>>>> REPLACE
+EDIT_BLOCK_PATTERN = re.compile(
+    r"<<<<<<< SEARCH\n(.*?)\n?=======\n(.*?)\n?>>>>>>> REPLACE", re.DOTALL
+)
+
+
+class PatchError(Exception):
+    pass
+
+
+@dataclass
+class Edit:
+    search: str
+    replace: str
+
+
+def parse_edits(text: str) -> List[Edit]:
+    return [Edit(search, replace) for search, replace in EDIT_BLOCK_PATTERN.findall(text)]
+
+
+def find_unique(code: str, search: str) -> tuple[int, int] | None:
+    start = code.find(search)
+    if start == -1 or code.find(search, start + 1) != -1:
+        return None
+    return start, start + len(search)
+
+
+# Models often get the indentation of the search lines slightly wrong, so fall
+# back to matching the lines with surrounding whitespace ignored
+def find_unique_ignoring_indentation(code: str, search: str) -> tuple[int, int] | None:
+    search_lines = [line.strip() for line in search.strip("\n").split("\n")]
+    code_lines = code.split("\n")
+    line_offsets = [0]
+    for line in code_lines:
+        line_offsets.append(line_offsets[-1] + len(line) + 1)
+
+    matches = [
+        i
+        for i in range(len(code_lines) - len(search_lines) + 1)
+        if [line.strip() for line in code_lines[i : i + len(search_lines)]] == search_lines
+    ]
+    if len(matches) != 1:
+        return None
+    start = line_offsets[matches[0]]
+    end = line_offsets[matches[0] + len(search_lines)] - 1
+    return start, end
+
+
+def apply_edit(code: str, edit: Edit) -> str:
+    if not edit.search.strip():
+        raise PatchError("Empty search block")
+    span = find_unique(code, edit.search) or find_unique_ignoring_indentation(
+        code, edit.search
+    )
+    if span is None:
+        raise PatchError(f"Search block not found exactly once: {edit.search[:80]!r}")
+    start, end = span
+    return code[:start] + edit.replace + code[end:]
+
+
+class StreamingPatcher:
+    """
+    Applies edits to the code as soon as each edit block has been streamed.
+    After the first edit that doesn't apply, the remaining edits are ignored.
+    """
+
+    def __init__(self, code: str):
+        self.original_code = code
+        self.code = code
+        self.text = ""
+        self.parsed_until = 0
+        self.edits_applied = 0
+        self.error: PatchError | None = None
+
+    # Returns whether the code changed
+    def feed(self, chunk: str) -> bool:
+        self.text += chunk
+        changed = False
+        for match in EDIT_BLOCK_PATTERN.finditer(self.text, self.parsed_until):
+            self.parsed_until = match.end()
+            if self.error:
+                continue
+            try:
+                self.code = apply_edit(self.code, Edit(match.group(1), match.group(2)))
+                self.edits_applied += 1
+                changed = True
+            except PatchError as e:
+                self.error = e
+        return changed
+
+    def result(self) -> str:
+        """
+        Returns the patched code. Raises PatchError if an edit failed, no
+        edits were made, or the edits broke the document.
+        """
+        if self.error:
+            raise self.error
+        if self.edits_applied == 0:
+            raise PatchError("No edits in the response")
+        if "</html>" in self.original_code and "</html>" not in self.code:
+            raise PatchError("Edits removed the end of the document")
+        return self.code
+
+
+class UpdateStats:
+    """
+    Success rate, latency and output size of update turns per mode
+    ("patch" or "full"), to compare patch updates against full rewrites.
+    """
+
+    def __init__(self):
+        self.stats: Dict[str, Dict[str, float]] = {}
+
+    def record(self, mode: str, success: bool, seconds: float, output_chars: int) -> None:
+        stats = self.stats.setdefault(
+            mode, {"attempts": 0, "successes": 0, "total_seconds": 0.0, "total_output_chars": 0}
+        )
+        stats["attempts"] += 1
+        stats["successes"] += int(success)
+        stats["total_seconds"] += seconds
+        stats["total_output_chars"] += output_chars
+
+    def summary(self) -> Dict[str, Dict[str, float]]:
+        return {
+            mode: {
+                "attempts": stats["attempts"],
+                "success_rate": stats["successes"] / stats["attempts"],
+                "average_seconds": stats["total_seconds"] / stats["attempts"],
+                "average_output_chars": stats["total_output_chars"] / stats["attempts"],
+            }
+            for mode, stats in self.stats.items()
+        }
+
+
+update_stats = UpdateStats()
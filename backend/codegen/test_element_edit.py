@@ -0,0 +1,93 @@
+import unittest
+from codegen.element_edit import (
+    apply_element_edit,
+    extract_fragment,
+    find_element,
+    get_element_edit,
+    get_selected_element_html,
+)
+
+PAGE = """<!DOCTYPE html>
+<html>
+<head><script src="https://cdn.tailwindcss.com"></script></head>
+<body>
+  <header class="p-4"><h1>Title</h1></header>
+  <main>
+    <p class="text-sm">Hello <b>there</b><br></p>
+    <button class="btn">Old</button>
+    <img src="a.png" alt="A cat">
+  </main>
+</body>
+</html>"""
+
+
+class TestElementEdit(unittest.TestCase):
+
+    def test_finds_element_by_path(self):
+        element = find_element(PAGE, [1, 1], "button")
+        assert element is not None
+        self.assertEqual(PAGE[element.start : element.end], '<button class="btn">Old</button>')
+
+        element = find_element(PAGE, [1, 2], "img")
+        assert element is not None
+        self.assertEqual(PAGE[element.start : element.end], '<img src="a.png" alt="A cat">')
+
+    def test_rejects_mismatched_tag(self):
+        self.assertIsNone(find_element(PAGE, [1, 1], "div"))
+        self.assertIsNone(find_element(PAGE, [5], "div"))
+
+    def test_rejects_unbalanced_document(self):
+        self.assertIsNone(find_element("<html><body><ul><li>One<li>Two</ul></body></html>", [0], "ul"))
+
+    def test_outline_marks_selected_element(self):
+        edit = get_element_edit(PAGE, [1, 1], "button")
+        assert edit is not None
+        self.assertIn('  button.btn "Old"  <-- selected element', edit.outline)
+        self.assertIn('header.p-4', edit.outline)
+        self.assertNotIn("script", edit.outline)
+
+    def test_splices_fragment_into_page(self):
+        edit = get_element_edit(PAGE, [1, 1], "button")
+        assert edit is not None
+        updated = apply_element_edit(edit, '```html\n<button class="btn bg-red-500">New</button>\n```')
+        self.assertEqual(
+            updated,
+            PAGE.replace('<button class="btn">Old</button>', '<button class="btn bg-red-500">New</button>'),
+        )
+
+    def test_rejects_invalid_fragments(self):
+        edit = get_element_edit(PAGE, [1, 1], "button")
+        assert edit is not None
+        self.assertIsNone(apply_element_edit(edit, "Sure! Here is the button."))
+        self.assertIsNone(apply_element_edit(edit, "<html><body></body></html>"))
+        self.assertIsNone(apply_element_edit(edit, "<div><span>Unclosed</div>"))
+
+    def test_line_breaks_are_only_newlines(self):
+        page = "<html><body><p>a\x0cb</p>\n<div>x</div></body></html>"
+        element = find_element(page, [1], "div")
+        assert element is not None
+        self.assertEqual(page[element.start : element.end], "<div>x</div>")
+
+    def test_accepts_element_as_serialized_by_the_browser(self):
+        page = PAGE.replace("<b>there</b>", "<b title='a &amp; b'>there</b>")
+        selected_html = '<p class="text-sm" style="">Hello <b title="a &amp; b">there</b><br></p>'
+        self.assertIsNotNone(get_element_edit(page, [1, 0], "p", selected_html))
+
+    def test_rejects_element_that_does_not_match_the_selection(self):
+        # A script inserted an element at the top of the body, so the
+        # browser's path points at the next paragraph in the code
+        page = "<html><body><p>A</p><p>B</p><p>C</p></body></html>"
+        self.assertIsNone(get_element_edit(page, [2], "p", "<p>B</p>"))
+        self.assertIsNotNone(get_element_edit(page, [1], "p", "<p>B</p>"))
+
+    def test_selected_element_html_from_instruction(self):
+        instruction = "Make it red referring to this element specifically: <b>Hi</b>"
+        self.assertEqual(get_selected_element_html(instruction), "<b>Hi</b>")
+        self.assertIsNone(get_selected_element_html("Make it red"))
+
+    def test_extract_fragment_without_code_block(self):
+        self.assertEqual(extract_fragment("  <p>Hi</p>\n"), "<p>Hi</p>")
+
+
+if __name__ == "__main__":
+    unittest.main()
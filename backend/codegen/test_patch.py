@@ -0,0 +1,80 @@
+import unittest
+from codegen.patch import (
+    Edit,
+    PatchError,
+    StreamingPatcher,
+    UpdateStats,
+    apply_edit,
+    parse_edits,
+)
+
+CODE = """<html>
+<body>
+  <h1 class="text-xl">Title</h1>
+  <ul>
+    <li>One</li>
+    <li>Two</li>
+  </ul>
+</body>
+</html>"""
+
+
+def edit_block(search: str, replace: str) -> str:
+    return f"<<<<<<< SEARCH\n{search}\n=======\n{replace}\n>>>>>>> REPLACE\n"
+
+
+class TestPatch(unittest.TestCase):
+
+    def test_parse_edits(self):
+        text = "Here are the changes:\n" + edit_block("a", "b") + edit_block("c\nd", "")
+        self.assertEqual(parse_edits(text), [Edit("a", "b"), Edit("c\nd", "")])
+
+    def test_apply_exact_edit(self):
+        updated = apply_edit(CODE, Edit('  <h1 class="text-xl">Title</h1>', '  <h1 class="text-red-500">Title</h1>'))
+        self.assertEqual(updated, CODE.replace("text-xl", "text-red-500"))
+
+    def test_apply_edit_with_wrong_indentation(self):
+        updated = apply_edit(CODE, Edit("<li>Two</li>\n</ul>", "    <li>Two</li>\n    <li>Three</li>\n  </ul>"))
+        self.assertIn("    <li>Three</li>\n  </ul>\n</body>", updated)
+
+    def test_rejects_missing_or_ambiguous_search(self):
+        with self.assertRaises(PatchError):
+            apply_edit(CODE, Edit("<li>Three</li>", ""))
+        with self.assertRaises(PatchError):
+            apply_edit(CODE, Edit("<li>", ""))
+        with self.assertRaises(PatchError):
+            apply_edit(CODE, Edit("\n", "x"))
+
+    def test_streaming_patcher_applies_complete_blocks(self):
+        patcher = StreamingPatcher(CODE)
+        response = edit_block("<li>One</li>", "<li>First</li>") + edit_block("<li>Two</li>", "<li>Second</li>")
+
+        changes = [patcher.feed(response[i : i + 10]) for i in range(0, len(response), 10)]
+        self.assertEqual(changes.count(True), 2)
+        self.assertEqual(patcher.result(), CODE.replace("One", "First").replace("Two", "Second"))
+
+    def test_streaming_patcher_fails_after_bad_edit(self):
+        patcher = StreamingPatcher(CODE)
+        patcher.feed(edit_block("<li>Missing</li>", "") + edit_block("<li>One</li>", "<li>First</li>"))
+        self.assertEqual(patcher.edits_applied, 0)
+        with self.assertRaises(PatchError):
+            patcher.result()
+
+    def test_streaming_patcher_rejects_broken_document(self):
+        patcher = StreamingPatcher(CODE)
+        patcher.feed(edit_block("</body>\n</html>", "</body>"))
+        with self.assertRaises(PatchError):
+            patcher.result()
+
+    def test_update_stats(self):
+        stats = UpdateStats()
+        stats.record("patch", True, 1.0, 100)
+        stats.record("patch", False, 3.0, 300)
+        self.assertEqual(
+            stats.summary()["patch"],
+            {"attempts": 2, "success_rate": 0.5, "average_seconds": 2.0, "average_output_chars": 200},
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
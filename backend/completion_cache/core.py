@@ -0,0 +1,73 @@
+import asyncio
+from typing import Awaitable, Callable, Dict
+from config import (
+    COMPLETION_CACHE,
+    COMPLETION_CACHE_MAX_ENTRIES,
+    COMPLETION_CACHE_PATH,
+    COMPLETION_CACHE_TTL_SECONDS,
+)
+from key_value_store.core import KeyValueStore, create_key_value_store
+
+# Cached completions are replayed through the normal chunk protocol, in larger
+# chunks than the model streams and without waiting between them
+REPLAY_CHUNK_SIZE = 1024
+
+
+class CompletionCache:
+    """
+    Completions of earlier generations, keyed by everything that determines
+    the completion (see get_completion_cache_key in routes/generate_code.py).
+    """
+
+    def __init__(self, store: KeyValueStore):
+        self.store = store
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+
+    async def get(self, key: str) -> str | None:
+        completion = await asyncio.to_thread(self.store.get, key)
+        if completion is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+        return completion
+
+    async def set(self, key: str, completion: str) -> None:
+        await asyncio.to_thread(self.store.set, key, completion)
+
+    def stats(self) -> Dict[str, float]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+async def replay_completion(
+    completion: str, process_chunk: Callable[[str, int], Awaitable[None]]
+) -> str:
+    for i in range(0, len(completion), REPLAY_CHUNK_SIZE):
+        await process_chunk(completion[i : i + REPLAY_CHUNK_SIZE], 0)
+    return completion
+
+
+def create_completion_cache() -> CompletionCache | None:
+    if COMPLETION_CACHE in ["memory", "sqlite"]:
+        return CompletionCache(
+            create_key_value_store(
+                COMPLETION_CACHE,
+                COMPLETION_CACHE_PATH,
+                COMPLETION_CACHE_MAX_ENTRIES,
+                COMPLETION_CACHE_TTL_SECONDS,
+            )
+        )
+    elif COMPLETION_CACHE:
+        print(f"[COMPLETION CACHE] Unknown store {COMPLETION_CACHE}, caching is disabled")
+    return None
+
+
+# None when caching is disabled
+completion_cache = create_completion_cache()
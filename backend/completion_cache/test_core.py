@@ -0,0 +1,28 @@
+import unittest
+from completion_cache.core import CompletionCache, replay_completion
+from key_value_store.core import MemoryKeyValueStore
+
+
+class TestCompletionCache(unittest.IsolatedAsyncioTestCase):
+
+    async def test_tracks_hit_rate(self):
+        cache = CompletionCache(MemoryKeyValueStore(10, 100))
+        self.assertIsNone(await cache.get("a"))
+        await cache.set("a", "A")
+        self.assertEqual(await cache.get("a"), "A")
+        self.assertEqual(cache.stats(), {"hits": 1, "misses": 1, "hit_rate": 0.5})
+
+    async def test_replay_streams_whole_completion(self):
+        chunks: list[str] = []
+
+        async def process_chunk(content: str, variantIndex: int):
+            chunks.append(content)
+
+        completion = "<html>" + "x" * 3000 + "</html>"
+        self.assertEqual(await replay_completion(completion, process_chunk), completion)
+        self.assertEqual("".join(chunks), completion)
+        self.assertGreater(len(chunks), 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,8 +10,69 @@ BEDROCK_ACCESS_KEY = os.environ.get("BEDROCK_ACCESS_KEY", "")
 BEDROCK_SECRET_KEY = os.environ.get("BEDROCK_SECRET_KEY", "")
 BEDROCK_REGION = os.environ.get("BEDROCK_REGION", "")
 IMAGE_OUPUT_S3_BUCKET = os.environ.get("IMAGE_OUPUT_S3_BUCKET", "")
+# Fallback: write generated images to static/images and upload the file instead of uploading from memory
+IMAGE_OUTPUT_S3_UPLOAD_FROM_FILE = bool(os.environ.get("IMAGE_OUTPUT_S3_UPLOAD_FROM_FILE", False))
 DEPLOY_ON_AWS = bool(os.environ.get("DEPLOY_ON_AWS", False))
 
+# Image generation scheduling (per model, per process)
+IMAGE_GENERATION_MAX_CONCURRENCY = int(os.environ.get("IMAGE_GENERATION_MAX_CONCURRENCY", 4))
+IMAGE_GENERATION_RATE_PER_SECOND = float(os.environ.get("IMAGE_GENERATION_RATE_PER_SECOND", 2))
+IMAGE_GENERATION_BURST = float(os.environ.get("IMAGE_GENERATION_BURST", 4))
+
+# Local stock image library used instead of generation when a caption matches the alt text.
+# Must be inside static/ so that the images are served.
+IMAGE_LIBRARY_DIR = os.environ.get("IMAGE_LIBRARY_DIR", "static/library")
+IMAGE_LIBRARY_MATCH_THRESHOLD = float(os.environ.get("IMAGE_LIBRARY_MATCH_THRESHOLD", 0.75))
+
+# Byte budget for generated images kept in static/images when there's no S3 bucket
+LOCAL_IMAGE_STORE_MAX_BYTES = int(os.environ.get("LOCAL_IMAGE_STORE_MAX_BYTES", 1024 * 1024 * 1024))
+
+# Uploaded screenshots and videos, stored by content hash and referenced by handle
+ASSET_STORE_DIR = os.environ.get("ASSET_STORE_DIR", "assets_store")
+ASSET_STORE_MAX_BYTES = int(os.environ.get("ASSET_STORE_MAX_BYTES", 2 * 1024 * 1024 * 1024))
+ASSET_MAX_UPLOAD_BYTES = int(os.environ.get("ASSET_MAX_UPLOAD_BYTES", 100 * 1024 * 1024))
+
+# How video frames are picked for the prompt: "uniform" (evenly spaced) or
+# "scene" (at UI state changes, dropping near-duplicate frames). Scene mode
+# decodes every frame of the video, so it is slower to prepare; compare the
+# selected frames and timings with run_video_sampling_benchmark.py first.
+VIDEO_FRAME_SELECTION = os.environ.get("VIDEO_FRAME_SELECTION", "uniform")
+# Frames packed into each grid image of video prompts, to send fewer images
+# (1 sends every frame as its own image)
+VIDEO_FRAMES_PER_SHEET = int(os.environ.get("VIDEO_FRAMES_PER_SHEET", 1))
+# Byte budget for the encoded frames of recent videos, so that generating from
+# the same video again (e.g. with another stack) doesn't decode it again
+VIDEO_FRAME_CACHE_MAX_BYTES = int(os.environ.get("VIDEO_FRAME_CACHE_MAX_BYTES", 256 * 1024 * 1024))
+
+# Code generation admission control (per process)
+MAX_CONCURRENT_GENERATIONS = int(os.environ.get("MAX_CONCURRENT_GENERATIONS", 8))
+MAX_QUEUED_GENERATIONS = int(os.environ.get("MAX_QUEUED_GENERATIONS", 16))
+
+# Resumable generation sessions: messages kept for replay, and how long finished sessions are kept
+GENERATION_SESSION_BUFFER_SIZE = int(os.environ.get("GENERATION_SESSION_BUFFER_SIZE", 10000))
+GENERATION_SESSION_TTL_SECONDS = float(os.environ.get("GENERATION_SESSION_TTL_SECONDS", 300))
+
+# Cache of completions for repeated screenshots: "" (disabled), "memory" or "sqlite"
+COMPLETION_CACHE = os.environ.get("COMPLETION_CACHE", "")
+COMPLETION_CACHE_PATH = os.environ.get("COMPLETION_CACHE_PATH", "completion_cache.sqlite3")
+COMPLETION_CACHE_MAX_ENTRIES = int(os.environ.get("COMPLETION_CACHE_MAX_ENTRIES", 1000))
+COMPLETION_CACHE_TTL_SECONDS = float(os.environ.get("COMPLETION_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+
+# Server-side store of each project's screenshot and code versions, so that
+# updates only reference the version they build on: "memory" or "sqlite"
+CONVERSATION_STORE = os.environ.get("CONVERSATION_STORE", "memory")
+CONVERSATION_STORE_PATH = os.environ.get("CONVERSATION_STORE_PATH", "conversations.sqlite3")
+CONVERSATION_STORE_MAX_CONVERSATIONS = int(os.environ.get("CONVERSATION_STORE_MAX_CONVERSATIONS", 500))
+CONVERSATION_TTL_SECONDS = float(os.environ.get("CONVERSATION_TTL_SECONDS", 24 * 3600))
+
+# How update turns ask for changes: "full" (the model rewrites the whole code) or
+# "patch" (search/replace edits, falling back to a full rewrite if they don't apply).
+# Compare the [UPDATE] stats logged for both before switching to "patch".
+CODE_UPDATE_MODE = os.environ.get("CODE_UPDATE_MODE", "full")
+
+# Input token budget for update conversations, beyond which earlier versions of
+# the code are dropped from the prompt (0 uses the per-model defaults in prompts/compaction.py)
+HISTORY_TOKEN_BUDGET = int(os.environ.get("HISTORY_TOKEN_BUDGET", 0))
 
 # Backend-related, used for generating image URLs prefixed with this URL
 BACKEND_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:7001")
@@ -20,3 +81,10 @@ BACKEND_URL = os.environ.get("BACKEND_URL", "http://127.0.0.1:7001")
 SHOULD_MOCK_AI_RESPONSE = bool(os.environ.get("MOCK", False))
 IS_DEBUG_ENABLED = bool(os.environ.get("IS_DEBUG_ENABLED", False))
 DEBUG_DIR = os.environ.get("DEBUG_DIR", "")
+
+# Debug artifacts (e.g. the frames sent for a video) are saved for this
+# fraction of requests (0 disables them), and removed by age and total size
+DEBUG_ARTIFACTS_DIR = os.environ.get("DEBUG_ARTIFACTS_DIR", "debug_artifacts")
+DEBUG_ARTIFACTS_SAMPLE_RATE = float(os.environ.get("DEBUG_ARTIFACTS_SAMPLE_RATE", 0))
+DEBUG_ARTIFACTS_MAX_AGE_SECONDS = float(os.environ.get("DEBUG_ARTIFACTS_MAX_AGE_SECONDS", 24 * 3600))
+DEBUG_ARTIFACTS_MAX_BYTES = int(os.environ.get("DEBUG_ARTIFACTS_MAX_BYTES", 500 * 1024 * 1024))
@@ -0,0 +1,97 @@
+import asyncio
+import json
+import uuid
+from typing import Any, Dict, List, Tuple
+from config import (
+    CONVERSATION_STORE,
+    CONVERSATION_STORE_MAX_CONVERSATIONS,
+    CONVERSATION_STORE_PATH,
+    CONVERSATION_TTL_SECONDS,
+)
+from key_value_store.core import KeyValueStore, create_key_value_store
+
+
+class Conversations:
+    """
+    Inputs and generated versions of each project, so that update requests
+    only need to reference the version they build on instead of resending
+    the screenshot and the whole history.
+
+    Each conversation is stored as one JSON value:
+    {"image": ..., "versions": {version_id: [parent_id, instruction, code]}}.
+    Version ids start with their conversation's id, so that they can be
+    looked up on their own.
+    """
+
+    def __init__(self, store: KeyValueStore):
+        self.store = store
+        # Adding a version reads and rewrites its conversation
+        self.lock = asyncio.Lock()
+
+    async def create(self, image: str, history: List[str]) -> Tuple[str, str | None]:
+        """
+        Stores a conversation, along with the versions in a client-side history
+        (code, instruction, code, ...). Returns the conversation id and the id
+        of the latest version in the history.
+        """
+        conversation_id = uuid.uuid4().hex
+        versions: Dict[str, List[str | None]] = {}
+        parent_id = None
+        instruction = None
+        for index, text in enumerate(history):
+            if index % 2 == 0:
+                version_id = f"{conversation_id}-{uuid.uuid4().hex}"
+                versions[version_id] = [parent_id, instruction, text]
+                parent_id = version_id
+            else:
+                instruction = text
+        conversation = {"image": image, "versions": versions}
+        await asyncio.to_thread(self.store.set, conversation_id, json.dumps(conversation))
+        return conversation_id, parent_id
+
+    async def add_version(
+        self, conversation_id: str, parent_id: str | None, instruction: str | None, code: str
+    ) -> str:
+        version_id = f"{conversation_id}-{uuid.uuid4().hex}"
+        async with self.lock:
+            conversation = await self.get_conversation(conversation_id)
+            # An expired conversation isn't brought back: updates of this
+            # version resend the whole history instead
+            if conversation is not None:
+                conversation["versions"][version_id] = [parent_id, instruction, code]
+                await asyncio.to_thread(self.store.set, conversation_id, json.dumps(conversation))
+        return version_id
+
+    async def get_history(self, version_id: str) -> Tuple[str, str, List[str]] | None:
+        """
+        Returns the conversation id, image and history (code, instruction,
+        code, ...) up to the given version.
+        """
+        conversation_id = version_id.split("-")[0]
+        conversation = await self.get_conversation(conversation_id)
+        if conversation is None or version_id not in conversation["versions"]:
+            return None
+
+        history: List[str] = []
+        current_id: str | None = version_id
+        while current_id is not None:
+            parent_id, instruction, code = conversation["versions"][current_id]
+            history.insert(0, code)
+            if instruction is not None:
+                history.insert(0, instruction)
+            current_id = parent_id
+        return conversation_id, conversation["image"], history
+
+    async def get_conversation(self, conversation_id: str) -> Dict[str, Any] | None:
+        value = await asyncio.to_thread(self.store.get, conversation_id)
+        return json.loads(value) if value is not None else None
+
+
+conversations = Conversations(
+    create_key_value_store(
+        CONVERSATION_STORE,
+        CONVERSATION_STORE_PATH,
+        CONVERSATION_STORE_MAX_CONVERSATIONS,
+        CONVERSATION_TTL_SECONDS,
+    )
+)
@@ -0,0 +1,62 @@
+import unittest
+from unittest import mock
+from conversations.core import Conversations
+from key_value_store.core import MemoryKeyValueStore
+
+
+class TestConversations(unittest.IsolatedAsyncioTestCase):
+
+    def create_store(self, max_conversations: int, ttl: float):
+        return MemoryKeyValueStore(max_conversations, ttl)
+
+    async def test_rebuilds_history_from_versions(self):
+        conversations = Conversations(self.create_store(max_conversations=10, ttl=100))
+        conversation_id, parent_id = await conversations.create(
+            "data:image/png;base64,", ["<html>1</html>", "Make it red", "<html>2</html>", "Bigger"]
+        )
+        version_id = await conversations.add_version(
+            conversation_id, parent_id, "Bigger", "<html>3</html>"
+        )
+        # A branch from the first version
+        first_version_id = await conversations.add_version(conversation_id, None, None, "<html>A</html>")
+        branch_id = await conversations.add_version(
+            conversation_id, first_version_id, "Make it blue", "<html>B</html>"
+        )
+
+        self.assertEqual(
+            await conversations.get_history(version_id),
+            (
+                conversation_id,
+                "data:image/png;base64,",
+                ["<html>1</html>", "Make it red", "<html>2</html>", "Bigger", "<html>3</html>"],
+            ),
+        )
+        result = await conversations.get_history(branch_id)
+        assert result is not None
+        self.assertEqual(result[2], ["<html>A</html>", "Make it blue", "<html>B</html>"])
+        self.assertIsNone(await conversations.get_history("unknown"))
+
+    async def test_evicts_least_recently_used_conversations(self):
+        conversations = Conversations(self.create_store(max_conversations=2, ttl=100))
+        with mock.patch("key_value_store.core.time.time", side_effect=range(1, 100)):
+            first_id, _ = await conversations.create("1", [])
+            first_version = await conversations.add_version(first_id, None, None, "<html>1</html>")
+            second_id, _ = await conversations.create("2", [])
+            second_version = await conversations.add_version(second_id, None, None, "<html>2</html>")
+            self.assertIsNotNone(await conversations.get_history(first_version))
+            await conversations.create("3", [])
+
+            self.assertIsNotNone(await conversations.get_history(first_version))
+            self.assertIsNone(await conversations.get_history(second_version))
+
+    async def test_expires_after_ttl(self):
+        conversations = Conversations(self.create_store(max_conversations=10, ttl=5))
+        with mock.patch("key_value_store.core.time.time", return_value=100):
+            conversation_id, _ = await conversations.create("1", [])
+            version_id = await conversations.add_version(conversation_id, None, None, "<html></html>")
+        with mock.patch("key_value_store.core.time.time", return_value=106):
+            self.assertIsNone(await conversations.get_history(version_id))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,110 @@
+import os
+import random
+import shutil
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict
+from PIL import Image
+from config import (
+    DEBUG_ARTIFACTS_DIR,
+    DEBUG_ARTIFACTS_MAX_AGE_SECONDS,
+    DEBUG_ARTIFACTS_MAX_BYTES,
+    DEBUG_ARTIFACTS_SAMPLE_RATE,
+)
+
+
+class DebugArtifactSink:
+    """
+    Saves debug artifacts for a sample of requests, each request in its own
+    directory. Files are written by a background thread, so the request path
+    never waits on the disk, and artifacts are removed once they are older than
+    max_age_seconds or no longer fit in max_bytes (oldest first).
+    """
+
+    def __init__(
+        self,
+        root: str = DEBUG_ARTIFACTS_DIR,
+        sample_rate: float = DEBUG_ARTIFACTS_SAMPLE_RATE,
+        max_age_seconds: float = DEBUG_ARTIFACTS_MAX_AGE_SECONDS,
+        max_bytes: int = DEBUG_ARTIFACTS_MAX_BYTES,
+        max_pending: int = 4,
+    ):
+        self.root = root
+        self.sample_rate = sample_rate
+        self.max_age_seconds = max_age_seconds
+        self.max_bytes = max_bytes
+        # Beyond this many queued writes, artifacts are dropped rather than
+        # piling up in memory
+        self.max_pending = max_pending
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="debug-artifacts")
+
+        # Metrics
+        self.saved = 0
+        self.dropped = 0
+
+    def save_images(self, kind: str, images: list[Image.Image]) -> str | None:
+        """
+        Queues the images to be saved as JPEGs if this request is sampled.
+        Returns the directory they will be saved to, or None.
+        """
+        if random.random() >= self.sample_rate:
+            return None
+        with self.lock:
+            if self.pending >= self.max_pending:
+                self.dropped += 1
+                print(f"[DEBUG ARTIFACTS] Too many pending writes, dropped {kind}, {self.stats()}")
+                return None
+            self.pending += 1
+
+        directory = os.path.join(self.root, f"{kind}_{int(time.time())}_{uuid.uuid4().hex[:8]}")
+        self.executor.submit(self._write_images, directory, images)
+        return directory
+
+    def _write_images(self, directory: str, images: list[Image.Image]) -> None:
+        try:
+            os.makedirs(directory, exist_ok=True)
+            for index, image in enumerate(images):
+                image.save(os.path.join(directory, f"screenshot_{index}.jpg"), format="JPEG")
+            self.saved += 1
+            print(f"[DEBUG ARTIFACTS] Saved {len(images)} images to {directory}")
+            self.cleanup()
+        except Exception as e:
+            print(f"[DEBUG ARTIFACTS] Failed to save to {directory}: {e}")
+        finally:
+            with self.lock:
+                self.pending -= 1
+
+    def cleanup(self) -> None:
+        now = time.time()
+        entries: list[tuple[float, str, int]] = []
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            if not os.path.isdir(path):
+                continue
+            size = sum(os.path.getsize(os.path.join(path, f)) for f in os.listdir(path))
+            entries.append((os.path.getmtime(path), path, size))
+
+        total_bytes = sum(size for _, _, size in entries)
+        removed = 0
+        for modified_at, path, size in sorted(entries):
+            if now - modified_at <= self.max_age_seconds and total_bytes <= self.max_bytes:
+                break
+            shutil.rmtree(path, ignore_errors=True)
+            total_bytes -= size
+            removed += 1
+        if removed:
+            print(f"[DEBUG ARTIFACTS] Removed {removed} directories, {total_bytes} bytes left")
+
+    # Waits for the queued writes (used by tests)
+    def flush(self) -> None:
+        self.executor.submit(lambda: None).result()
+
+    def stats(self) -> Dict[str, int]:
+        return {"saved": self.saved, "dropped": self.dropped, "pending": self.pending}
+
+
+debug_artifacts = DebugArtifactSink()
@@ -0,0 +1,56 @@
+import os
+import tempfile
+import time
+import unittest
+from PIL import Image
+from debug.artifacts import DebugArtifactSink
+
+
+class TestDebugArtifactSink(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_sink(self, **kwargs) -> DebugArtifactSink:
+        options = {"sample_rate": 1, "max_age_seconds": 100, "max_bytes": 10**6}
+        options.update(kwargs)
+        return DebugArtifactSink(self.directory.name, **options)  # type: ignore
+
+    def test_saves_images_in_the_background(self):
+        sink = self.create_sink()
+        directory = sink.save_images("video_frames", [Image.new("RGB", (8, 8))] * 2)
+        assert directory is not None
+        sink.flush()
+
+        self.assertEqual(sorted(os.listdir(directory)), ["screenshot_0.jpg", "screenshot_1.jpg"])
+        self.assertEqual(sink.stats()["saved"], 1)
+
+    def test_samples_requests(self):
+        sink = self.create_sink(sample_rate=0)
+        self.assertIsNone(sink.save_images("video_frames", [Image.new("RGB", (8, 8))]))
+        sink.flush()
+        self.assertEqual(os.listdir(self.directory.name), [])
+
+    def test_drops_artifacts_when_too_many_are_pending(self):
+        sink = self.create_sink(max_pending=0)
+        self.assertIsNone(sink.save_images("video_frames", [Image.new("RGB", (8, 8))]))
+        self.assertEqual(sink.stats()["dropped"], 1)
+
+    def test_removes_old_artifacts_then_oldest_over_budget(self):
+        now = time.time()
+        for name, age, size in [("a", 200, 10), ("b", 50, 600), ("c", 40, 600), ("d", 10, 10)]:
+            path = os.path.join(self.directory.name, name)
+            os.makedirs(path)
+            with open(os.path.join(path, "screenshot_0.jpg"), "wb") as f:
+                f.write(b"x" * size)
+            os.utime(path, (now - age, now - age))
+
+        self.create_sink(max_bytes=1000).cleanup()
+        self.assertEqual(sorted(os.listdir(self.directory.name)), ["c", "d"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,85 @@
 import asyncio
 import re
+import threading
 import boto3
 import hashlib
-import os
 import json
 import base64
-from typing import Dict, List, Literal, Union
+import time
+import math
+import unicodedata
+import urllib.parse
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Literal, Set, Tuple
 from bs4 import BeautifulSoup
 from config import (
     IMAGE_OUPUT_S3_BUCKET,
+    IMAGE_OUTPUT_S3_UPLOAD_FROM_FILE,
     DEPLOY_ON_AWS,
     BACKEND_URL,
+    IMAGE_LIBRARY_DIR,
+    IMAGE_LIBRARY_MATCH_THRESHOLD,
 )
 
+from image_generation.derivatives import (
+    IMMUTABLE_CACHE_CONTROL,
+    build_srcset,
+    derivative_name,
+    encode_webp_derivatives,
+    get_derivative_widths,
+)
+from image_generation.library import ImageLibrary
+from image_generation.local_store import local_image_store
 from image_generation.replicate import call_replicate
+from image_generation.scheduler import image_generation_scheduler
+from image_generation.singleflight import SingleFlight
+
+# (width, height) sizes accepted by both Titan Image Generator and Nova Canvas.
+# Placeholder sizes are snapped to one of these so that cache keys stay shared.
+IMAGE_SIZE_BUCKETS: List[Tuple[int, int]] = [
+    (512, 512),
+    (1024, 1024),
+    (576, 384),
+    (1152, 768),
+    (384, 576),
+    (768, 1152),
+    (640, 384),
+    (1280, 768),
+    (384, 640),
+    (768, 1280),
+    (704, 320),
+    (1408, 640),
+    (320, 704),
+    (640, 1408),
+]
+DEFAULT_IMAGE_SIZE = (512, 512)
+
+image_generation_singleflight: SingleFlight[str] = SingleFlight()
+
+# Loaded on first use
+image_library: ImageLibrary | None = None
+
+
+# boto3 clients are thread-safe but take about 10 ms to create, so a few are
+# kept (one per credential set) instead of creating one per call
+S3_CLIENT_CACHE_SIZE = 16
+s3_clients: "OrderedDict[Tuple[str | None, str | None], Any]" = OrderedDict()
+s3_clients_lock = threading.Lock()
+
+
+@dataclass
+class GeneratedImage:
+    url: str
+    # Responsive WebP derivatives, if any
+    srcset: str | None = None
+
+
+@dataclass
+class StoredImage:
+    # Hash the image and its derivatives are stored under
+    request_hash: str
+    derivative_widths: List[int]
 
 
 async def process_tasks(
@@ -22,32 +88,130 @@ async def process_tasks(
     bedrock_secret_key: str | None,
     bedrock_region: str | None,
     model: Literal["amazon.titan-image-generator-v1:0", "amazon.titan-image-generator-v2:0", "amazon.nova-canvas-v1:0"],
-):
-    import time
-
+    sizes: List[Tuple[int, int]] | None = None,
+) -> List[GeneratedImage | None]:
     start_time = time.time()
 
-    tasks = [generate_image(prompt, bedrock_access_key, bedrock_secret_key, bedrock_region, model) for prompt in prompts]
+    if sizes is None:
+        sizes = [DEFAULT_IMAGE_SIZE] * len(prompts)
+
+    # Prompts are in document order, so earlier images get a higher priority
+    tasks = [
+        generate_image(prompt, bedrock_access_key, bedrock_secret_key, bedrock_region, model, priority=index, width=width, height=height)
+        for index, (prompt, (width, height)) in enumerate(zip(prompts, sizes))
+    ]
     results = await asyncio.gather(*tasks, return_exceptions=True)
     end_time = time.time()
     generation_time = end_time - start_time
     print(f"Image generation time: {generation_time:.2f} seconds")
+    print(f"[IMAGE SCHEDULER] {image_generation_scheduler.stats()}")
+    print(f"[IMAGE GENERATION] Coalesced generations: {image_generation_singleflight.coalesced}")
 
-    processed_results: List[Union[str, None]] = []
+    stored_images: List[StoredImage | None] = []
     for result in results:
         if isinstance(result, BaseException):
             print(f"An exception occurred: {result}")
-            processed_results.append(None)
+            stored_images.append(None)
         else:
-            processed_results.append(result)
-    return processed_results
+            stored_images.append(result)
+
+    if IMAGE_OUPUT_S3_BUCKET == "":
+        return await asyncio.to_thread(get_local_images, stored_images)
+    # Presigning is done locally, without a request to S3, but is still blocking,
+    # so all of the page's URLs are presigned in one worker thread
+    return await asyncio.to_thread(
+        presign_images, stored_images, bedrock_access_key, bedrock_secret_key
+    )
+
+
+# Blocking
+def get_local_images(images: List[StoredImage | None]) -> List[GeneratedImage | None]:
+    return [get_local_image(image) if image else None for image in images]
+
+
+def get_local_image(image: StoredImage) -> GeneratedImage:
+    object_name = f"{image.request_hash}.png"
+    # Handing out the URL counts as a use for LRU eviction
+    local_image_store.touch(object_name)
+    print(f"Image url create: {local_image_store.relative_path(object_name)}")
+    return GeneratedImage(
+        url=f"{BACKEND_URL}/{local_image_store.relative_path(object_name)}",
+        srcset=build_srcset(
+            {
+                width: f"{BACKEND_URL}/{local_image_store.relative_path(derivative_name(image.request_hash, width))}"
+                for width in image.derivative_widths
+            }
+        ),
+    )
+
+
+# Blocking
+def presign_images(
+    images: List[StoredImage | None], access_key: str | None, secret_key: str | None
+) -> List[GeneratedImage | None]:
+    s3_client = get_s3_client(access_key, secret_key)
+
+    def presign(key: str) -> str:
+        return s3_client.generate_presigned_url('get_object', Params={'Bucket': IMAGE_OUPUT_S3_BUCKET, 'Key': key}, ExpiresIn=3600) # type: ignore
+
+    generated_images: List[GeneratedImage | None] = []
+    for image in images:
+        if image is None:
+            generated_images.append(None)
+            continue
+        generated_images.append(
+            GeneratedImage(
+                url=presign(f"{image.request_hash}.png"),
+                srcset=build_srcset(
+                    {
+                        width: presign(derivative_name(image.request_hash, width))
+                        for width in image.derivative_widths
+                    }
+                ),
+            )
+        )
+    return generated_images
 
 
 async def generate_image(
     prompt: str, bedrock_access_key: str | None, bedrock_secret_key: str | None, bedrock_region: str | None, model: Literal["amazon.titan-image-generator-v1:0", "amazon.titan-image-generator-v2:0", "amazon.nova-canvas-v1:0"] = "amazon.nova-canvas-v1:0",
-) -> Union[str, None]:
+    priority: int = 0,
+    width: int = DEFAULT_IMAGE_SIZE[0],
+    height: int = DEFAULT_IMAGE_SIZE[1],
+) -> StoredImage:
     client = boto3.client(service_name="bedrock-runtime", region_name=bedrock_region, aws_access_key_id=bedrock_access_key, aws_secret_access_key=bedrock_secret_key) # type: ignore
     
+    request = build_image_request(prompt, width, height)
+
+    # request content to md5 hash; the prompt is normalized so that trivially
+    # different alt texts share one cache entry
+    request_hash = get_request_hash(model, normalize_image_prompt(prompt), width, height)
+    # Images stored before prompts were normalized are keyed by the prompt as is
+    legacy_request_hash = get_request_hash(model, prompt, width, height)
+    derivative_widths = get_derivative_widths(width)
+
+    async def generate_image_bedrock(model: str, request: str) -> bytes:
+        print(f'generate image with model {model} promt: {prompt}')
+        return await image_generation_scheduler.run(
+            model,
+            priority,
+            lambda: asyncio.to_thread(invoke_image_model, client, model, request),
+        )
+
+    # Concurrent callers for the same image (other sessions or variants) share one generation
+    request_hash = await image_generation_singleflight.do(
+        request_hash,
+        lambda: store_image(request_hash, lambda: generate_image_bedrock(model, request), derivative_widths, bedrock_access_key, bedrock_secret_key, legacy_request_hash),
+    )
+    return StoredImage(request_hash, derivative_widths)
+
+
+def get_request_hash(model: str, prompt: str, width: int, height: int) -> str:
+    request_content = f'{model}{build_image_request(prompt, width, height)}'
+    return hashlib.md5(request_content.encode()).hexdigest()
+
+
+def build_image_request(prompt: str, width: int, height: int) -> str:
     native_request = {
         "taskType": "TEXT_IMAGE",
         "textToImageParams": {"text": prompt},
@@ -55,76 +219,173 @@ async def generate_image(
             "numberOfImages": 1,
             "quality": "standard",
             "cfgScale": 8.0,
-            "height": 512,
-            "width": 512,
+            "height": height,
+            "width": width,
             "seed": 512,
         },
     }
-    request = json.dumps(native_request)
+    return json.dumps(native_request)
 
-    # request content to md5 hash
-    request_content = f'{model}{request}'
-    request_hash = hashlib.md5(request_content.encode()).hexdigest()
 
-    if IMAGE_OUPUT_S3_BUCKET != "" and s3_key_exists(IMAGE_OUPUT_S3_BUCKET, f'{request_hash}.png', bedrock_access_key, bedrock_secret_key):
-        print(f'Image already exists in S3: {request_hash}.png')
-        return s3_key_presigned_url(IMAGE_OUPUT_S3_BUCKET, f'{request_hash}.png')
+# Blocking; returns the decoded PNG bytes
+def invoke_image_model(client: Any, model: str, request: str) -> bytes:
+    response = client.invoke_model(modelId=model, body=request)
+    model_response = json.loads(response["body"].read())
+    base64_image_data = model_response["images"][0]
+    return base64.b64decode(base64_image_data)
 
-    async def generate_image_replicate(model: str, request: str) -> str:
-        print(f'generate image with model {model} promt: {prompt}')
-        response = await asyncio.to_thread(client.invoke_model, modelId=model, body=request) # type: ignore
-        return response # type: ignore
-    
-    output_dir = "static/images"
-    if not os.path.exists(output_dir):
-        os.makedirs(output_dir)
-
-    image_path = os.path.join(output_dir, f"{request_hash}.png")
-    if not os.path.exists(image_path):
-        response = await generate_image_replicate(model, request)
-        model_response = json.loads(response["body"].read()) # type: ignore
-        base64_image_data = model_response["images"][0]
-        image_data = base64.b64decode(base64_image_data)
-        with open(image_path, "wb") as file:
-            file.write(image_data)
-        file.close()
+
+# Generates the image unless it's already stored, and stores it and its WebP
+# derivatives in S3 or in the local image store. Returns the hash the image is
+# stored under: request_hash, or legacy_request_hash if only that one is stored.
+async def store_image(
+    request_hash: str,
+    generate: Callable[[], Awaitable[bytes]],
+    derivative_widths: List[int],
+    bedrock_access_key: str | None,
+    bedrock_secret_key: str | None,
+    legacy_request_hash: str | None = None,
+) -> str:
+    object_name = f"{request_hash}.png"
+    if legacy_request_hash == request_hash:
+        legacy_request_hash = None
+
+    if IMAGE_OUPUT_S3_BUCKET != "":
+        existing_keys = await asyncio.to_thread(s3_list_keys, IMAGE_OUPUT_S3_BUCKET, request_hash, bedrock_access_key, bedrock_secret_key)
+        if object_name not in existing_keys and legacy_request_hash:
+            legacy_keys = await asyncio.to_thread(s3_list_keys, IMAGE_OUPUT_S3_BUCKET, legacy_request_hash, bedrock_access_key, bedrock_secret_key)
+            if f"{legacy_request_hash}.png" in legacy_keys:
+                print(f'Image already exists in S3 under its legacy key: {legacy_request_hash}.png')
+                request_hash, object_name, existing_keys = legacy_request_hash, f"{legacy_request_hash}.png", legacy_keys
+        missing_widths = [width for width in derivative_widths if derivative_name(request_hash, width) not in existing_keys]
+
+        if object_name in existing_keys:
+            print(f'Image already exists in S3: {object_name}')
+            # Backfill derivatives for images stored before they existed
+            if missing_widths:
+                image_data = await asyncio.to_thread(s3_get_object, IMAGE_OUPUT_S3_BUCKET, object_name, bedrock_access_key, bedrock_secret_key)
+                await s3_put_derivatives(image_data, request_hash, missing_widths, bedrock_access_key, bedrock_secret_key)
+            return request_hash
+
+        # Upload straight from memory unless the disk round trip is explicitly requested
+        if not IMAGE_OUTPUT_S3_UPLOAD_FROM_FILE:
+            image_data = await generate()
+            await asyncio.gather(
+                s3_put_image(image_data, IMAGE_OUPUT_S3_BUCKET, object_name, bedrock_access_key, bedrock_secret_key),
+                s3_put_derivatives(image_data, request_hash, missing_widths, bedrock_access_key, bedrock_secret_key),
+            )
+            return request_hash
+    elif legacy_request_hash and await asyncio.to_thread(
+        is_only_stored_locally_as, f"{legacy_request_hash}.png", object_name
+    ):
+        request_hash, object_name = legacy_request_hash, f"{legacy_request_hash}.png"
+
+    # The local store's file writes, reads and evictions (and its lock, which
+    # they hold) run in worker threads, off the event loop
+    image_data: bytes | None = None
+    if not await asyncio.to_thread(local_image_store.exists, object_name):
+        image_data = await generate()
+        await asyncio.to_thread(local_image_store.write, object_name, image_data)
 
     if IMAGE_OUPUT_S3_BUCKET == "":
-        print(f"Image url create: {image_path}")
-        return f"{BACKEND_URL}/{output_dir}/{request_hash}.png"
-    
-    s3_upload_file(image_path, IMAGE_OUPUT_S3_BUCKET, f'{request_hash}.png', bedrock_access_key, bedrock_secret_key)
-    os.remove(image_path) # use s3 instead of local storage
-    return s3_key_presigned_url(IMAGE_OUPUT_S3_BUCKET, f'{request_hash}.png', bedrock_access_key, bedrock_secret_key)
+        missing_widths = await asyncio.to_thread(
+            get_missing_local_derivatives, request_hash, derivative_widths
+        )
+        if missing_widths:
+            if image_data is None:
+                image_data = await asyncio.to_thread(local_image_store.read, object_name)
+            await asyncio.to_thread(
+                write_local_derivatives, image_data, request_hash, missing_widths
+            )
+        return request_hash
 
-def s3_upload_file(file_path: str, bucket_name: str, object_name: str, access_key: str, secret_key: str) -> None:
-    if not DEPLOY_ON_AWS:
-        s3_client = boto3.client("s3", aws_access_key_id=access_key, aws_secret_access_key=secret_key)
-    else:
-        s3_client = boto3.client("s3") # type: ignore
-    s3_client.upload_file(file_path, bucket_name, object_name) # type: ignore
+    start_time = time.time()
+    await asyncio.to_thread(s3_upload_file, local_image_store.path(object_name), IMAGE_OUPUT_S3_BUCKET, object_name, bedrock_access_key, bedrock_secret_key)
+    print(f"[IMAGE UPLOAD] {object_name} uploaded from file in {time.time() - start_time:.2f} seconds")
+    if image_data is None:
+        image_data = await asyncio.to_thread(local_image_store.read, object_name)
+    await asyncio.to_thread(local_image_store.remove, object_name) # use s3 instead of local storage
+    await s3_put_derivatives(image_data, request_hash, missing_widths, bedrock_access_key, bedrock_secret_key)
+    return request_hash
+
+
+# Blocking
+def is_only_stored_locally_as(name: str, other_name: str) -> bool:
+    return local_image_store.exists(name) and not local_image_store.exists(other_name)
+
+
+# Blocking
+def get_missing_local_derivatives(request_hash: str, widths: List[int]) -> List[int]:
+    return [
+        width
+        for width in widths
+        if not local_image_store.exists(derivative_name(request_hash, width))
+    ]
+
+
+# Blocking
+def write_local_derivatives(image_data: bytes, request_hash: str, widths: List[int]) -> None:
+    for width, data in encode_webp_derivatives(image_data, widths).items():
+        local_image_store.write(derivative_name(request_hash, width), data)
+
+
+def get_s3_client(access_key: str | None, secret_key: str | None):
+    key = (None, None) if DEPLOY_ON_AWS else (access_key, secret_key)
+    with s3_clients_lock:
+        if key in s3_clients:
+            s3_clients.move_to_end(key)
+            return s3_clients[key]
+        if not DEPLOY_ON_AWS:
+            client = boto3.client("s3", aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+        else:
+            client = boto3.client("s3") # type: ignore
+        s3_clients[key] = client
+        if len(s3_clients) > S3_CLIENT_CACHE_SIZE:
+            s3_clients.popitem(last=False)
+        return client
 
-def s3_key_presigned_url(mybucket: str, mykey: str, access_key: str, secret_key: str) -> str:
-    if not DEPLOY_ON_AWS:
-        s3_client = boto3.client("s3", aws_access_key_id=access_key, aws_secret_access_key=secret_key)
-    else:
-        s3_client = boto3.client("s3") # type: ignore
-    url = s3_client.generate_presigned_url('get_object', Params={'Bucket': mybucket, 'Key': mykey}, ExpiresIn=3600) # type: ignore
-    return url # type: ignore
 
-def s3_key_exists(mybucket: str, mykey: str, access_key: str, secret_key: str) -> bool:
-    if not DEPLOY_ON_AWS:
-        s3_client = boto3.client("s3", aws_access_key_id=access_key, aws_secret_access_key=secret_key)
-    else:
-        s3_client = boto3.client("s3") # type: ignore
-    try:
-        response = s3_client.list_objects_v2(Bucket=mybucket, Prefix=mykey) # type: ignore
-        for obj in response['Contents']: # type: ignore
-            if mykey == obj['Key']:
-                return True  # key exists
-        return False  # no keys match
-    except KeyError:
-        return False  # no keys found
+async def s3_put_image(image_data: bytes, bucket_name: str, object_name: str, access_key: str | None, secret_key: str | None, content_type: str = "image/png") -> None:
+    # Runs in a worker thread so that all images of a page upload concurrently
+    start_time = time.time()
+    s3_client = get_s3_client(access_key, secret_key)
+    await asyncio.to_thread(
+        s3_client.put_object, # type: ignore
+        Bucket=bucket_name,
+        Key=object_name,
+        Body=image_data,
+        ContentType=content_type,
+        CacheControl=IMMUTABLE_CACHE_CONTROL,
+    )
+    print(f"[IMAGE UPLOAD] {object_name} ({len(image_data)} bytes) uploaded in {time.time() - start_time:.2f} seconds")
+
+
+async def s3_put_derivatives(image_data: bytes, request_hash: str, widths: List[int], access_key: str | None, secret_key: str | None) -> None:
+    if not widths:
+        return
+    derivatives = await asyncio.to_thread(encode_webp_derivatives, image_data, widths)
+    await asyncio.gather(
+        *[
+            s3_put_image(data, IMAGE_OUPUT_S3_BUCKET, derivative_name(request_hash, width), access_key, secret_key, "image/webp")
+            for width, data in derivatives.items()
+        ]
+    )
+
+
+def s3_upload_file(file_path: str, bucket_name: str, object_name: str, access_key: str | None, secret_key: str | None) -> None:
+    s3_client = get_s3_client(access_key, secret_key)
+    s3_client.upload_file(file_path, bucket_name, object_name, ExtraArgs={"CacheControl": IMMUTABLE_CACHE_CONTROL}) # type: ignore
+
+def s3_get_object(bucket_name: str, object_name: str, access_key: str | None, secret_key: str | None) -> bytes:
+    s3_client = get_s3_client(access_key, secret_key)
+    response = s3_client.get_object(Bucket=bucket_name, Key=object_name) # type: ignore
+    return response["Body"].read() # type: ignore
+
+# Returns all keys that start with the prefix (a request hash covers an image and its derivatives)
+def s3_list_keys(mybucket: str, prefix: str, access_key: str | None, secret_key: str | None) -> Set[str]:
+    s3_client = get_s3_client(access_key, secret_key)
+    response = s3_client.list_objects_v2(Bucket=mybucket, Prefix=prefix) # type: ignore
+    return {obj['Key'] for obj in response.get('Contents', [])} # type: ignore
 
 async def generate_image_replicate(prompt: str, api_key: str) -> str:
 
@@ -145,6 +406,42 @@ async def generate_image_replicate(prompt: str, api_key: str) -> str:
     )
 
 
+# Leading words that don't change what the image should show
+IMAGE_PROMPT_FILLER_PREFIXES = [
+    "placeholder image of",
+    "placeholder image for",
+    "placeholder for",
+    "placeholder image",
+    "placeholder",
+    "image of",
+    "picture of",
+    "photo of",
+    "photograph of",
+    "a",
+    "an",
+    "the",
+]
+
+
+# Normalize an image prompt (alt text) for deduplication and cache keys
+def normalize_image_prompt(prompt: str) -> str:
+    text = unicodedata.normalize("NFKC", prompt).casefold()
+    # Replace punctuation with spaces and collapse whitespace
+    text = " ".join(re.sub(r"[^\w\s]|_", " ", text).split())
+
+    stripped = True
+    while stripped:
+        stripped = False
+        for prefix in IMAGE_PROMPT_FILLER_PREFIXES:
+            if text.startswith(prefix + " "):
+                text = text[len(prefix) + 1 :]
+                stripped = True
+                # Start over so longer prefixes are tried first
+                break
+
+    return text or prompt.strip().casefold()
+
+
 def extract_dimensions(url: str):
     # Regular expression to match numbers in the format '300x200'
     matches = re.findall(r"(\d+)x(\d+)", url)
@@ -158,6 +455,65 @@ def extract_dimensions(url: str):
         return (100, 100)
 
 
+# Picks the bucket with the closest aspect ratio, and within it the smallest
+# size that covers the requested dimensions (or the largest one available)
+def snap_to_size_bucket(width: int, height: int) -> Tuple[int, int]:
+    if width <= 0 or height <= 0:
+        return DEFAULT_IMAGE_SIZE
+
+    target_ratio = math.log(width / height)
+    closest_ratio = min(
+        (math.log(w / h) for (w, h) in IMAGE_SIZE_BUCKETS),
+        key=lambda ratio: abs(ratio - target_ratio),
+    )
+    candidates = sorted(
+        [
+            (w, h)
+            for (w, h) in IMAGE_SIZE_BUCKETS
+            if math.isclose(math.log(w / h), closest_ratio)
+        ],
+        key=lambda size: size[0] * size[1],
+    )
+    for w, h in candidates:
+        if w >= width and h >= height:
+            return (w, h)
+    return candidates[-1]
+
+
+# Loaded at startup (see main.py); blocking
+def get_image_library() -> ImageLibrary:
+    global image_library
+    if image_library is None:
+        image_library = ImageLibrary.from_directory(
+            IMAGE_LIBRARY_DIR, normalize=normalize_image_prompt
+        )
+        print(f"[IMAGE LIBRARY] Loaded {len(image_library)} images from {IMAGE_LIBRARY_DIR}")
+    return image_library
+
+
+# Returns the library image URL for each prompt, or None when no caption is
+# similar enough. Blocking.
+def find_library_images(prompts: List[str]) -> List[str | None]:
+    library = get_image_library()
+    if len(library) == 0:
+        return [None] * len(prompts)
+
+    start_time = time.time()
+    matches = library.search(prompts)
+    urls = [
+        f"{BACKEND_URL}/{IMAGE_LIBRARY_DIR}/{urllib.parse.quote(filename)}"
+        if score >= IMAGE_LIBRARY_MATCH_THRESHOLD
+        else None
+        for (filename, score) in matches
+    ]
+    num_matches = sum(1 for url in urls if url is not None)
+    print(
+        f"[IMAGE LIBRARY] Lookup time: {(time.time() - start_time) * 1000:.1f} ms, "
+        f"matched {num_matches}/{len(prompts)} prompts"
+    )
+    return urls
+
+
 def create_alt_url_mapping(code: str) -> Dict[str, str]:
     soup = BeautifulSoup(code, "html.parser")
     images = soup.find_all("img")
@@ -184,36 +540,52 @@ async def generate_images(
     soup = BeautifulSoup(code, "html.parser")
     images = soup.find_all("img")
 
-    # Extract alt texts as image prompts
-    alts: List[str | None] = []
+    # Look up cached images by normalized alt text
+    normalized_image_cache = {
+        normalize_image_prompt(alt): url for alt, url in image_cache.items()
+    }
+
+    def image_key(img: Any) -> Tuple[str, Tuple[int, int]]:
+        return (
+            normalize_image_prompt(img["alt"]),
+            snap_to_size_bucket(*extract_dimensions(img["src"])),
+        )
+
+    # Map (normalized alt text, size bucket) to the first alt text seen for it
+    requests: Dict[Tuple[str, Tuple[int, int]], str] = {}
     for img in images:
-        # Only include URL if the image starts with https://placehold.co
-        # and it's not already in the image_cache
+        # Only include URL if the image starts with https://placehold.co,
+        # has alt text and it's not already in the image_cache
         if (
             img["src"].startswith("https://placehold.co")
-            and image_cache.get(img.get("alt")) is None
+            and img.get("alt") is not None
+            and normalized_image_cache.get(normalize_image_prompt(img["alt"])) is None
         ):
-            alts.append(img.get("alt", None))
-
-    # Exclude images with no alt text
-    filtered_alts: List[str] = [alt for alt in alts if alt is not None]
-
-    # Remove duplicates
-    prompts = list(set(filtered_alts))
+            # Duplicates are dropped, keeping document order for scheduling priority
+            requests.setdefault(image_key(img), img["alt"])
 
     # Return early if there are no images to replace
-    if len(prompts) == 0:
+    if len(requests) == 0:
         print("No images to replace")
         return code
 
-    # Generate images
-    results = await process_tasks(prompts, bedrock_access_key, bedrock_secret_key, bedrock_region, model)
+    # Use library images where a caption is close enough to the alt text
+    keys = list(requests.keys())
+    library_urls = await asyncio.to_thread(find_library_images, list(requests.values()))
+    mapped_images: Dict[Tuple[str, Tuple[int, int]], GeneratedImage | None] = {
+        key: GeneratedImage(url) for key, url in zip(keys, library_urls) if url is not None
+    }
 
-    # Create a dict mapping alt text to image URL
-    mapped_image_urls = dict(zip(prompts, results))
+    # Generate the remaining images
+    keys_to_generate = [key for key in keys if key not in mapped_images]
+    if keys_to_generate:
+        prompts = [requests[key] for key in keys_to_generate]
+        sizes = [size for (_, size) in keys_to_generate]
+        results = await process_tasks(prompts, bedrock_access_key, bedrock_secret_key, bedrock_region, model, sizes)
+        print(f"[IMAGE GENERATION] {len(prompts)} unique prompts for {len(images)} images")
 
-    # Merge with image_cache
-    mapped_image_urls = {**mapped_image_urls, **image_cache}
+        # Map (normalized alt text, size bucket) to the generated image
+        mapped_images.update(zip(keys_to_generate, results))
 
     # Replace old image URLs with the generated URLs
     for img in images:
@@ -221,17 +593,27 @@ async def generate_images(
         if not img["src"].startswith("https://placehold.co"):
             continue
 
-        new_url = mapped_image_urls[img.get("alt")]
+        alt = img.get("alt")
+        new_image = None
+        if alt is not None:
+            cached_url = normalized_image_cache.get(normalize_image_prompt(alt))
+            new_image = (
+                GeneratedImage(cached_url) if cached_url else mapped_images.get(image_key(img))
+            )
 
-        if new_url:
+        if new_image:
             # Set width and height attributes
             width, height = extract_dimensions(img["src"])
             img["width"] = width
             img["height"] = height
             # Replace img['src'] with the mapped image URL
-            img["src"] = new_url
+            img["src"] = new_image.url
+            # Let the browser pick a compressed derivative for the displayed size
+            if new_image.srcset:
+                img["srcset"] = new_image.srcset
+                img["sizes"] = f"(max-width: {width}px) 100vw, {width}px"
         else:
-            print("Image generation failed for alt text:" + img.get("alt"))
+            print(f"Image generation failed for alt text: {alt}")
 
     # Return the modified HTML
     # (need to prettify it because BeautifulSoup messes up the formatting)
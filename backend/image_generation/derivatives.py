@@ -0,0 +1,47 @@
+import io
+from typing import Dict, List
+from PIL import Image
+
+# Widths of the compressed WebP copies that are stored next to each generated PNG.
+# Fixed widths (rather than the exact display width) keep derivatives shareable
+# between pages that show the same image at different sizes.
+DERIVATIVE_WIDTHS = [256, 512, 768, 1024]
+WEBP_QUALITY = 80
+
+# Generated images are named by request hash. The same name can be generated
+# again (e.g. after eviction) with different bytes, but for the same request, so
+# a cached copy is still the right image.
+IMMUTABLE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+
+def derivative_name(request_hash: str, width: int) -> str:
+    return f"{request_hash}-{width}.webp"
+
+
+# Derivative widths for an image: the fixed widths below its own width,
+# plus a full-size WebP copy
+def get_derivative_widths(image_width: int) -> List[int]:
+    return [width for width in DERIVATIVE_WIDTHS if width < image_width] + [
+        image_width
+    ]
+
+
+# Blocking (CPU-bound); run in a worker thread
+def encode_webp_derivatives(image_data: bytes, widths: List[int]) -> Dict[int, bytes]:
+    image = Image.open(io.BytesIO(image_data))
+    image.load()
+
+    derivatives: Dict[int, bytes] = {}
+    for width in widths:
+        resized = image
+        if width < image.width:
+            height = max(1, round(image.height * width / image.width))
+            resized = image.resize((width, height), Image.Resampling.LANCZOS)
+        output = io.BytesIO()
+        resized.save(output, format="WEBP", quality=WEBP_QUALITY, method=4)
+        derivatives[width] = output.getvalue()
+    return derivatives
+
+
+def build_srcset(urls: Dict[int, str]) -> str:
+    return ", ".join(f"{url} {width}w" for width, url in sorted(urls.items()))
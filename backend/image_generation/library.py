@@ -0,0 +1,122 @@
+import json
+import math
+import os
+from collections import Counter, defaultdict
+from typing import Callable, Dict, List, Tuple
+
+IMAGE_EXTENSIONS = (".png", ".jpg", ".jpeg", ".webp")
+CAPTIONS_FILENAME = "captions.json"
+NGRAM_SIZE = 3
+
+
+def char_ngrams(text: str, n: int = NGRAM_SIZE) -> List[str]:
+    # Pad with spaces so that word boundaries are part of the n-grams
+    padded = f" {text} "
+    return [padded[i : i + n] for i in range(max(1, len(padded) - n + 1))]
+
+
+class ImageLibrary:
+    """
+    A local library of captioned images, searchable by caption similarity.
+
+    Captions are embedded as TF-IDF weighted character n-gram vectors. They
+    are kept sparse, as an inverted index from each n-gram to the captions
+    that contain it, so memory grows with the captions' length rather than
+    with captions times vocabulary, and a search only visits the captions
+    that share an n-gram with the query.
+    """
+
+    def __init__(
+        self,
+        entries: List[Tuple[str, str]],
+        normalize: Callable[[str], str] = lambda text: text,
+    ):
+        # entries: (filename, caption)
+        self.filenames = [filename for (filename, _) in entries]
+        self.normalize = normalize
+
+        documents = [Counter(char_ngrams(normalize(caption))) for (_, caption) in entries]
+
+        num_documents = len(documents)
+        document_frequency: Counter[str] = Counter()
+        for ngrams in documents:
+            document_frequency.update(ngrams.keys())
+
+        # Smoothed IDF; n-grams that never appear in a caption get the maximum weight
+        self.idf: Dict[str, float] = {
+            ngram: math.log((1 + num_documents) / (1 + frequency)) + 1
+            for ngram, frequency in document_frequency.items()
+        }
+        self.unseen_idf = math.log(1 + num_documents) + 1
+
+        # n-gram -> [(document, normalized weight)]
+        self.postings: Dict[str, List[Tuple[int, float]]] = defaultdict(list)
+        for row, ngrams in enumerate(documents):
+            weights = {ngram: count * self.idf[ngram] for ngram, count in ngrams.items()}
+            norm = max(math.sqrt(sum(weight**2 for weight in weights.values())), 1e-12)
+            for ngram, weight in weights.items():
+                self.postings[ngram].append((row, weight / norm))
+
+    def __len__(self) -> int:
+        return len(self.filenames)
+
+    @classmethod
+    def from_directory(
+        cls, directory: str, normalize: Callable[[str], str] = lambda text: text
+    ) -> "ImageLibrary":
+        """
+        Loads every image in the directory. Captions come from captions.json
+        ({"filename": "caption"}) when present, otherwise from the filename.
+        """
+        if not os.path.isdir(directory):
+            return cls([], normalize)
+
+        captions: Dict[str, str] = {}
+        captions_path = os.path.join(directory, CAPTIONS_FILENAME)
+        if os.path.exists(captions_path):
+            with open(captions_path, "r") as f:
+                captions = json.load(f)
+
+        entries: List[Tuple[str, str]] = []
+        for filename in sorted(os.listdir(directory)):
+            if not filename.lower().endswith(IMAGE_EXTENSIONS):
+                continue
+            caption = captions.get(
+                filename, os.path.splitext(filename)[0].replace("_", " ").replace("-", " ")
+            )
+            entries.append((filename, caption))
+
+        return cls(entries, normalize)
+
+    def _embed(self, query: str) -> Dict[str, float]:
+        weights: Dict[str, float] = {}
+        unseen_weight = 0.0
+        for ngram, count in Counter(char_ngrams(self.normalize(query))).items():
+            idf = self.idf.get(ngram)
+            if idf is None:
+                # N-grams missing from the vocabulary don't affect the dot
+                # product, but they do count towards the query's norm
+                unseen_weight += (count * self.unseen_idf) ** 2
+            else:
+                weights[ngram] = count * idf
+        norm = max(math.sqrt(sum(weight**2 for weight in weights.values()) + unseen_weight), 1e-12)
+        return {ngram: weight / norm for ngram, weight in weights.items()}
+
+    def search(self, queries: List[str]) -> List[Tuple[str, float]]:
+        """
+        Returns the best matching (filename, cosine similarity) for each query.
+        """
+        if len(self) == 0:
+            return [("", 0.0) for _ in queries]
+
+        results: List[Tuple[str, float]] = []
+        for query in queries:
+            similarities: Dict[int, float] = defaultdict(float)
+            for ngram, query_weight in self._embed(query).items():
+                for row, weight in self.postings[ngram]:
+                    similarities[row] += query_weight * weight
+            # Ties (and queries that share nothing with any caption) go to the
+            # first image
+            best = min(similarities, key=lambda row: (-similarities[row], row), default=0)
+            results.append((self.filenames[best], similarities.get(best, 0.0)))
+        return results
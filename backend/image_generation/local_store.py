@@ -0,0 +1,226 @@
+import asyncio
+import os
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Dict
+from starlette.responses import Response
+from starlette.staticfiles import StaticFiles
+from starlette.types import Scope
+from config import LOCAL_IMAGE_STORE_MAX_BYTES
+from image_generation.derivatives import IMMUTABLE_CACHE_CONTROL
+
+LOCAL_IMAGE_DIR = "static/images"
+
+
+# Images and their derivatives are named "<hash>.png" / "<hash>-<width>.webp"
+# and are stored and evicted together
+def group_of(name: str) -> str:
+    return name.split(".")[0].split("-")[0]
+
+
+# Write to a temp file in the same directory and rename it into place, so readers
+# (including the /static mount) never see a partially written image
+def write_file_atomic(path: str, data: bytes) -> None:
+    directory = os.path.dirname(path) or "."
+    with tempfile.NamedTemporaryFile(dir=directory, suffix=".tmp", delete=False) as file:
+        file.write(data)
+        temp_path = file.name
+    try:
+        os.replace(temp_path, path)
+    except BaseException:
+        os.remove(temp_path)
+        raise
+
+
+class LocalImageStore:
+    """
+    Stores generated images under a byte budget, evicting the least recently
+    used images (with their derivatives) first.
+
+    Files are sharded into subdirectories by the first two characters of their
+    hash, so no single directory grows too large.
+
+    Safe to use from the event loop and worker threads at the same time: the
+    index is guarded by a lock. A file can still be evicted between exists()
+    and reading it, in which case the read raises FileNotFoundError.
+    """
+
+    def __init__(
+        self,
+        root: str = LOCAL_IMAGE_DIR,
+        max_bytes: int = LOCAL_IMAGE_STORE_MAX_BYTES,
+        log_tag: str = "IMAGE STORE",
+    ):
+        self.root = root
+        self.max_bytes = max_bytes
+        self.log_tag = log_tag
+        self.lock = threading.RLock()
+        # group -> {name: size}, least recently used first
+        self.groups: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        self.total_bytes = 0
+
+        # Metrics
+        self.evictions = 0
+        self.evicted_bytes = 0
+
+    def relative_path(self, name: str) -> str:
+        return f"{self.root}/{name[:2]}/{name}"
+
+    def path(self, name: str) -> str:
+        return os.path.join(self.root, name[:2], name)
+
+    def exists(self, name: str) -> bool:
+        with self.lock:
+            return name in self.groups.get(group_of(name), {})
+
+    def touch(self, name: str) -> None:
+        group = group_of(name)
+        with self.lock:
+            if group in self.groups:
+                self.groups.move_to_end(group)
+
+    def read(self, name: str) -> bytes:
+        self.touch(name)
+        with open(self.path(name), "rb") as file:
+            return file.read()
+
+    def write(self, name: str, data: bytes) -> None:
+        path = self.path(name)
+        group = group_of(name)
+        # Written under the lock, so that a concurrent eviction can't remove
+        # the file before it is indexed
+        with self.lock:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_file_atomic(path, data)
+            self._forget(name)
+            self.groups.setdefault(group, {})[name] = len(data)
+            self.groups.move_to_end(group)
+            self.total_bytes += len(data)
+            self.evict(keep=group)
+
+    def remove(self, name: str) -> None:
+        with self.lock:
+            self._forget(name)
+            try:
+                os.remove(self.path(name))
+            except FileNotFoundError:
+                pass
+
+    def _forget(self, name: str) -> None:
+        group = group_of(name)
+        files = self.groups.get(group)
+        if files is None or name not in files:
+            return
+        self.total_bytes -= files.pop(name)
+        if not files:
+            del self.groups[group]
+
+    def evict(self, keep: str | None = None) -> None:
+        evicted = 0
+        with self.lock:
+            while self.total_bytes > self.max_bytes and self.groups:
+                group = next(iter(self.groups))
+                if group == keep:
+                    if len(self.groups) == 1:
+                        break
+                    self.groups.move_to_end(group)
+                    continue
+                for name in list(self.groups[group].keys()):
+                    size = self.groups[group][name]
+                    self.remove(name)
+                    self.evicted_bytes += size
+                self.evictions += 1
+                evicted += 1
+        if evicted:
+            print(f"[{self.log_tag}] Evicted {evicted} files, {self.stats()}")
+
+    def reconcile(self) -> None:
+        """
+        Rebuilds the index from disk on startup: removes leftover temp files,
+        moves files from the old flat layout into shard directories (their old
+        URLs are still served, see LocalImageStaticFiles) and orders images by
+        last access time.
+        """
+        start_time = time.time()
+        if not os.path.exists(self.root):
+            os.makedirs(self.root, exist_ok=True)
+
+        entries: list[tuple[float, str, int]] = []
+        for directory, _, filenames in os.walk(self.root):
+            for filename in filenames:
+                file_path = os.path.join(directory, filename)
+                if filename.endswith(".tmp"):
+                    os.remove(file_path)
+                    continue
+                if file_path != self.path(filename):
+                    os.makedirs(os.path.dirname(self.path(filename)), exist_ok=True)
+                    os.replace(file_path, self.path(filename))
+                    file_path = self.path(filename)
+                stat = os.stat(file_path)
+                entries.append((max(stat.st_atime, stat.st_mtime), filename, stat.st_size))
+
+        last_access: Dict[str, float] = {}
+        for accessed_at, filename, _ in entries:
+            group = group_of(filename)
+            last_access[group] = max(last_access.get(group, 0), accessed_at)
+        groups: "OrderedDict[str, Dict[str, int]]" = OrderedDict()
+        total_bytes = 0
+        for _, filename, size in sorted(entries, key=lambda entry: last_access[group_of(entry[1])]):
+            groups.setdefault(group_of(filename), {})[filename] = size
+            total_bytes += size
+        with self.lock:
+            self.groups = groups
+            self.total_bytes = total_bytes
+
+        print(
+            f"[{self.log_tag}] Reconciled {len(entries)} files in {time.time() - start_time:.2f} seconds, {self.stats()}"
+        )
+        self.evict()
+
+    def stats(self) -> Dict[str, int]:
+        with self.lock:
+            return {
+                "images": len(self.groups),
+                "total_bytes": self.total_bytes,
+                "max_bytes": self.max_bytes,
+                "evictions": self.evictions,
+                "evicted_bytes": self.evicted_bytes,
+            }
+
+
+class LocalImageStaticFiles(StaticFiles):
+    """
+    Serves a LocalImageStore. Images are named by request hash, so they're
+    cached forever.
+
+    URLs handed out before the store was sharded point at the flat path
+    ("<root>/<name>"), so those are served from the shard directory. Serving
+    an image counts as a use for LRU eviction.
+    """
+
+    def __init__(self, store: LocalImageStore, **kwargs: Any):
+        super().__init__(directory=store.root, check_dir=False, **kwargs)
+        self.store = store
+
+    def lookup_path(self, path: str) -> tuple[str, os.stat_result | None]:
+        full_path, stat_result = super().lookup_path(path)
+        if stat_result is None and os.path.dirname(path) == "":
+            full_path, stat_result = super().lookup_path(os.path.join(path[:2], path))
+        return full_path, stat_result
+
+    async def get_response(self, path: str, scope: Scope) -> Response:
+        response = await super().get_response(path, scope)
+        # In a thread, like the file lookup, since the store's lock can be held
+        # by a write or an eviction
+        await asyncio.to_thread(self.store.touch, os.path.basename(path))
+        return response
+
+    def file_response(self, *args, **kwargs):  # type: ignore
+        response = super().file_response(*args, **kwargs)  # type: ignore
+        response.headers["Cache-Control"] = IMMUTABLE_CACHE_CONTROL
+        return response
+
+
+local_image_store = LocalImageStore()
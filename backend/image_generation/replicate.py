@@ -1,62 +1,137 @@
 import asyncio
+import time
 import httpx
 
+REPLICATE_API_URL = "https://api.replicate.com/v1/predictions"
+
+# Ask Replicate to hold the create request open until the prediction is done
+# (up to this many seconds), so that most predictions need no polling at all
+PREFER_WAIT_SECONDS = 10
+
+MIN_POLL_INTERVAL = 0.2
+MAX_POLL_INTERVAL = 2.0
+POLL_BACKOFF = 1.5
+PREDICTION_TIMEOUT = 60.0
+
+# Exponentially weighted average of completion times per model version,
+# used to schedule the first poll
+observed_completion_times: dict[str, float] = {}
+COMPLETION_TIME_SMOOTHING = 0.3
+
+# Shared across calls so that connections are pooled
+replicate_client: httpx.AsyncClient | None = None
+
+
+def get_replicate_client() -> httpx.AsyncClient:
+    global replicate_client
+    if replicate_client is None or replicate_client.is_closed:
+        replicate_client = httpx.AsyncClient(
+            timeout=httpx.Timeout(PREFER_WAIT_SECONDS + 10),
+            limits=httpx.Limits(max_connections=20, max_keepalive_connections=10),
+        )
+    return replicate_client
+
+
+def record_completion_time(replicate_model_version: str, seconds: float) -> None:
+    previous = observed_completion_times.get(replicate_model_version)
+    if previous is None:
+        observed_completion_times[replicate_model_version] = seconds
+    else:
+        observed_completion_times[replicate_model_version] = (
+            COMPLETION_TIME_SMOOTHING * seconds
+            + (1 - COMPLETION_TIME_SMOOTHING) * previous
+        )
+
+
+def poll_intervals(replicate_model_version: str, elapsed: float):
+    # Wait until shortly before the prediction is expected to finish,
+    # then back off exponentially
+    expected = observed_completion_times.get(replicate_model_version)
+    interval = MIN_POLL_INTERVAL
+    if expected is not None:
+        interval = max(MIN_POLL_INTERVAL, 0.9 * expected - elapsed)
+    yield interval
+
+    interval = MIN_POLL_INTERVAL
+    while True:
+        yield interval
+        interval = min(MAX_POLL_INTERVAL, interval * POLL_BACKOFF)
+
+
+def get_output(prediction: dict[str, object]) -> str | None:
+    status = prediction.get("status")
+    if status == "succeeded":
+        return prediction["output"][0]  # type: ignore
+    elif status == "error":
+        raise ValueError(
+            f"Inference errored out: {prediction.get('error', 'Unknown error')}"
+        )
+    elif status == "failed":
+        raise ValueError("Inference failed")
+    return None
+
 
 async def call_replicate(
-    replicate_model_version: str, input: dict[str, str | int], api_token: str
+    replicate_model_version: str,
+    input: dict[str, str | int],
+    api_token: str,
+    base_url: str = REPLICATE_API_URL,
+    client: httpx.AsyncClient | None = None,
 ) -> str:
-    url = "https://api.replicate.com/v1/predictions"
     headers = {
         "Authorization": f"Bearer {api_token}",
         "Content-Type": "application/json",
+        "Prefer": f"wait={PREFER_WAIT_SECONDS}",
     }
 
     data = {"version": replicate_model_version, "input": input}
 
-    async with httpx.AsyncClient() as client:
-        try:
-            response = await client.post(url, headers=headers, json=data)
-            response.raise_for_status()
-            response_json = response.json()
-
-            # Extract the id from the response
-            prediction_id = response_json.get("id")
-            if not prediction_id:
-                raise ValueError("Prediction ID not found in initial response.")
-
-            # Polling every 1 second until the status is succeeded or error
-            num_polls = 0
-            max_polls = 100
-            while num_polls < max_polls:
-                num_polls += 1
-
-                await asyncio.sleep(0.2)
-
-                # Check the status
-                status_check_url = f"{url}/{prediction_id}"
-                status_response = await client.get(status_check_url, headers=headers)
-                status_response.raise_for_status()
-                status_response_json = status_response.json()
-                status = status_response_json.get("status")
-
-                # If status is succeeded or if there's an error, break out of the loop
-                if status == "succeeded":
-                    return status_response_json["output"][0]
-                elif status == "error":
-                    raise ValueError(
-                        f"Inference errored out: {status_response_json.get('error', 'Unknown error')}"
-                    )
-                elif status == "failed":
-                    raise ValueError("Inference failed")
-
-            # If we've reached here, it means we've exceeded the max number of polls
-            raise TimeoutError("Inference timed out")
-
-        except httpx.HTTPStatusError as e:
-            raise ValueError(f"HTTP error occurred: {e}")
-        except httpx.RequestError as e:
-            raise ValueError(f"An error occurred while requesting: {e}")
-        except asyncio.TimeoutError:
-            raise TimeoutError("Request timed out")
-        except Exception as e:
-            raise ValueError(f"An unexpected error occurred: {e}")
+    client = client or get_replicate_client()
+    start_time = time.monotonic()
+    num_polls = 0
+
+    try:
+        response = await client.post(base_url, headers=headers, json=data)
+        response.raise_for_status()
+        prediction = response.json()
+
+        # Extract the id from the response
+        prediction_id = prediction.get("id")
+        if not prediction_id:
+            raise ValueError("Prediction ID not found in initial response.")
+
+        # With Prefer: wait, the prediction is usually finished already
+        output = get_output(prediction)
+
+        status_check_url = prediction.get("urls", {}).get("get") or f"{base_url}/{prediction_id}"
+        intervals = poll_intervals(
+            replicate_model_version, time.monotonic() - start_time
+        )
+        while output is None:
+            if time.monotonic() - start_time > PREDICTION_TIMEOUT:
+                # If we've reached here, it means we've exceeded the deadline
+                raise TimeoutError("Inference timed out")
+
+            await asyncio.sleep(next(intervals))
+            num_polls += 1
+
+            # Check the status
+            status_response = await client.get(status_check_url, headers=headers)
+            status_response.raise_for_status()
+            output = get_output(status_response.json())
+
+        completion_time = time.monotonic() - start_time
+        record_completion_time(replicate_model_version, completion_time)
+        print(
+            f"[REPLICATE] Prediction completed in {completion_time:.2f} seconds after {num_polls} polls"
+        )
+        return output
+
+    except httpx.HTTPStatusError as e:
+        raise ValueError(f"HTTP error occurred: {e}")
+    except httpx.RequestError as e:
+        raise ValueError(f"An error occurred while requesting: {e}")
+    except (TimeoutError, asyncio.TimeoutError):
+        raise TimeoutError("Request timed out")
+    except Exception as e:
+        raise ValueError(f"An unexpected error occurred: {e}")
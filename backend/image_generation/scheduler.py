@@ -0,0 +1,163 @@
+import asyncio
+import heapq
+import itertools
+import time
+from typing import Any, Awaitable, Callable, Dict, List, TypeVar
+from config import (
+    IMAGE_GENERATION_MAX_CONCURRENCY,
+    IMAGE_GENERATION_RATE_PER_SECOND,
+    IMAGE_GENERATION_BURST,
+)
+
+T = TypeVar("T")
+
+# Per-model overrides for the number of in-flight invoke_model calls, for models
+# whose account quota differs from the default.
+# Models not listed here use IMAGE_GENERATION_MAX_CONCURRENCY.
+MODEL_CONCURRENCY_LIMITS: Dict[str, int] = {}
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated_at = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated_at) * self.rate)
+        self.updated_at = now
+
+    async def acquire(self) -> None:
+        # A rate of 0 disables rate limiting
+        if self.rate <= 0:
+            return
+        async with self.lock:
+            self._refill()
+            while self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+class ModelQueue:
+    def __init__(self, limit: int, bucket: TokenBucket):
+        self.limit = limit
+        self.bucket = bucket
+        self.active = 0
+        # Heap of (priority, sequence, future); lower priority values run first
+        self.waiters: List[Any] = []
+
+    def release(self) -> None:
+        self.active -= 1
+        self.wake_next()
+
+    def wake_next(self) -> None:
+        while self.waiters and self.active < self.limit:
+            _, _, future = heapq.heappop(self.waiters)
+            if future.done():
+                # The waiter was cancelled while queued
+                continue
+            self.active += 1
+            future.set_result(None)
+
+
+class ImageGenerationScheduler:
+    """
+    Process-wide scheduler for image generation calls.
+
+    Limits the number of concurrent calls per model, paces calls with a token
+    bucket and runs queued calls in priority order (lowest first), so images
+    that appear earlier on a page are generated first.
+    """
+
+    def __init__(
+        self,
+        max_concurrency: int = IMAGE_GENERATION_MAX_CONCURRENCY,
+        rate_per_second: float = IMAGE_GENERATION_RATE_PER_SECOND,
+        burst: float = IMAGE_GENERATION_BURST,
+        model_limits: Dict[str, int] = MODEL_CONCURRENCY_LIMITS,
+    ):
+        self.max_concurrency = max_concurrency
+        self.rate_per_second = rate_per_second
+        self.burst = burst
+        self.model_limits = model_limits
+        self.queues: Dict[str, ModelQueue] = {}
+        self.sequence = itertools.count()
+
+        # Metrics
+        self.total_scheduled = 0
+        self.total_wait_time = 0.0
+        self.max_wait_time = 0.0
+
+    def _get_queue(self, model: str) -> ModelQueue:
+        if model not in self.queues:
+            limit = self.model_limits.get(model, self.max_concurrency)
+            self.queues[model] = ModelQueue(
+                max(1, limit), TokenBucket(self.rate_per_second, self.burst)
+            )
+        return self.queues[model]
+
+    async def run(
+        self, model: str, priority: int, fn: Callable[[], Awaitable[T]]
+    ) -> T:
+        queue = self._get_queue(model)
+        start_time = time.monotonic()
+
+        if queue.active < queue.limit and not queue.waiters:
+            queue.active += 1
+        else:
+            future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            heapq.heappush(queue.waiters, (priority, next(self.sequence), future))
+            # Slots may be free if the queue only held cancelled waiters
+            queue.wake_next()
+            try:
+                await future
+            except asyncio.CancelledError:
+                if future.done() and not future.cancelled():
+                    # We were granted a slot right before being cancelled
+                    queue.release()
+                raise
+
+        try:
+            await queue.bucket.acquire()
+            self._record_wait(model, time.monotonic() - start_time)
+            return await fn()
+        finally:
+            queue.release()
+
+    def _record_wait(self, model: str, wait_time: float) -> None:
+        self.total_scheduled += 1
+        self.total_wait_time += wait_time
+        self.max_wait_time = max(self.max_wait_time, wait_time)
+        if wait_time > 1:
+            print(
+                f"[IMAGE SCHEDULER] {model} waited {wait_time:.2f} seconds, queue depth {self.queue_depth(model)}"
+            )
+
+    def queue_depth(self, model: str | None = None) -> int:
+        if model is None:
+            queues = list(self.queues.values())
+        else:
+            queues = [self.queues[model]] if model in self.queues else []
+        return sum(
+            1 for queue in queues for (_, _, future) in queue.waiters if not future.done()
+        )
+
+    def stats(self) -> Dict[str, float]:
+        return {
+            "queue_depth": self.queue_depth(),
+            "active": sum(queue.active for queue in self.queues.values()),
+            "total_scheduled": self.total_scheduled,
+            "average_wait_time": (
+                self.total_wait_time / self.total_scheduled
+                if self.total_scheduled
+                else 0.0
+            ),
+            "max_wait_time": self.max_wait_time,
+        }
+
+
+image_generation_scheduler = ImageGenerationScheduler()
@@ -0,0 +1,33 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Generic, TypeVar
+
+T = TypeVar("T")
+
+
+class SingleFlight(Generic[T]):
+    """
+    Coalesces concurrent calls that share a key so that only one of them runs.
+
+    The call runs in its own task, so a caller that is cancelled (for example
+    because its websocket closed) does not cancel the work for the others.
+    """
+
+    def __init__(self):
+        self.in_flight: Dict[str, "asyncio.Task[T]"] = {}
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self.in_flight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self.in_flight[key] = task
+
+            def forget(_: Any, key: str = key) -> None:
+                if self.in_flight.get(key) is task:
+                    del self.in_flight[key]
+
+            task.add_done_callback(forget)
+        else:
+            self.coalesced += 1
+
+        return await asyncio.shield(task)
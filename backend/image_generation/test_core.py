@@ -0,0 +1,201 @@
+import io
+import tempfile
+import threading
+import unittest
+from collections import OrderedDict
+from unittest import mock
+from PIL import Image
+from image_generation.core import (
+    DEFAULT_IMAGE_SIZE,
+    IMAGE_SIZE_BUCKETS,
+    StoredImage,
+    get_s3_client,
+    normalize_image_prompt,
+    presign_images,
+    snap_to_size_bucket,
+    store_image,
+)
+from image_generation.derivatives import IMMUTABLE_CACHE_CONTROL
+from image_generation.local_store import LocalImageStore
+
+
+class TestSnapToSizeBucket(unittest.TestCase):
+
+    def test_small_square_uses_smallest_square_bucket(self):
+        self.assertEqual(snap_to_size_bucket(100, 100), (512, 512))
+
+    def test_large_square_uses_larger_square_bucket(self):
+        self.assertEqual(snap_to_size_bucket(800, 800), (1024, 1024))
+
+    def test_wide_banner_keeps_its_aspect_ratio(self):
+        self.assertEqual(snap_to_size_bucket(1200, 600), (1408, 640))
+        self.assertEqual(snap_to_size_bucket(300, 200), (576, 384))
+
+    def test_tall_image_keeps_its_aspect_ratio(self):
+        self.assertEqual(snap_to_size_bucket(600, 1200), (640, 1408))
+
+    def test_oversized_request_uses_largest_bucket(self):
+        self.assertEqual(snap_to_size_bucket(4000, 4000), (1024, 1024))
+
+    def test_invalid_dimensions_use_default(self):
+        self.assertEqual(snap_to_size_bucket(0, 200), DEFAULT_IMAGE_SIZE)
+
+    def test_always_returns_a_bucket(self):
+        for width in range(50, 2000, 97):
+            for height in range(50, 2000, 89):
+                self.assertIn(snap_to_size_bucket(width, height), IMAGE_SIZE_BUCKETS)
+
+
+class TestNormalizeImagePrompt(unittest.TestCase):
+
+    def test_case_and_whitespace(self):
+        self.assertEqual(
+            normalize_image_prompt("Profile picture of John"),
+            normalize_image_prompt("  profile picture of   john "),
+        )
+
+    def test_punctuation(self):
+        self.assertEqual(normalize_image_prompt("Team Coco!"), "team coco")
+
+    def test_filler_prefixes(self):
+        self.assertEqual(normalize_image_prompt("Image of a red car."), "red car")
+        self.assertEqual(
+            normalize_image_prompt("Placeholder image of placeholder image of a PDF cover"),
+            "pdf cover",
+        )
+
+    def test_keeps_meaningful_prefixes(self):
+        self.assertEqual(
+            normalize_image_prompt("Profile picture of Andrej Karpathy"),
+            "profile picture of andrej karpathy",
+        )
+
+    def test_non_latin_text(self):
+        self.assertEqual(normalize_image_prompt("课程入口 "), "课程入口")
+
+    def test_filler_only_prompt_is_not_empty(self):
+        self.assertEqual(normalize_image_prompt("Placeholder"), "placeholder")
+
+
+class TestStoreImage(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalImageStore(self.directory.name, max_bytes=10**6)
+        self.patcher = mock.patch("image_generation.core.local_image_store", self.store)
+        self.patcher.start()
+
+    def tearDown(self):
+        self.patcher.stop()
+        self.directory.cleanup()
+
+    async def generate(self) -> bytes:
+        raise AssertionError("The image should not be generated")
+
+    async def test_uses_images_stored_under_their_legacy_key(self):
+        self.store.write("legacy.png", b"png")
+        self.store.write("legacy-256.webp", b"webp")
+        stored_hash = await store_image("normalized", self.generate, [256], None, None, "legacy")
+        self.assertEqual(stored_hash, "legacy")
+        self.assertFalse(self.store.exists("normalized.png"))
+
+    async def test_prefers_the_normalized_key(self):
+        self.store.write("legacy.png", b"png")
+        self.store.write("normalized.png", b"png")
+        self.store.write("normalized-256.webp", b"webp")
+        stored_hash = await store_image("normalized", self.generate, [256], None, None, "legacy")
+        self.assertEqual(stored_hash, "normalized")
+
+    async def test_writes_to_the_store_off_the_event_loop(self):
+        png = io.BytesIO()
+        Image.new("RGB", (300, 300), "red").save(png, format="PNG")
+
+        async def generate() -> bytes:
+            return png.getvalue()
+
+        writer_threads = []
+        write = self.store.write
+
+        def record_write(name: str, data: bytes):
+            writer_threads.append(threading.current_thread())
+            write(name, data)
+
+        with mock.patch.object(self.store, "write", side_effect=record_write):
+            await store_image("abc", generate, [256], None, None)
+
+        self.assertEqual(len(writer_threads), 2)
+        self.assertNotIn(threading.main_thread(), writer_threads)
+        self.assertTrue(self.store.exists("abc-256.webp"))
+
+
+
+class TestStoreImageInS3(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalImageStore(self.directory.name, max_bytes=10**6)
+        self.s3_client = mock.MagicMock()
+        self.s3_client.list_objects_v2.return_value = {}
+        self.s3_client.generate_presigned_url.side_effect = (
+            lambda method, Params, ExpiresIn: f"https://{Params['Bucket']}.s3/{Params['Key']}?signature"
+        )
+        self.patchers = [
+            mock.patch("image_generation.core.local_image_store", self.store),
+            mock.patch("image_generation.core.get_s3_client", return_value=self.s3_client),
+            mock.patch("image_generation.core.IMAGE_OUPUT_S3_BUCKET", "bucket"),
+            mock.patch("image_generation.core.IMAGE_OUTPUT_S3_UPLOAD_FROM_FILE", False),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.directory.cleanup()
+
+    async def test_uploads_generated_images_from_memory(self):
+        async def generate() -> bytes:
+            return b"png bytes"
+
+        stored_hash = await store_image("abc", generate, [], "key", "secret")
+
+        self.assertEqual(stored_hash, "abc")
+        self.s3_client.put_object.assert_called_once_with(
+            Bucket="bucket",
+            Key="abc.png",
+            Body=b"png bytes",
+            ContentType="image/png",
+            CacheControl=IMMUTABLE_CACHE_CONTROL,
+        )
+        self.s3_client.upload_file.assert_not_called()
+        self.assertEqual(self.store.stats()["images"], 0)
+
+        image = presign_images([StoredImage(stored_hash, [])], "key", "secret")[0]
+        assert image is not None
+        self.assertEqual(image.url, "https://bucket.s3/abc.png?signature")
+
+
+class TestS3Urls(unittest.TestCase):
+
+    def test_reuses_one_client_per_credential_set(self):
+        with (
+            mock.patch("image_generation.core.boto3.client") as create_client,
+            mock.patch("image_generation.core.s3_clients", OrderedDict()),
+        ):
+            self.assertIs(get_s3_client("a", "b"), get_s3_client("a", "b"))
+            get_s3_client("c", "d")
+        self.assertEqual(create_client.call_count, 2)
+
+    def test_presigns_images_and_their_derivatives(self):
+        with mock.patch("image_generation.core.IMAGE_OUPUT_S3_BUCKET", "bucket"):
+            images = presign_images([StoredImage("abc", [256, 512]), None], "key", "secret")
+        image = images[0]
+        assert image is not None and image.srcset is not None
+        self.assertIn("/abc.png?", image.url)
+        self.assertIn("/abc-256.webp?", image.srcset)
+        self.assertIn(" 512w", image.srcset)
+        self.assertIsNone(images[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,36 @@
+import io
+import unittest
+from PIL import Image
+from image_generation.derivatives import (
+    build_srcset,
+    encode_webp_derivatives,
+    get_derivative_widths,
+)
+
+
+class TestDerivatives(unittest.TestCase):
+
+    def test_derivative_widths(self):
+        self.assertEqual(get_derivative_widths(512), [256, 512])
+        self.assertEqual(get_derivative_widths(1408), [256, 512, 768, 1024, 1408])
+
+    def test_encode_webp_derivatives_keeps_aspect_ratio(self):
+        buffer = io.BytesIO()
+        Image.new("RGB", (1152, 768), (10, 120, 200)).save(buffer, format="PNG")
+
+        derivatives = encode_webp_derivatives(buffer.getvalue(), [256, 1152])
+
+        self.assertEqual(sorted(derivatives.keys()), [256, 1152])
+        small = Image.open(io.BytesIO(derivatives[256]))
+        self.assertEqual(small.format, "WEBP")
+        self.assertEqual(small.size, (256, 171))
+        self.assertEqual(Image.open(io.BytesIO(derivatives[1152])).size, (1152, 768))
+
+    def test_build_srcset(self):
+        self.assertEqual(
+            build_srcset({512: "b.webp", 256: "a.webp"}), "a.webp 256w, b.webp 512w"
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
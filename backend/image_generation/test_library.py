@@ -0,0 +1,59 @@
+import json
+import os
+import tempfile
+import unittest
+from image_generation.core import normalize_image_prompt
+from image_generation.library import ImageLibrary
+
+
+class TestImageLibrary(unittest.TestCase):
+
+    def setUp(self):
+        self.library = ImageLibrary(
+            [
+                ("avatar.png", "Profile picture of a smiling woman"),
+                ("car.jpg", "Red sports car on a mountain road"),
+                ("logo.png", "Company logo with a green sprout"),
+            ],
+            normalize=normalize_image_prompt,
+        )
+
+    def test_exact_caption_has_similarity_one(self):
+        [(filename, score)] = self.library.search(["Red sports car on a mountain road"])
+        self.assertEqual(filename, "car.jpg")
+        self.assertAlmostEqual(score, 1.0, places=5)
+
+    def test_similar_prompts_match_best_caption(self):
+        results = self.library.search(
+            ["Image of a red sports car", "profile picture of smiling woman"]
+        )
+        self.assertEqual([filename for (filename, _) in results], ["car.jpg", "avatar.png"])
+        self.assertTrue(all(0 < score < 1 for (_, score) in results))
+
+    def test_unrelated_prompt_scores_low(self):
+        [(_, score)] = self.library.search(["Quarterly revenue chart"])
+        self.assertLess(score, 0.3)
+
+    def test_prompt_sharing_no_ngrams_scores_zero(self):
+        self.assertEqual(self.library.search(["xyzzy"]), [("avatar.png", 0.0)])
+
+    def test_empty_library(self):
+        self.assertEqual(ImageLibrary([]).search(["anything"]), [("", 0.0)])
+
+    def test_from_directory_reads_captions_and_filenames(self):
+        with tempfile.TemporaryDirectory() as directory:
+            for filename in ["mountain_lake.png", "team.jpg", "notes.txt"]:
+                open(os.path.join(directory, filename), "wb").close()
+            with open(os.path.join(directory, "captions.json"), "w") as f:
+                json.dump({"team.jpg": "Team photo in the office"}, f)
+
+            library = ImageLibrary.from_directory(directory)
+            self.assertEqual(library.filenames, ["mountain_lake.png", "team.jpg"])
+            [(filename, _), (filename2, _)] = library.search(
+                ["mountain lake", "Team photo in the office"]
+            )
+            self.assertEqual((filename, filename2), ("mountain_lake.png", "team.jpg"))
+
+
+if __name__ == "__main__":
+    unittest.main()
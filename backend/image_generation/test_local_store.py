@@ -0,0 +1,133 @@
+import os
+import tempfile
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+from starlette.applications import Starlette
+from starlette.routing import Mount
+from starlette.testclient import TestClient
+from image_generation.local_store import LocalImageStaticFiles, LocalImageStore
+
+
+class TestLocalImageStore(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.root = self.directory.name
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_write_shards_by_hash_prefix(self):
+        store = LocalImageStore(self.root, max_bytes=1000)
+        store.write("abcd.png", b"x" * 10)
+        self.assertTrue(os.path.exists(os.path.join(self.root, "ab", "abcd.png")))
+        self.assertEqual(store.relative_path("abcd.png"), f"{self.root}/ab/abcd.png")
+        self.assertTrue(store.exists("abcd.png"))
+
+    def test_evicts_least_recently_used_image_with_its_derivatives(self):
+        store = LocalImageStore(self.root, max_bytes=90)
+        store.write("aaaa.png", b"x" * 30)
+        store.write("aaaa-256.webp", b"x" * 10)
+        store.write("bbbb.png", b"x" * 30)
+        store.touch("aaaa.png")
+        store.write("cccc.png", b"x" * 30)
+
+        self.assertFalse(store.exists("bbbb.png"))
+        self.assertTrue(store.exists("aaaa.png"))
+        self.assertTrue(store.exists("aaaa-256.webp"))
+        self.assertFalse(os.path.exists(store.path("bbbb.png")))
+        self.assertEqual(store.stats()["evictions"], 1)
+        self.assertEqual(store.stats()["evicted_bytes"], 30)
+        self.assertEqual(store.total_bytes, 70)
+
+    def test_keeps_newest_image_even_if_over_budget(self):
+        store = LocalImageStore(self.root, max_bytes=10)
+        store.write("aaaa.png", b"x" * 30)
+        self.assertTrue(store.exists("aaaa.png"))
+
+    def test_reconcile_migrates_flat_layout_and_removes_temp_files(self):
+        with open(os.path.join(self.root, "abcd.png"), "wb") as f:
+            f.write(b"x" * 10)
+        with open(os.path.join(self.root, "tmp123.tmp"), "wb") as f:
+            f.write(b"partial")
+
+        store = LocalImageStore(self.root, max_bytes=1000)
+        store.reconcile()
+
+        self.assertTrue(store.exists("abcd.png"))
+        self.assertTrue(os.path.exists(os.path.join(self.root, "ab", "abcd.png")))
+        self.assertFalse(os.path.exists(os.path.join(self.root, "tmp123.tmp")))
+        self.assertEqual(store.total_bytes, 10)
+
+    def test_reconcile_evicts_oldest_images_over_budget(self):
+        for index, name in enumerate(["aaaa.png", "bbbb.png"]):
+            path = os.path.join(self.root, name)
+            with open(path, "wb") as f:
+                f.write(b"x" * 30)
+            os.utime(path, (1000 + index, 1000 + index))
+
+        store = LocalImageStore(self.root, max_bytes=40)
+        store.reconcile()
+
+        self.assertFalse(store.exists("aaaa.png"))
+        self.assertTrue(store.exists("bbbb.png"))
+
+    def test_concurrent_writes_and_reads_keep_the_index_consistent(self):
+        store = LocalImageStore(self.root, max_bytes=500)
+
+        def use(i: int):
+            name = f"{i % 40:04d}.png"
+            store.write(name, b"x" * 50)
+            if store.exists(name):
+                try:
+                    store.read(name)
+                except FileNotFoundError:
+                    pass  # Evicted since
+
+        with ThreadPoolExecutor(16) as executor:
+            list(executor.map(use, range(2000)))
+
+        sizes = [size for files in store.groups.values() for size in files.values()]
+        self.assertEqual(store.total_bytes, sum(sizes))
+        self.assertLessEqual(store.total_bytes, 500)
+        for files in store.groups.values():
+            for name in files:
+                self.assertTrue(os.path.exists(store.path(name)))
+
+
+class TestLocalImageStaticFiles(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalImageStore(self.directory.name, max_bytes=1000)
+        app = Starlette(routes=[Mount("/images", LocalImageStaticFiles(self.store))])
+        self.client = TestClient(app)
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def test_serves_images_with_immutable_caching(self):
+        self.store.write("abcd.png", b"png")
+        response = self.client.get("/images/ab/abcd.png")
+        self.assertEqual(response.content, b"png")
+        self.assertIn("immutable", response.headers["Cache-Control"])
+
+    def test_serves_urls_from_before_sharding(self):
+        with open(os.path.join(self.directory.name, "abcd.png"), "wb") as f:
+            f.write(b"png")
+        self.store.reconcile()
+        self.assertEqual(self.client.get("/images/abcd.png").content, b"png")
+        self.assertEqual(self.client.get("/images/ab/abcd.png").content, b"png")
+        self.assertEqual(self.client.get("/images/efgh.png").status_code, 404)
+
+    def test_serving_counts_as_a_use(self):
+        self.store.write("aaaa.png", b"x" * 400)
+        self.store.write("bbbb.png", b"x" * 400)
+        self.client.get("/images/aa/aaaa.png")
+        self.store.write("cccc.png", b"x" * 400)
+        self.assertTrue(self.store.exists("aaaa.png"))
+        self.assertFalse(self.store.exists("bbbb.png"))
+
+
+if __name__ == "__main__":
+    unittest.main()
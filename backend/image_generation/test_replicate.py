@@ -0,0 +1,82 @@
+import unittest
+from typing import Any
+import httpx
+from fastapi import FastAPI, Request
+from image_generation import replicate
+from image_generation.replicate import call_replicate
+
+BASE_URL = "http://replicate.test/v1/predictions"
+
+
+# Local stand-in for the Replicate predictions API. A prediction succeeds after
+# `polls_until_done` status checks, or right away if the client sent Prefer: wait
+# and `honor_prefer_wait` is set.
+def create_stand_in_app(polls_until_done: int, honor_prefer_wait: bool) -> Any:
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.polls = {}
+
+    def prediction(prediction_id: str, done: bool) -> dict[str, Any]:
+        return {
+            "id": prediction_id,
+            "status": "succeeded" if done else "processing",
+            "output": [f"https://replicate.test/{prediction_id}.png"] if done else None,
+        }
+
+    @app.post("/v1/predictions")
+    async def create(request: Request):  # type: ignore
+        app.state.requests += 1
+        prediction_id = f"p{app.state.requests}"
+        app.state.polls[prediction_id] = 0
+        done = honor_prefer_wait and request.headers.get("prefer", "").startswith("wait")
+        return prediction(prediction_id, done)
+
+    @app.get("/v1/predictions/{prediction_id}")
+    async def get(prediction_id: str):  # type: ignore
+        app.state.requests += 1
+        app.state.polls[prediction_id] += 1
+        return prediction(
+            prediction_id, app.state.polls[prediction_id] >= polls_until_done
+        )
+
+    return app
+
+
+class TestCallReplicate(unittest.IsolatedAsyncioTestCase):
+
+    def setUp(self):
+        replicate.observed_completion_times.clear()
+
+    async def call(self, app: Any) -> str:
+        async with httpx.AsyncClient(
+            transport=httpx.ASGITransport(app=app)  # type: ignore
+        ) as client:
+            return await call_replicate(
+                "version", {"prompt": "cat"}, "token", base_url=BASE_URL, client=client
+            )
+
+    async def test_prefer_wait_needs_no_polling(self):
+        app = create_stand_in_app(polls_until_done=5, honor_prefer_wait=True)
+        self.assertEqual(await self.call(app), "https://replicate.test/p1.png")
+        self.assertEqual(app.state.requests, 1)
+
+    async def test_polls_until_succeeded(self):
+        app = create_stand_in_app(polls_until_done=3, honor_prefer_wait=False)
+        self.assertEqual(await self.call(app), "https://replicate.test/p1.png")
+        self.assertEqual(app.state.polls["p1"], 3)
+        self.assertIn("version", replicate.observed_completion_times)
+
+    def test_poll_intervals_back_off_and_use_observed_times(self):
+        intervals = replicate.poll_intervals("version", 0)
+        first_intervals = [next(intervals) for _ in range(8)]
+        self.assertEqual(first_intervals[0], replicate.MIN_POLL_INTERVAL)
+        self.assertEqual(first_intervals, sorted(first_intervals))
+        self.assertEqual(first_intervals[-1], replicate.MAX_POLL_INTERVAL)
+
+        replicate.record_completion_time("version", 3.0)
+        intervals = replicate.poll_intervals("version", 0.5)
+        self.assertAlmostEqual(next(intervals), 0.9 * 3.0 - 0.5)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,71 @@
+import asyncio
+import unittest
+from image_generation.scheduler import ImageGenerationScheduler
+
+
+class TestImageGenerationScheduler(unittest.IsolatedAsyncioTestCase):
+
+    async def test_limits_concurrency_per_model(self):
+        scheduler = ImageGenerationScheduler(max_concurrency=2, rate_per_second=0)
+        active = 0
+        max_active = 0
+
+        async def job():
+            nonlocal active, max_active
+            active += 1
+            max_active = max(max_active, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+            return True
+
+        results = await asyncio.gather(
+            *[scheduler.run("model", i, job) for i in range(6)]
+        )
+        self.assertEqual(results, [True] * 6)
+        self.assertEqual(max_active, 2)
+        self.assertEqual(scheduler.stats()["total_scheduled"], 6)
+        self.assertEqual(scheduler.queue_depth(), 0)
+
+    async def test_runs_queued_calls_in_priority_order(self):
+        scheduler = ImageGenerationScheduler(max_concurrency=1, rate_per_second=0)
+        order: list[int] = []
+        blocker = asyncio.Event()
+
+        async def job(index: int):
+            if index == -1:
+                await blocker.wait()
+            order.append(index)
+
+        first = asyncio.create_task(scheduler.run("model", -1, lambda: job(-1)))
+        await asyncio.sleep(0)
+        queued = [
+            asyncio.create_task(scheduler.run("model", i, lambda i=i: job(i)))
+            for i in [3, 1, 2]
+        ]
+        await asyncio.sleep(0)
+        self.assertEqual(scheduler.queue_depth("model"), 3)
+
+        blocker.set()
+        await asyncio.gather(first, *queued)
+        self.assertEqual(order, [-1, 1, 2, 3])
+
+    async def test_cancelled_waiter_does_not_hold_a_slot(self):
+        scheduler = ImageGenerationScheduler(max_concurrency=1, rate_per_second=0)
+        blocker = asyncio.Event()
+
+        first = asyncio.create_task(scheduler.run("model", 0, blocker.wait))
+        await asyncio.sleep(0)
+        cancelled = asyncio.create_task(scheduler.run("model", 1, blocker.wait))
+        await asyncio.sleep(0)
+        cancelled.cancel()
+        blocker.set()
+        await first
+
+        result = await asyncio.wait_for(
+            scheduler.run("model", 2, lambda: asyncio.sleep(0, "done")), timeout=1
+        )
+        self.assertEqual(result, "done")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,60 @@
+import asyncio
+import unittest
+from image_generation.singleflight import SingleFlight
+
+
+class TestSingleFlight(unittest.IsolatedAsyncioTestCase):
+
+    async def test_coalesces_concurrent_calls(self):
+        singleflight: SingleFlight[str] = SingleFlight()
+        calls = 0
+
+        async def generate():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.01)
+            return "image"
+
+        results = await asyncio.gather(
+            *[singleflight.do("hash", generate) for _ in range(5)]
+        )
+        self.assertEqual(results, ["image"] * 5)
+        self.assertEqual(calls, 1)
+        self.assertEqual(singleflight.coalesced, 4)
+        self.assertEqual(singleflight.in_flight, {})
+
+    async def test_cancelled_caller_does_not_cancel_others(self):
+        singleflight: SingleFlight[str] = SingleFlight()
+
+        async def generate():
+            await asyncio.sleep(0.01)
+            return "image"
+
+        first = asyncio.create_task(singleflight.do("hash", generate))
+        second = asyncio.create_task(singleflight.do("hash", generate))
+        await asyncio.sleep(0)
+        first.cancel()
+        self.assertEqual(await second, "image")
+
+    async def test_errors_are_shared_and_not_cached(self):
+        singleflight: SingleFlight[str] = SingleFlight()
+
+        async def fail():
+            await asyncio.sleep(0)
+            raise ValueError("throttled")
+
+        results = await asyncio.gather(
+            singleflight.do("hash", fail),
+            singleflight.do("hash", fail),
+            return_exceptions=True,
+        )
+        self.assertTrue(all(isinstance(r, ValueError) for r in results))
+
+        async def succeed():
+            return "image"
+
+        self.assertEqual(await singleflight.do("hash", succeed), "image")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,19 +1,36 @@
 import base64
 import io
+import math
 import time
 from PIL import Image
 
 CLAUDE_IMAGE_MAX_SIZE = 5 * 1024 * 1024
 CLAUDE_MAX_IMAGE_DIMENSION = 7990
+# Claude downscales larger images to fit these before tokenizing them, at
+# about 750 pixels per token
+CLAUDE_EFFECTIVE_MAX_DIMENSION = 1568
+CLAUDE_EFFECTIVE_MAX_PIXELS = 1_200_000
+CLAUDE_PIXELS_PER_TOKEN = 750
 
 
-# Process image so it meets Claude requirements
-def process_image(image_data_url: str) -> tuple[str, str]:
+# Size an image is downscaled to by Claude (keeping the aspect ratio)
+def get_effective_image_size(width: int, height: int) -> tuple[int, int]:
+    scale = min(
+        1.0,
+        CLAUDE_EFFECTIVE_MAX_DIMENSION / max(width, height),
+        (CLAUDE_EFFECTIVE_MAX_PIXELS / (width * height)) ** 0.5,
+    )
+    return max(1, int(width * scale)), max(1, int(height * scale))
+
 
-    # Extract bytes and media type from base64 data URL
-    media_type = image_data_url.split(";")[0].split(":")[1]
-    base64_data = image_data_url.split(",")[1]
-    image_bytes = base64.b64decode(base64_data)
+# Approximate number of input tokens for an image
+def estimate_image_tokens(width: int, height: int) -> int:
+    effective_width, effective_height = get_effective_image_size(width, height)
+    return math.ceil(effective_width * effective_height / CLAUDE_PIXELS_PER_TOKEN)
+
+
+# Process image so it meets Claude requirements
+def process_image(image_bytes: bytes) -> tuple[str, bytes]:
 
     img = Image.open(io.BytesIO(image_bytes))
 
@@ -60,7 +77,7 @@ def process_image(image_data_url: str) -> tuple[str, str]:
         quality -= 5
 
     # Log so we know it was modified
-    old_size = len(base64_data)
+    old_size = len(base64.b64encode(image_bytes))
     new_size = len(base64.b64encode(output.getvalue()))
     print(
         f"[CLAUDE IMAGE PROCESSING] image size updated: old size = {old_size} bytes, new size = {new_size} bytes"
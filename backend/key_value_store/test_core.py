@@ -0,0 +1,52 @@
+import os
+import tempfile
+import unittest
+from unittest import mock
+from key_value_store.core import MemoryKeyValueStore, SQLiteKeyValueStore
+
+
+class TestKeyValueStores(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def create_stores(self, max_entries: int, ttl: float):
+        path = os.path.join(self.directory.name, "store.sqlite3")
+        return [MemoryKeyValueStore(max_entries, ttl), SQLiteKeyValueStore(path, max_entries, ttl)]
+
+    def test_evicts_least_recently_used(self):
+        for store in self.create_stores(max_entries=2, ttl=100):
+            with (
+                self.subTest(store=type(store).__name__),
+                mock.patch("key_value_store.core.time.time", side_effect=range(1, 100)),
+            ):
+                store.set("a", "A")
+                store.set("b", "B")
+                self.assertEqual(store.get("a"), "A")
+                store.set("c", "C")
+
+                self.assertIsNone(store.get("b"))
+                self.assertEqual(store.get("a"), "A")
+                self.assertEqual(store.get("c"), "C")
+
+    def test_expires_after_ttl(self):
+        for store in self.create_stores(max_entries=10, ttl=5):
+            with self.subTest(store=type(store).__name__):
+                with mock.patch("key_value_store.core.time.time", return_value=100):
+                    store.set("a", "A")
+                with mock.patch("key_value_store.core.time.time", return_value=104):
+                    self.assertEqual(store.get("a"), "A")
+                with mock.patch("key_value_store.core.time.time", return_value=106):
+                    self.assertIsNone(store.get("a"))
+
+    def test_sqlite_store_persists_across_instances(self):
+        path = os.path.join(self.directory.name, "store.sqlite3")
+        SQLiteKeyValueStore(path, 10, 100).set("a", "A")
+        self.assertEqual(SQLiteKeyValueStore(path, 10, 100).get("a"), "A")
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -10,6 +10,7 @@ from openai import AsyncOpenAI
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionChunk
 from config import IS_DEBUG_ENABLED
 from debug.DebugFileWriter import DebugFileWriter
+from assets.core import load_asset_or_data_url
 from image_processing.utils import process_image
 
 from utils import pprint_prompt
@@ -68,6 +69,12 @@ async def stream_openai_response(
     return full_response
 
 
+# Reads an image of the prompt (the handle of an uploaded asset, or a data URL)
+# and processes it for Claude. Blocking.
+def load_prompt_image(image_url: str) -> tuple[str, bytes]:
+    return process_image(load_asset_or_data_url(image_url))
+
+
 # TODO: Have a seperate function that translates OpenAI messages to Claude messages
 async def stream_claude_response(
     messages: List[ChatCompletionMessageParam],
@@ -97,13 +104,15 @@ async def stream_claude_response(
             if content["type"] == "image_url":
                 content["type"] = "image"
 
-                # Extract base64 data and media type from data URL
+                # The handle of an uploaded asset, or a base64 data URL
                 # Example base64 data URL: data:image/png;base64,iVBOR...
                 image_data_url = cast(str, content["image_url"]["url"])
 
                 # Process image and split media type and data
                 # so it works with Claude (under 5mb in base64 encoding)
-                (media_type, base64_data) = process_image(image_data_url)
+                (media_type, base64_data) = await asyncio.to_thread(
+                    load_prompt_image, image_data_url
+                )
 
                 # Remove OpenAI parameter
                 del content["image_url"]
@@ -171,7 +180,9 @@ async def stream_claude_bedrock_response(
                     if content_item.get("type") == "image_url":
                         # Process image data
                         image_data_url = cast(str, content_item["image_url"]["url"])
-                        media_type, base64_data = process_image(image_data_url)
+                        media_type, base64_data = await asyncio.to_thread(
+                            load_prompt_image, image_data_url
+                        )
                         media_type = media_type.split("/")[1]
                         formatted_content.append({
                             "image": {
@@ -320,3 +331,172 @@ async def stream_claude_response_native(
         raise Exception("No HTML response found in AI response")
     else:
         return response.content[0].text
+
+
+# Converts messages in the Anthropic API format (as built for video prompts)
+# to the format expected by Bedrock's converse API
+def convert_claude_messages_to_bedrock(messages: list[Any]) -> list[dict[str, Any]]:
+    bedrock_messages: list[dict[str, Any]] = []
+    for message in messages:
+        if isinstance(message["content"], str):
+            content = [{"text": message["content"]}]
+        else:
+            content = []
+            for part in message["content"]:
+                if part["type"] == "image":
+                    content.append(
+                        {
+                            "image": {
+                                "format": part["source"]["media_type"].split("/")[1],
+                                "source": {"bytes": base64.b64decode(part["source"]["data"])},
+                            }
+                        }
+                    )
+                else:
+                    content.append({"text": part["text"]})
+        bedrock_messages.append({"role": message["role"], "content": content})
+    return bedrock_messages
+
+
+# Streams a converse_stream response. The event stream is read in a thread, so
+# that waiting on the model doesn't block the event loop.
+async def stream_bedrock_converse(
+    bedrock_runtime: Any,
+    model: Llm,
+    system_prompt: str,
+    messages: list[dict[str, Any]],
+    max_tokens: int,
+    temperature: float,
+    callback: Callable[[str], Awaitable[None]],
+) -> tuple[str, str | None, dict[str, int]]:
+    response = await asyncio.to_thread(
+        bedrock_runtime.converse_stream,
+        modelId=model.value,
+        messages=messages,
+        inferenceConfig={"maxTokens": max_tokens, "temperature": temperature},
+        system=[{"text": system_prompt}],
+    )
+
+    events = iter(response["stream"])
+    content = ""
+    stop_reason = None
+    usage: dict[str, int] = {}
+    while (event := await asyncio.to_thread(next, events, None)) is not None:
+        if "contentBlockDelta" in event:
+            text = event["contentBlockDelta"]["delta"].get("text", "")
+            content += text
+            await callback(text)
+        elif "messageStop" in event:
+            stop_reason = event["messageStop"]["stopReason"]
+        elif "metadata" in event:
+            usage = event["metadata"].get("usage", {})
+
+    return content, stop_reason, usage
+
+
+# The multi-pass flow of stream_claude_response_native, on Bedrock. on_pass is
+# called before each pass (with the pass number and the number of passes).
+async def stream_claude_bedrock_response_native(
+    system_prompt: str,
+    messages: list[Any],
+    access_key: str,
+    secret_key: str,
+    region: str,
+    callback: Callable[[str], Awaitable[None]],
+    include_thinking: bool = False,
+    model: Llm = Llm.CLAUDE_3_5_SONNET_2024_06_20,
+    on_pass: Callable[[int, int], Awaitable[None]] | None = None,
+    max_passes: int = 2,
+) -> str:
+
+    bedrock_runtime = boto3.client(service_name="bedrock-runtime", region_name=region, aws_access_key_id=access_key, aws_secret_access_key=secret_key)
+
+    # Base model parameters
+    max_tokens = 4096
+    temperature = 0.0
+
+    prefix = "<thinking>"
+    response_text = None
+    messages = list(messages)
+
+    # For debugging
+    full_stream = ""
+    debug_file_writer = DebugFileWriter()
+
+    async def on_text(text: str) -> None:
+        nonlocal full_stream
+        full_stream += text
+        await callback(text)
+
+    for pass_num in range(1, max_passes + 1):
+        if on_pass:
+            await on_pass(pass_num, max_passes)
+
+        # Set up message depending on whether we have a <thinking> prefix
+        messages_to_send = (
+            messages + [{"role": "assistant", "content": prefix}]
+            if include_thinking
+            else messages
+        )
+
+        response_text, stop_reason, usage = await stream_bedrock_converse(
+            bedrock_runtime,
+            model,
+            system_prompt,
+            convert_claude_messages_to_bedrock(messages_to_send),
+            max_tokens,
+            temperature,
+            on_text,
+        )
+
+        # Handle max_tokens case by continuing from the response so far
+        while stop_reason == "max_tokens":
+            continuation_messages = messages + [
+                {
+                    "role": "assistant",
+                    # The last assistant message can't end with whitespace
+                    "content": ((prefix if include_thinking else "") + response_text).rstrip(),
+                }
+            ]
+            additional_text, stop_reason, usage = await stream_bedrock_converse(
+                bedrock_runtime,
+                model,
+                system_prompt,
+                convert_claude_messages_to_bedrock(continuation_messages),
+                max_tokens,
+                temperature,
+                on_text,
+            )
+            response_text += additional_text
+
+        # Write each pass's code to .html file and thinking to .txt file
+        if IS_DEBUG_ENABLED:
+            debug_file_writer.write_to_file(
+                f"pass_{pass_num}.html",
+                debug_file_writer.extract_html_content(response_text),
+            )
+            debug_file_writer.write_to_file(
+                f"thinking_pass_{pass_num}.txt",
+                response_text.split("</thinking>")[0],
+            )
+
+        # Set up messages array for next pass
+        messages += [
+            {"role": "assistant", "content": (prefix if include_thinking else "") + response_text},
+            {
+                "role": "user",
+                "content": "You've done a good job with a first draft. Improve this further based on the original instructions so that the app is fully functional and looks like the original video of the app we're trying to replicate.",
+            },
+        ]
+
+        print(
+            f"Token usage (pass {pass_num}): Input Tokens: {usage.get('inputTokens')}, Output Tokens: {usage.get('outputTokens')}"
+        )
+
+    if IS_DEBUG_ENABLED:
+        debug_file_writer.write_to_file("full_stream.txt", full_stream)
+
+    if not response_text:
+        raise Exception("No HTML response found in AI response")
+    else:
+        return response_text
@@ -4,12 +4,32 @@ from dotenv import load_dotenv
 load_dotenv()
 
 
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
-from routes import screenshot, generate_code, home, evals
+from assets.core import asset_store
+from image_generation.core import get_image_library
+from image_generation.local_store import (
+    LOCAL_IMAGE_DIR,
+    LocalImageStaticFiles,
+    local_image_store,
+)
+from routes import assets, screenshot, generate_code, home, evals
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Index the local image store (and evict if it's over budget) before serving
+    await asyncio.to_thread(local_image_store.reconcile)
+    await asyncio.to_thread(asset_store.reconcile)
+    # Build the image library's search index before the first request needs it
+    await asyncio.to_thread(get_image_library)
+    yield
 
-app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None)
+
+app = FastAPI(openapi_url=None, docs_url=None, redoc_url=None, lifespan=lifespan)
 
 # Configure CORS settings
 app.add_middleware(
@@ -23,7 +43,13 @@ app.add_middleware(
 # Add routes
 app.include_router(generate_code.router)
 app.include_router(screenshot.router)
+app.include_router(assets.router)
 app.include_router(home.router)
 app.include_router(evals.router)
 
+
+# Generated images are cached forever (see LocalImageStaticFiles). Other static
+# files (e.g. the human-named static/library images) can be replaced, so they're
+# revalidated as usual.
+app.mount(f"/{LOCAL_IMAGE_DIR}", LocalImageStaticFiles(local_image_store), name="images")
 app.mount("/static", StaticFiles(directory='static'), name="static")
@@ -1,9 +1,18 @@
+import copy
+import hashlib
 from typing import Union
 from openai.types.chat import ChatCompletionMessageParam, ChatCompletionContentPartParam
 
 from custom_types import InputMode
 from image_generation.core import create_alt_url_mapping
+from codegen.element_edit import ElementEdit
+from prompts.element_edit_prompts import (
+    ELEMENT_EDIT_LIBRARIES,
+    ELEMENT_EDIT_SYSTEM_PROMPT,
+    ELEMENT_EDIT_USER_PROMPT,
+)
 from prompts.imported_code_prompts import IMPORTED_CODE_SYSTEM_PROMPTS
+from prompts.patch_prompts import PATCH_UPDATE_INSTRUCTIONS
 from prompts.screenshot_system_prompts import SYSTEM_PROMPTS
 from prompts.types import Stack
 from video.utils import assemble_claude_prompt_video
@@ -18,6 +27,14 @@ Generate code for a SVG that looks exactly like this.
 """
 
 
+# Changes whenever the prompt sent for a screenshot changes, so that identical
+# requests can be recognised (and results from older prompts are not reused)
+def get_prompt_version(stack: Stack) -> str:
+    user_prompt = USER_PROMPT if stack != "svg" else SVG_USER_PROMPT
+    content = SYSTEM_PROMPTS[stack] + user_prompt
+    return hashlib.sha256(content.encode()).hexdigest()[:16]
+
+
 async def create_prompt(
     params: dict[str, str], stack: Stack, input_mode: InputMode
 ) -> tuple[list[ChatCompletionMessageParam], dict[str, str]]:
@@ -42,7 +59,10 @@ async def create_prompt(
             prompt_messages.append(message)
     else:
         # Assemble the prompt for non-imported code
-        if params.get("resultImage"):
+        if input_mode == "video":
+            # The handle of the uploaded video, or a data URL
+            prompt_messages = await assemble_claude_prompt_video(params["image"])
+        elif params.get("resultImage"):
             prompt_messages = assemble_prompt(
                 params["image"], stack, params["resultImage"]
             )
@@ -67,10 +87,6 @@ async def create_prompt(
 
             image_cache = create_alt_url_mapping(params["history"][-2])
 
-    if input_mode == "video":
-        video_data_url = params["image"]
-        prompt_messages = await assemble_claude_prompt_video(video_data_url)
-
     return prompt_messages, image_cache
 
 
@@ -132,3 +148,38 @@ def assemble_prompt(
             "content": user_content,
         },
     ]
+
+
+def assemble_element_edit_prompt(
+    edit: ElementEdit, instruction: str, stack: Stack
+) -> list[ChatCompletionMessageParam]:
+    system_content = ELEMENT_EDIT_SYSTEM_PROMPT.format(
+        libraries=ELEMENT_EDIT_LIBRARIES.get(stack, "")
+    )
+    user_content = ELEMENT_EDIT_USER_PROMPT.format(
+        outline=edit.outline,
+        element_html=edit.element_html,
+        instruction=instruction,
+    )
+    return [
+        {
+            "role": "system",
+            "content": system_content,
+        },
+        {
+            "role": "user",
+            "content": user_content,
+        },
+    ]
+
+
+# Asks for edit blocks against the latest version instead of the full code
+def assemble_patch_update_prompt(
+    prompt_messages: list[ChatCompletionMessageParam],
+) -> list[ChatCompletionMessageParam]:
+    patch_messages = copy.deepcopy(prompt_messages)
+    last_message = patch_messages[-1]
+    if last_message["role"] != "user" or not isinstance(last_message["content"], str):
+        raise ValueError("Update prompts must end with the user's instruction")
+    last_message["content"] = last_message["content"] + PATCH_UPDATE_INSTRUCTIONS
+    return patch_messages
@@ -0,0 +1,79 @@
+import copy
+from typing import Dict, List, Tuple
+from openai.types.chat import ChatCompletionMessageParam
+from config import HISTORY_TOKEN_BUDGET
+from llm import Llm
+
+# Input token budgets for update conversations. Beyond the budget, earlier
+# versions of the code are dropped from the history (oldest first).
+HISTORY_TOKEN_BUDGETS: Dict[Llm, int] = {
+    Llm.CLAUDE_3_SONNET: 24000,
+    Llm.CLAUDE_3_OPUS: 24000,
+    Llm.CLAUDE_3_HAIKU: 16000,
+    Llm.CLAUDE_3_5_SONNET_2024_06_20: 32000,
+    Llm.CLAUDE_3_5_SONNET_2024_10_22: 32000,
+    Llm.NOVA_LITE: 16000,
+    Llm.NOVA_PRO: 32000,
+}
+DEFAULT_HISTORY_TOKEN_BUDGET = 24000
+
+# Rough estimates, good enough for budgeting (HTML is about 4 characters per token,
+# and an image is at most about 1600 tokens)
+CHARS_PER_TOKEN = 4
+TOKENS_PER_IMAGE = 1600
+
+OMITTED_CODE_PLACEHOLDER = (
+    "(An earlier version of the code, omitted. The latest version is below.)"
+)
+
+
+def get_history_token_budget(model: Llm) -> int:
+    if HISTORY_TOKEN_BUDGET:
+        return HISTORY_TOKEN_BUDGET
+    return HISTORY_TOKEN_BUDGETS.get(model, DEFAULT_HISTORY_TOKEN_BUDGET)
+
+
+def estimate_message_tokens(message: ChatCompletionMessageParam) -> int:
+    content = message.get("content")
+    if isinstance(content, str):
+        return len(content) // CHARS_PER_TOKEN
+    tokens = 0
+    for part in content or []:
+        if part.get("type") == "image_url":  # type: ignore
+            tokens += TOKENS_PER_IMAGE
+        else:
+            tokens += len(part.get("text", "")) // CHARS_PER_TOKEN  # type: ignore
+    return tokens
+
+
+def estimate_tokens(messages: List[ChatCompletionMessageParam]) -> int:
+    return sum(estimate_message_tokens(message) for message in messages)
+
+
+def compact_history(
+    messages: List[ChatCompletionMessageParam], budget: int
+) -> Tuple[List[ChatCompletionMessageParam], int, int]:
+    """
+    Replaces earlier versions of the code in an update conversation with a
+    placeholder, oldest first, until the estimated input tokens fit the budget.
+    The latest version and all of the user's instructions are always kept.
+
+    Returns the compacted messages and the estimated tokens before and after.
+    """
+    tokens_before = estimate_tokens(messages)
+    tokens = tokens_before
+
+    code_indexes = [
+        index
+        for index, message in enumerate(messages)
+        if message["role"] == "assistant" and isinstance(message.get("content"), str)
+    ]
+    compacted = copy.copy(messages)
+    for index in code_indexes[:-1]:
+        if tokens <= budget:
+            break
+        tokens -= estimate_message_tokens(compacted[index])
+        compacted[index] = {"role": "assistant", "content": OMITTED_CODE_PLACEHOLDER}
+        tokens += estimate_message_tokens(compacted[index])
+
+    return compacted, tokens_before, tokens
@@ -0,0 +1,16 @@
+PATCH_UPDATE_INSTRUCTIONS = """
+
+Do not return the full code. Instead, return only the changes to the latest version of the code,
+as one or more edit blocks in this format:
+
+<<<<<<< SEARCH
+(lines copied exactly from the latest version of the code)
+=======
+(the lines to replace them with)
+>>>>>>> REPLACE
+
+- The SEARCH lines must match the latest version of the code exactly, including indentation, and must appear only once in it. Include enough lines to make them unique.
+- Keep each edit block small: only include the lines that change, plus a few lines of context if needed.
+- To add code, include the lines next to where it goes in SEARCH and repeat them in the replacement along with the new code.
+- Return nothing but the edit blocks.
+"""
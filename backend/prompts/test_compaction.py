@@ -0,0 +1,74 @@
+import unittest
+from llm import Llm
+from prompts.compaction import (
+    OMITTED_CODE_PLACEHOLDER,
+    TOKENS_PER_IMAGE,
+    compact_history,
+    estimate_tokens,
+    get_history_token_budget,
+)
+from openai.types.chat import ChatCompletionMessageParam
+
+
+def conversation(num_versions: int, code_chars: int) -> list[ChatCompletionMessageParam]:
+    messages: list[ChatCompletionMessageParam] = [
+        {"role": "system", "content": "system"},
+        {
+            "role": "user",
+            "content": [
+                {"type": "image_url", "image_url": {"url": "data:image/png;base64,"}},
+                {"type": "text", "text": "Generate code"},
+            ],
+        },
+    ]
+    for version in range(num_versions):
+        messages.append({"role": "assistant", "content": str(version) * code_chars})
+        messages.append({"role": "user", "content": f"Instruction {version}"})
+    return messages
+
+
+class TestCompaction(unittest.TestCase):
+
+    def test_estimate_tokens_counts_images(self):
+        self.assertEqual(
+            estimate_tokens(conversation(1, 400)), TOKENS_PER_IMAGE + 1 + 3 + 100 + 3
+        )
+
+    def test_keeps_history_within_budget(self):
+        messages = conversation(2, 400)
+        compacted, before, after = compact_history(messages, budget=10000)
+        self.assertEqual(compacted, messages)
+        self.assertEqual(before, after)
+
+    def test_drops_oldest_versions_first(self):
+        messages = conversation(4, 4000)
+        budget = estimate_tokens(messages) - 1500
+
+        compacted, before, after = compact_history(messages, budget)
+        self.assertLess(after, before)
+        self.assertLessEqual(after, budget)
+        contents = [message["content"] for message in compacted if message["role"] == "assistant"]
+        self.assertEqual(contents[:2], [OMITTED_CODE_PLACEHOLDER] * 2)
+        self.assertEqual(contents[2:], ["2" * 4000, "3" * 4000])
+        # The original messages are unchanged
+        self.assertEqual(messages[2]["content"], "0" * 4000)
+
+    def test_always_keeps_latest_version_and_instructions(self):
+        messages = conversation(3, 4000)
+        compacted, _, after = compact_history(messages, budget=0)
+        self.assertGreater(after, 0)
+        self.assertEqual(compacted[-2]["content"], "2" * 4000)
+        self.assertEqual(
+            [message["content"] for message in compacted[3::2]],
+            ["Instruction 0", "Instruction 1", "Instruction 2"],
+        )
+
+    def test_budget_per_model(self):
+        self.assertGreater(
+            get_history_token_budget(Llm.CLAUDE_3_5_SONNET_2024_10_22),
+            get_history_token_budget(Llm.CLAUDE_3_HAIKU),
+        )
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,4 +1,6 @@
-from prompts import assemble_imported_code_prompt, assemble_prompt
+import asyncio
+from unittest import mock
+from prompts import assemble_imported_code_prompt, assemble_prompt, create_prompt
 
 TAILWIND_SYSTEM_PROMPT = """
 You are an expert Tailwind developer
@@ -468,3 +470,22 @@ def test_imported_code_prompts():
         }
     ]
     assert svg == expected_svg
+
+
+def test_video_update_prompts():
+    video_messages = [{"role": "user", "content": [{"type": "image"}]}]
+    params = {
+        "generationType": "update",
+        "image": "asset:video",
+        "history": ["<html>v1</html>", "Make the button red"],
+    }
+    with mock.patch(
+        "prompts.assemble_claude_prompt_video", mock.AsyncMock(return_value=list(video_messages))
+    ) as assemble_video:
+        prompt_messages, _ = asyncio.run(create_prompt(params, "html_tailwind", "video"))  # type: ignore
+
+    assemble_video.assert_awaited_once_with("asset:video")
+    assert prompt_messages == video_messages + [
+        {"role": "assistant", "content": "<html>v1</html>"},
+        {"role": "user", "content": "Make the button red"},
+    ]
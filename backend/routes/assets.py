@@ -0,0 +1,65 @@
+import asyncio
+from fastapi import APIRouter, HTTPException, Request
+from fastapi.responses import FileResponse
+from pydantic import BaseModel
+from assets.core import (
+    ASSET_HANDLE_PREFIX,
+    AssetNotFound,
+    asset_store,
+    get_asset_mime_type,
+    get_asset_path,
+    store_asset,
+)
+from config import ASSET_MAX_UPLOAD_BYTES
+from image_generation.derivatives import IMMUTABLE_CACHE_CONTROL
+
+
+router = APIRouter()
+
+
+class AssetResponse(BaseModel):
+    handle: str
+
+
+# Takes the raw bytes of a screenshot or video as the request body (with its
+# Content-Type), so that it's uploaded once and without base64 overhead
+@router.post("/api/assets")
+async def upload_asset(request: Request):
+    content_length = int(request.headers.get("content-length") or 0)
+    if content_length > ASSET_MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail="Asset is too large")
+
+    # Chunked uploads have no Content-Length, so the size is checked as the
+    # body arrives instead of after buffering all of it
+    chunks: list[bytes] = []
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > ASSET_MAX_UPLOAD_BYTES:
+            raise HTTPException(status_code=413, detail="Asset is too large")
+        chunks.append(chunk)
+    data = b"".join(chunks)
+    if not data:
+        raise HTTPException(status_code=400, detail="Invalid asset size")
+
+    try:
+        handle = await store_asset(data, request.headers.get("content-type", ""))
+    except ValueError as e:
+        raise HTTPException(status_code=415, detail=str(e))
+
+    print(f"[ASSETS] Stored {handle} ({len(data)} bytes), {asset_store.stats()}")
+    return AssetResponse(handle=handle)
+
+
+@router.get("/api/assets/{name}")
+async def get_asset(name: str):
+    try:
+        path = await asyncio.to_thread(get_asset_path, ASSET_HANDLE_PREFIX + name)
+    except AssetNotFound:
+        raise HTTPException(status_code=404, detail="Asset not found")
+    # Assets are named by content hash, so they never change
+    return FileResponse(
+        path,
+        media_type=get_asset_mime_type(name),
+        headers={"Cache-Control": IMMUTABLE_CACHE_CONTROL},
+    )
@@ -1,13 +1,33 @@
 import asyncio
+import hashlib
+import json
+import math
 from dataclasses import dataclass
 from fastapi import APIRouter, WebSocket
-from fastapi.websockets import WebSocketState
 import time
+from codegen.element_edit import (
+    ELEMENT_EDIT_STACKS,
+    ElementEdit,
+    apply_element_edit,
+    get_element_edit,
+    get_selected_element_html,
+)
+from codegen.patch import PatchError, StreamingPatcher, update_stats
 from codegen.utils import extract_html_content
+from assets.core import (
+    AssetNotFound,
+    get_asset_hash,
+    get_asset_path,
+    is_asset_handle,
+    store_data_url,
+)
+from completion_cache.core import completion_cache, replay_completion
+from conversations.core import conversations
 from config import (
     BEDROCK_ACCESS_KEY,
     BEDROCK_SECRET_KEY,
     BEDROCK_REGION,
+    CODE_UPDATE_MODE,
     DEPLOY_ON_AWS,
     NUM_VARIANTS,
     SHOULD_MOCK_AI_RESPONSE,
@@ -17,16 +37,33 @@ from llm import (
     Llm,
     convert_frontend_str_to_llm,
     stream_claude_bedrock_response,
+    stream_claude_bedrock_response_native,
 )
 from fs_logging.core import write_logs
 from mock_llm import mock_completion
+from openai.types.chat import ChatCompletionMessageParam
 from typing import Any, Callable, Coroutine, Dict, List, Literal, cast, get_args
 from image_generation.core import generate_images
-from prompts import create_prompt
+from prompts import (
+    assemble_element_edit_prompt,
+    assemble_patch_update_prompt,
+    create_prompt,
+    get_prompt_version,
+)
+from prompts.claude_prompts import VIDEO_PROMPT
+from prompts.compaction import compact_history, get_history_token_budget
 from prompts.types import Stack
 
 # from utils import pprint_prompt
-from ws.constants import APP_ERROR_WEB_SOCKET_CODE  # type: ignore
+from ws.admission import AdmissionRejected, generation_admission
+from ws.constants import (  # type: ignore
+    APP_ERROR_WEB_SOCKET_CODE,
+    ASSET_NOT_FOUND_WEB_SOCKET_CODE,
+    CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE,
+    SERVER_BUSY_WEB_SOCKET_CODE,
+    USER_CLOSE_WEB_SOCKET_CODE,
+)
+from ws.sessions import GenerationSession, SessionExpired, generation_sessions
 
 
 router = APIRouter()
@@ -156,16 +193,336 @@ async def stream_code(websocket: WebSocket):
     await websocket.accept()
     print("Incoming websocket connection...")
 
+    # TODO: Are the values always strings?
+    message = await websocket.receive_text()
+    parse_start_time = time.time()
+    params: dict[str, str] = json.loads(message)
+    print(
+        f"Received params ({len(message)} bytes, parsed in {(time.time() - parse_start_time) * 1000:.1f} ms)"
+    )
+
+    # A reconnecting client resumes an existing generation from the last offset it received
+    resume_session_id = params.get("resumeSessionId")
+    if resume_session_id:
+        session = generation_sessions.get(resume_session_id)
+        if session is None:
+            await websocket.send_json(
+                {"type": "error", "value": "The generation session has expired."}
+            )
+            await websocket.close(APP_ERROR_WEB_SOCKET_CODE)
+            return
+        print(f"Resuming session {session.id}")
+        await stream_session(websocket, session, int(params.get("resumeOffset", 0)))
+        return
+
+    # Updates can reference a stored version instead of resending the screenshot and history
+    parent_version_id = params.get("parentVersionId")
+    if parent_version_id and not params.get("history"):
+        if not isinstance(params.get("instruction"), str):
+            await websocket.send_json(
+                {"type": "error", "value": "The update instruction is missing."}
+            )
+            await websocket.close(APP_ERROR_WEB_SOCKET_CODE)
+            return
+        conversation = await conversations.get_history(parent_version_id)
+        if conversation is None:
+            # The client resends the update with the full history
+            print(f"[CONVERSATION] Version {parent_version_id} not found")
+            await websocket.close(CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE)
+            return
+        conversation_id, image, history = conversation
+        params = {
+            **params,
+            "conversationId": conversation_id,
+            "image": image,
+            "history": history + [params["instruction"]],  # type: ignore
+        }
+
+    # Identical concurrent requests share one generation, and late joiners get a replay
+    key = get_generation_key(params)
+    if key is not None:
+        running_session = generation_sessions.find_running(key)
+        if running_session is not None:
+            print(f"[COALESCE] Joining generation {running_session.id}, {generation_sessions.stats()}")
+            await stream_session(websocket, running_session, 0)
+            return
+
+    # The generation runs independently of this websocket so that it survives disconnects
+    session = generation_sessions.create(key)
+    session.publish({"type": "session", "value": session.id, "variantIndex": 0})
+    session.task = asyncio.create_task(run_generation(session, params))
+    await stream_session(websocket, session, 0)
+
+
+# Video generation makes a first draft and then improves it, streaming both
+# passes. Each pass rewrites the whole app, so the client starts over. Updates
+# (the previous code and the instruction follow the video in the prompt) take
+# a single pass, as improving on the video again could undo the change.
+async def stream_video_completion(
+    prompt_messages: List[Any],
+    access_key: str,
+    secret_key: str,
+    region: str,
+    model: Llm,
+    send_message: Callable[[Literal["chunk", "status", "setCode", "error"], str, int], Coroutine[Any, Any, None]],
+    is_update: bool = False,
+) -> str:
+    async def on_pass(pass_num: int, num_passes: int):
+        if pass_num > 1:
+            await send_message("setCode", "", 0)
+            await send_message(
+                "status", f"Improving the first draft (pass {pass_num} of {num_passes})...", 0
+            )
+
+    return await stream_claude_bedrock_response_native(
+        system_prompt=VIDEO_PROMPT,
+        messages=prompt_messages,
+        access_key=access_key,
+        secret_key=secret_key,
+        region=region,
+        callback=lambda x: send_message("chunk", x, 0),
+        include_thinking=True,
+        model=model,
+        on_pass=on_pass,
+        max_passes=1 if is_update else 2,
+    )
+
+
+# Screenshots and videos sent as handles stay handles in the prompt, and are
+# only read when the model request is built. This checks that they're still
+# there (fetching them from S3 if needed) before anything is generated.
+async def check_asset_params(params: dict[str, str]) -> None:
+    for key in ["image", "resultImage"]:
+        if params.get(key) and is_asset_handle(params[key]):
+            await asyncio.to_thread(get_asset_path, params[key])
+
+
+# Key identifying requests that produce the same completion, or None for requests
+# that can't be shared (only fresh screenshot generations are)
+def get_completion_cache_key(params: dict[str, str]) -> str | None:
+    stack = params.get("generatedCodeConfig")
+    if (
+        params.get("generationType") != "create"
+        or params.get("inputMode") != "image"
+        or params.get("isImportedFromCode")
+        or stack not in get_args(Stack)
+        or not params.get("image")
+    ):
+        return None
+
+    key_parts = [
+        get_asset_hash(params["image"]),
+        stack,
+        params.get("codeGenerationModel", ""),
+        get_prompt_version(cast(Stack, stack)),
+    ]
+    return hashlib.sha256("\n".join(key_parts).encode()).hexdigest()
+
+
+# Key identifying requests that produce the same output, including the generated
+# images. The credentials (secret key included, since access key ids aren't
+# secret) are part of the key so that nobody gets output generated with, and
+# billed to, someone else's keys.
+def get_generation_key(params: dict[str, str]) -> str | None:
+    completion_key = get_completion_cache_key(params)
+    if completion_key is None:
+        return None
+
+    key_parts = [
+        completion_key,
+        str(params.get("isImageGenerationEnabled", True)),
+        params.get("imageGenerationModel", ""),
+        params.get("bedrockAccessKey", ""),
+        hashlib.sha256(params.get("bedrockSecretKey", "").encode()).hexdigest(),
+        params.get("bedrockRegion", ""),
+    ]
+    return hashlib.sha256("\n".join(key_parts).encode()).hexdigest()
+
+
+# The selected element of a select-and-edit update, if it can be updated on its own
+def get_element_edit_from_params(params: dict[str, Any], stack: Stack) -> ElementEdit | None:
+    selected_element = params.get("selectedElement")
+    history = params.get("history") or []
+    if (
+        params.get("generationType") != "update"
+        or stack not in ELEMENT_EDIT_STACKS
+        or not selected_element
+        or not params.get("updateInstruction")
+        or len(history) < 2
+    ):
+        return None
+
+    element_edit = get_element_edit(
+        history[-2],
+        selected_element.get("path", []),
+        selected_element.get("tagName", ""),
+        get_selected_element_html(history[-1]),
+    )
+    if element_edit is None:
+        print("[ELEMENT EDIT] Selected element not found in the code, updating the whole page")
+    return element_edit
+
+
+# Streams an update of just the selected element, returning the updated pages,
+# or an empty list if the model's output can't be spliced into the page
+async def stream_element_edit(
+    element_edit: ElementEdit,
+    instruction: str,
+    stack: Stack,
+    stream_completions: Callable[[List[ChatCompletionMessageParam]], Coroutine[Any, Any, List[str]]],
+    send_message: Callable[[Literal["chunk", "status", "setCode", "error"], str, int], Coroutine[Any, Any, None]],
+) -> List[str]:
+    for i in range(NUM_VARIANTS):
+        await send_message("status", "Updating the selected element...", i)
+        # Stream the page up to the element, so that the preview shows the page
+        # while the element is generated
+        await send_message("chunk", element_edit.html[: element_edit.element.start], i)
+
+    start_time = time.time()
+    fragments = await stream_completions(
+        assemble_element_edit_prompt(element_edit, instruction, stack)
+    )
+    updated_pages = [apply_element_edit(element_edit, fragment) for fragment in fragments]
+    update_stats.record(
+        "element",
+        all(page is not None for page in updated_pages),
+        time.time() - start_time,
+        len(fragments[0]),
+    )
+    print(
+        f"[ELEMENT EDIT] Replaced a {len(element_edit.element_html)} char element with "
+        f"{[len(fragment) for fragment in fragments]} chars in {time.time() - start_time:.2f} seconds "
+        f"(page is {len(element_edit.html)} chars)"
+    )
+
+    if any(page is None for page in updated_pages):
+        print("[ELEMENT EDIT] Invalid fragment, updating the whole page")
+        for i in range(NUM_VARIANTS):
+            await send_message("status", "Updating the whole page...", i)
+            await send_message("setCode", "", i)
+        return []
+    return cast(List[str], updated_pages)
+
+
+# Streams an update as search/replace edits to the previous code, sending the
+# patched code after each edit. Returns the updated code, or an empty list if
+# the edits don't apply.
+async def stream_patch_update(
+    previous_code: str,
+    prompt_messages: List[ChatCompletionMessageParam],
+    stream_completions: Callable[..., Coroutine[Any, Any, List[str]]],
+    send_message: Callable[[Literal["chunk", "status", "setCode", "error"], str, int], Coroutine[Any, Any, None]],
+) -> List[str]:
+    patchers = [StreamingPatcher(previous_code) for _ in range(NUM_VARIANTS)]
+
+    async def on_chunk(content: str, variantIndex: int):
+        if patchers[variantIndex].feed(content):
+            await send_message("setCode", patchers[variantIndex].code, variantIndex)
+
+    for i in range(NUM_VARIANTS):
+        await send_message("status", "Editing code...", i)
+        await send_message("setCode", previous_code, i)
+
+    start_time = time.time()
+    responses = await stream_completions(
+        assemble_patch_update_prompt(prompt_messages), on_chunk
+    )
+
+    updated_code: List[str] = []
+    for patcher, response in zip(patchers, responses):
+        try:
+            updated_code.append(patcher.result())
+        except PatchError as e:
+            if patcher.edits_applied == 0 and "</html>" in response:
+                # The model rewrote the whole code anyway
+                updated_code.append(response)
+            else:
+                print(f"[UPDATE] Patch failed: {e}")
+
+    success = len(updated_code) == len(responses)
+    update_stats.record("patch", success, time.time() - start_time, len(responses[0]))
+    print(
+        f"[UPDATE] Patch update with {[patcher.edits_applied for patcher in patchers]} edits "
+        f"({[len(response) for response in responses]} chars) in {time.time() - start_time:.2f} seconds, "
+        f"{update_stats.summary()}"
+    )
+
+    if not success:
+        for i in range(NUM_VARIANTS):
+            await send_message("status", "Couldn't apply the edits, rewriting the code...", i)
+            await send_message("setCode", "", i)
+        return []
+    return updated_code
+
+
+# Cancels the generation when the user closes the websocket on purpose
+# (other disconnects leave it running so that the client can resume)
+async def watch_for_cancel(websocket: WebSocket, session: GenerationSession):
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            # A shared generation keeps running for its other clients
+            if (
+                message.get("code") == USER_CLOSE_WEB_SOCKET_CODE
+                and session.task
+                and session.subscribers <= 1
+            ):
+                print(f"Generation {session.id} cancelled by the user")
+                session.task.cancel()
+            return
+
+
+# Sends a session's messages (with their offsets) to the websocket until the session is finished
+async def stream_session(websocket: WebSocket, session: GenerationSession, offset: int):
+    cancel_watcher = asyncio.create_task(watch_for_cancel(websocket, session))
+    try:
+        async for item in session.subscribe(offset, ping_interval=5):
+            if item is None:
+                # Keep the websocket alive
+                await websocket.send_json({"type": "ping", "value": "ping", "variantIndex": 0})
+                continue
+            message_offset, message = item
+            await websocket.send_json({**message, "offset": message_offset})
+    except SessionExpired:
+        await websocket.send_json(
+            {"type": "error", "value": "Too much output was missed to resume this generation."}
+        )
+        await websocket.close(APP_ERROR_WEB_SOCKET_CODE)
+        return
+    except Exception:
+        # Disconnected: the client can resume from the last offset it received
+        print(f"Client disconnected from session {session.id}, generation continues")
+        return
+    finally:
+        cancel_watcher.cancel()
+    await websocket.close(session.close_code)
+
+
+async def run_generation(session: GenerationSession, params: dict[str, str]):
+    try:
+        await generate_code(session, params)
+    except asyncio.CancelledError:
+        session.finish(USER_CLOSE_WEB_SOCKET_CODE)
+    except Exception as e:
+        print("[GENERATE_CODE] Generation failed", e)
+        if not session.done:
+            session.publish({"type": "error", "value": "An error occurred. Please try again later."})
+            session.finish(APP_ERROR_WEB_SOCKET_CODE)
+    finally:
+        session.finish()
+
+
+async def generate_code(session: GenerationSession, params: dict[str, str]):
     ## Communication protocol setup
     async def throw_error(
         message: str,
     ):
         print(message)
-        await websocket.send_json({"type": "error", "value": message})
-        await websocket.close(APP_ERROR_WEB_SOCKET_CODE)
+        session.publish({"type": "error", "value": message})
+        session.finish(APP_ERROR_WEB_SOCKET_CODE)
 
     async def send_message(
-        type: Literal["chunk", "status", "setCode", "error", "ping"],
+        type: Literal["chunk", "status", "setCode", "error", "version"],
         value: str,
         variantIndex: int,
     ):
@@ -175,16 +532,10 @@ async def stream_code(websocket: WebSocket):
         elif type == "status":
             print(f"Status (variant {variantIndex}): {value}")
 
-        await websocket.send_json(
-            {"type": type, "value": value, "variantIndex": variantIndex}
-        )
+        session.publish({"type": type, "value": value, "variantIndex": variantIndex})
 
     ## Parameter extract and validation
 
-    # TODO: Are the values always strings?
-    params: dict[str, str] = await websocket.receive_json()
-    print("Received params")
-
     extracted_params = await extract_params(params, throw_error)
     stack = extracted_params.stack
     input_mode = extracted_params.input_mode
@@ -199,35 +550,117 @@ async def stream_code(websocket: WebSocket):
         f"Generating {stack} code in {input_mode} mode using {code_generation_model} should gen iamges {should_generate_images} use model {image_generation_model}..."
     )
 
-    for i in range(NUM_VARIANTS):
-        await send_message("status", "Generating code...", i)
+    ### Conversation state
 
-    ### Prompt creation
+    # Versions are stored so that later updates only need to reference them
+    conversation_id = params.get("conversationId")
+    parent_version_id = params.get("parentVersionId")
+    if not conversation_id:
+        try:
+            # Screenshots and videos sent inline are kept in the asset store, so
+            # that conversations only hold their handle
+            conversation_image = await store_data_url(params.get("image", ""))
+        except ValueError:
+            # Not stored: updates of this generation resend the whole history
+            conversation_image = None
+        if conversation_image is not None:
+            # The prompt and the video pipeline work from the handle, so the
+            # data URL is only decoded once
+            params = {**params, "image": conversation_image}
+            conversation_id, parent_version_id = await conversations.create(
+                conversation_image,
+                params.get("history", []) if params["generationType"] == "update" else [],  # type: ignore
+            )
+    instruction = params["history"][-1] if params["generationType"] == "update" else None
 
-    # Image cache for updates so that we don't have to regenerate images
-    image_cache: Dict[str, str] = {}
+    ### Assets
 
+    # Screenshots and videos can be sent as handles of uploaded assets
     try:
-        prompt_messages, image_cache = await create_prompt(params, stack, input_mode)
-    except:
-        await throw_error(
-            "Error assembling prompt."
-        )
-        raise
+        await check_asset_params(params)
+    except AssetNotFound as e:
+        # The client resends the screenshot or video inline
+        print(f"[ASSETS] {e} not found")
+        session.finish(ASSET_NOT_FOUND_WEB_SOCKET_CODE)
+        return
 
-    ### Code generation
+    ### Completion cache
 
     async def process_chunk(content: str, variantIndex: int):
         await send_message("chunk", content, variantIndex)
-        
-    completions = []
-    if SHOULD_MOCK_AI_RESPONSE:
-        completions = [await mock_completion(process_chunk, input_mode=input_mode)]
-    else:
+
+    # Repeated screenshots are answered from the completion cache. A hit makes
+    # no model call, so it's looked up before admission control instead of
+    # waiting in the queue (or being rejected) for a slot it doesn't need.
+    cache_key = (
+        get_completion_cache_key(params)
+        if completion_cache and not SHOULD_MOCK_AI_RESPONSE
+        else None
+    )
+    cached_completion: str | None = None
+    if completion_cache and cache_key:
+        cached_completion = await completion_cache.get(cache_key)
+        print(f"[COMPLETION CACHE] {'Hit' if cached_completion else 'Miss'}, {completion_cache.stats()}")
+
+    ### Admission control
+
+    async def on_queue_wait(position: int, estimated_wait: float):
+        if session.is_abandoned():
+            raise Exception("No client is waiting for this generation")
+        for i in range(NUM_VARIANTS):
+            await send_message(
+                "status",
+                f"Waiting in queue (position {position}, about {math.ceil(estimated_wait)}s)...",
+                i,
+            )
+
+    admission_start_time: float | None = None
+    try:
+        if cached_completion is None:
+            admission_start_time = await generation_admission.acquire(on_queue_wait)
+    except AdmissionRejected:
+        print(f"[ADMISSION] Rejected generation, {generation_admission.stats()}")
+        session.publish(
+            {"type": "error", "value": "The server is busy. Please try again in a moment."}
+        )
+        session.finish(SERVER_BUSY_WEB_SOCKET_CODE)
+        return
+
+    try:
+        for i in range(NUM_VARIANTS):
+            await send_message("status", "Generating code...", i)
+
+        ### Prompt creation
+
+        # Image cache for updates so that we don't have to regenerate images
+        image_cache: Dict[str, str] = {}
+
         try:
-            if input_mode == "video":
-                print("Video mode")
-            else:
+            prompt_messages, image_cache = await create_prompt(params, stack, input_mode)
+        except:
+            await throw_error(
+                "Error assembling prompt."
+            )
+            raise
+
+        # Keep long update conversations within the model's token budget
+        if params["generationType"] == "update" and input_mode != "video":
+            prompt_messages, tokens_before, tokens_after = compact_history(
+                prompt_messages, get_history_token_budget(code_generation_model)
+            )
+            print(
+                f"[HISTORY] Estimated input tokens: {tokens_before} before compaction, {tokens_after} after"
+            )
+
+        ### Code generation
+
+        completions = []
+        if cached_completion is not None:
+            completions = [await replay_completion(cached_completion, process_chunk)]
+        elif SHOULD_MOCK_AI_RESPONSE:
+            completions = [await mock_completion(process_chunk, input_mode=input_mode)]
+        else:
+            try:
                 # Depending on the presence and absence of various keys,
                 # we decide which models to run
                 variant_models = ["bedrock"]
@@ -239,45 +672,98 @@ async def stream_code(websocket: WebSocket):
                             "No Bedrock Access permissions. Please add the environment variable BEDROCK_ACCESS_KEY and BEDROCK_SECRET_KEY to backend/.env or in the settings dialog. If you add it to .env, make sure to restart the backend server."
                         )
                         raise Exception("No Bedrock Access permissions")
-                tasks: List[Coroutine[Any, Any, str]] = []
-                for index, model in enumerate(variant_models):
-                    if model == "bedrock":
-                        tasks.append(
-                            stream_claude_bedrock_response(
-                                prompt_messages,
-                                access_key=bedrock_access_key,
-                                secret_key=bedrock_secret_key,
-                                region=bedrock_region,
-                                callback=lambda x, i=index: process_chunk(x, i),
-                                model=code_generation_model,
-                            )
+
+                if input_mode == "video":
+                    completions = [
+                        await stream_video_completion(
+                            prompt_messages,
+                            bedrock_access_key,
+                            bedrock_secret_key,
+                            bedrock_region,
+                            code_generation_model,
+                            send_message,
+                            is_update=params["generationType"] == "update",
+                        )
+                    ]
+                else:
+                    async def stream_completions(
+                        messages: List[ChatCompletionMessageParam],
+                        on_chunk: Callable[[str, int], Coroutine[Any, Any, None]] = process_chunk,
+                    ) -> List[str]:
+                        tasks: List[Coroutine[Any, Any, str]] = []
+                        for index, model in enumerate(variant_models):
+                            if model == "bedrock":
+                                tasks.append(
+                                    stream_claude_bedrock_response(
+                                        messages,
+                                        access_key=bedrock_access_key,
+                                        secret_key=bedrock_secret_key,
+                                        region=bedrock_region,
+                                        callback=lambda x, i=index: on_chunk(x, i),
+                                        model=code_generation_model,
+                                    )
+                                )
+
+                        completions = await asyncio.gather(*tasks)
+                        print("Models used for generation: ", variant_models, code_generation_model)
+
+                        if completion_cache and cache_key and completions[0]:
+                            await completion_cache.set(cache_key, completions[0])
+                        return completions
+
+                    # Select-and-edit updates regenerate only the selected element
+                    element_edit = get_element_edit_from_params(params, stack)
+                    if element_edit is not None:
+                        completions = await stream_element_edit(
+                            element_edit,
+                            params["updateInstruction"],
+                            stack,
+                            stream_completions,
+                            send_message,
                         )
 
-                completions = await asyncio.gather(*tasks)
-                print("Models used for generation: ", variant_models, code_generation_model)
-                
-        except Exception as e:
-            print("[GENERATE_CODE] An error occurred", e)
-            error_message = (
-                "An error occurred. Please try again later. If the problem persists, please contact support."
-            )
-            return await throw_error(error_message)
+                    # Other updates ask for edits to the latest version of the code
+                    if (
+                        not completions
+                        and params["generationType"] == "update"
+                        and CODE_UPDATE_MODE == "patch"
+                    ):
+                        completions = await stream_patch_update(
+                            params["history"][-2],
+                            prompt_messages,
+                            stream_completions,
+                            send_message,
+                        )
+
+                    if not completions:
+                        start_time = time.time()
+                        completions = await stream_completions(prompt_messages)
+                        if params["generationType"] == "update":
+                            update_stats.record(
+                                "full", True, time.time() - start_time, len(completions[0])
+                            )
+                            print(f"[UPDATE] {update_stats.summary()}")
+
+            except AssetNotFound as e:
+                # Evicted since it was checked
+                print(f"[ASSETS] {e} not found")
+                session.finish(ASSET_NOT_FOUND_WEB_SOCKET_CODE)
+                return
+            except Exception as e:
+                print("[GENERATE_CODE] An error occurred", e)
+                error_message = (
+                    "An error occurred. Please try again later. If the problem persists, please contact support."
+                )
+                return await throw_error(error_message)
+    finally:
+        if admission_start_time is not None:
+            generation_admission.release(admission_start_time)
 
     ## Post-processing
 
     # Strip the completion of everything except the HTML content
     completions = [extract_html_content(completion) for completion in completions]
 
-    # Keep the websocket alive
-    async def keep_alive(websocket: WebSocket):
-        while websocket.client_state == WebSocketState.CONNECTED:
-            try:
-                await send_message("ping", "ping", 0)
-                await asyncio.sleep(5)  # ping every 5 second
-            except Exception:
-                break
-    keep_alive_task = asyncio.create_task(keep_alive(websocket))
-
     try:
         image_generation_tasks = [
             perform_image_generation(
@@ -297,13 +783,11 @@ async def stream_code(websocket: WebSocket):
 
         for index, updated_html in enumerate(updated_completions):
             await send_message("setCode", updated_html, index)
+            if conversation_id:
+                version_id = await conversations.add_version(
+                    conversation_id, parent_version_id, instruction, updated_html
+                )
+                await send_message("version", version_id, index)
             await send_message("status", "Code generation complete.", index)
     except Exception as e:
         await throw_error(f"An error occurred: {str(e)}")
-    finally:
-        keep_alive_task.cancel()
-        try:
-            await keep_alive_task
-        except asyncio.CancelledError:
-            pass
-        await websocket.close()
@@ -1,16 +1,11 @@
-import base64
 from fastapi import APIRouter
 from pydantic import BaseModel
 import httpx
+from assets.core import store_asset
 
 router = APIRouter()
 
 
-def bytes_to_data_url(image_bytes: bytes, mime_type: str) -> str:
-    base64_image = base64.b64encode(image_bytes).decode("utf-8")
-    return f"data:{mime_type};base64,{base64_image}"
-
-
 async def capture_screenshot(
     target_url: str, api_key: str, device: str = "desktop"
 ) -> bytes:
@@ -48,7 +43,9 @@ class ScreenshotRequest(BaseModel):
 
 
 class ScreenshotResponse(BaseModel):
-    url: str
+    # Asset handle of the screenshot (see routes/assets.py), which the client
+    # displays and generates from instead of the image itself
+    handle: str
 
 
 @router.post("/api/screenshot")
@@ -60,7 +57,7 @@ async def app_screenshot(request: ScreenshotRequest):
     # TODO: Add error handling
     image_bytes = await capture_screenshot(url, api_key=api_key)
 
-    # Convert the image bytes to a data url
-    data_url = bytes_to_data_url(image_bytes, "image/png")
+    # Store the screenshot so that the client (and code generation) can refer to it by handle
+    handle = await store_asset(image_bytes, "image/png")
 
-    return ScreenshotResponse(url=data_url)
+    return ScreenshotResponse(handle=handle)
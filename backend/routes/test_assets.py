@@ -0,0 +1,74 @@
+import asyncio
+import tempfile
+import unittest
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from image_generation.local_store import LocalImageStore
+from routes import assets
+
+
+class TestUploadAsset(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalImageStore(self.directory.name, max_bytes=1000)
+        self.patchers = [
+            mock.patch("assets.core.asset_store", self.store),
+            mock.patch("routes.assets.asset_store", self.store),
+            mock.patch("routes.assets.ASSET_MAX_UPLOAD_BYTES", 100),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        self.app = FastAPI()
+        self.app.include_router(assets.router)
+        self.client = TestClient(self.app)
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.directory.cleanup()
+
+    def test_stores_uploads(self):
+        response = self.client.post(
+            "/api/assets", content=b"png bytes", headers={"Content-Type": "image/png"}
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.json()["handle"].startswith("asset:"))
+
+    def test_rejects_oversized_chunked_uploads(self):
+        # Sent without a Content-Length, straight to the app since TestClient
+        # reads the whole body before sending it
+        received_chunks = 0
+        sent_messages = []
+
+        async def receive():
+            nonlocal received_chunks
+            received_chunks += 1
+            return {"type": "http.request", "body": b"x" * 30, "more_body": received_chunks < 1000}
+
+        async def send(message):
+            sent_messages.append(message)
+
+        scope = {
+            "type": "http",
+            "http_version": "1.1",
+            "method": "POST",
+            "scheme": "http",
+            "path": "/api/assets",
+            "raw_path": b"/api/assets",
+            "root_path": "",
+            "query_string": b"",
+            "headers": [(b"content-type", b"image/png"), (b"transfer-encoding", b"chunked")],
+            "client": ("testclient", 50000),
+            "server": ("testserver", 80),
+        }
+        asyncio.run(self.app(scope, receive, send))
+
+        self.assertEqual(sent_messages[0]["status"], 413)
+        # Rejected as soon as the limit was passed
+        self.assertEqual(received_chunks, 4)
+        self.assertEqual(self.store.stats()["images"], 0)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,237 @@
+import base64
+import tempfile
+import unittest
+from typing import Any, Dict, List, Tuple
+from unittest import mock
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+from starlette.websockets import WebSocketDisconnect
+from assets.core import bytes_to_data_url, is_asset_handle
+from completion_cache.core import CompletionCache
+from conversations.core import Conversations
+from image_generation.local_store import LocalImageStore
+from key_value_store.core import MemoryKeyValueStore
+from routes import generate_code
+from routes.generate_code import get_completion_cache_key, get_generation_key
+from ws.admission import AdmissionRejected
+from ws.constants import (
+    APP_ERROR_WEB_SOCKET_CODE,
+    ASSET_NOT_FOUND_WEB_SOCKET_CODE,
+    CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE,
+)
+from ws.sessions import GenerationSessions
+
+
+class TestGenerationKey(unittest.TestCase):
+
+    def test_includes_the_secret_key(self):
+        params = {
+            "generationType": "create",
+            "inputMode": "image",
+            "generatedCodeConfig": "html_tailwind",
+            "image": "asset:" + "0" * 64 + ".png",
+            "bedrockAccessKey": "AKIA",
+            "bedrockSecretKey": "secret",
+        }
+        self.assertEqual(get_generation_key(params), get_generation_key(dict(params)))
+        self.assertNotEqual(
+            get_generation_key(params),
+            get_generation_key({**params, "bedrockSecretKey": "guessed"}),
+        )
+
+
+# Runs the websocket route with MOCK=true, against fresh stores
+class GenerateCodeTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.asset_store = LocalImageStore(self.directory.name, max_bytes=10**8)
+        self.conversations = Conversations(MemoryKeyValueStore(100, 3600))
+        self.sessions = GenerationSessions()
+        self.patchers = [
+            mock.patch("assets.core.asset_store", self.asset_store),
+            mock.patch("routes.generate_code.conversations", self.conversations),
+            mock.patch("routes.generate_code.generation_sessions", self.sessions),
+            mock.patch("routes.generate_code.SHOULD_MOCK_AI_RESPONSE", True),
+            mock.patch("mock_llm.STREAM_CHUNK_SIZE", 1000),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        app = FastAPI()
+        app.include_router(generate_code.router)
+        # Entered so that every websocket runs on the same event loop, like
+        # generations shared between clients do
+        self.client = TestClient(app)
+        self.client.__enter__()
+
+    def tearDown(self):
+        self.client.__exit__(None, None, None)
+        for patcher in self.patchers:
+            patcher.stop()
+        self.directory.cleanup()
+
+    def create_params(self, **params: Any) -> Dict[str, Any]:
+        return {
+            "generationType": "create",
+            "inputMode": "image",
+            "generatedCodeConfig": "html_tailwind",
+            "codeGenerationModel": "anthropic.claude-3-5-sonnet-20240620-v1:0",
+            "isImageGenerationEnabled": False,
+            "image": bytes_to_data_url(b"png bytes", "image/png"),
+            **params,
+        }
+
+    # Sends the params and returns the messages received until the websocket
+    # was closed, and the close code
+    def generate(self, params: Dict[str, Any]) -> Tuple[List[Dict[str, Any]], int]:
+        messages: List[Dict[str, Any]] = []
+        with self.client.websocket_connect("/generate-code") as websocket:
+            websocket.send_json(params)
+            try:
+                while True:
+                    messages.append(websocket.receive_json())
+            except WebSocketDisconnect as e:
+                return messages, e.code
+
+
+class TestGenerateCode(GenerateCodeTestCase):
+
+    def test_prompts_from_the_stored_video(self):
+        create_prompt = mock.AsyncMock(return_value=([], {}))
+        with (
+            mock.patch("routes.generate_code.create_prompt", create_prompt),
+            mock.patch("assets.core.base64.b64decode", wraps=base64.b64decode) as b64decode,
+        ):
+            messages, close_code = self.generate(
+                self.create_params(
+                    inputMode="video", image=bytes_to_data_url(b"mp4 bytes", "video/mp4")
+                )
+            )
+
+        self.assertEqual(close_code, 1000)
+        self.assertIn("version", [message["type"] for message in messages])
+        # Decoded once, when it was stored
+        self.assertEqual(b64decode.call_count, 1)
+        self.assertTrue(is_asset_handle(create_prompt.call_args.args[0]["image"]))
+
+
+    def test_resumes_a_session_from_an_offset(self):
+        messages, _ = self.generate(self.create_params())
+        session_id = messages[0]["value"]
+
+        resumed_messages, close_code = self.generate(
+            {"resumeSessionId": session_id, "resumeOffset": 3}
+        )
+        self.assertEqual(close_code, 1000)
+        self.assertEqual(resumed_messages, messages[3:])
+
+    def test_unknown_session_cannot_be_resumed(self):
+        messages, close_code = self.generate({"resumeSessionId": "expired", "resumeOffset": 3})
+        self.assertEqual(close_code, APP_ERROR_WEB_SOCKET_CODE)
+        self.assertEqual(
+            messages, [{"type": "error", "value": "The generation session has expired."}]
+        )
+
+    def test_identical_requests_join_the_running_generation(self):
+        params = self.create_params()
+        # Streamed slowly enough for the second request to arrive mid-generation
+        with (
+            mock.patch("mock_llm.STREAM_CHUNK_SIZE", 20),
+            self.client.websocket_connect("/generate-code") as first_websocket,
+        ):
+            first_websocket.send_json(params)
+            first_session = first_websocket.receive_json()
+
+            second_messages, close_code = self.generate(params)
+
+        self.assertEqual(close_code, 1000)
+        self.assertEqual(second_messages[0], first_session)
+        self.assertEqual(self.sessions.stats()["created"], 1)
+        self.assertEqual(self.sessions.stats()["coalesced"], 1)
+        self.assertEqual(
+            [message["offset"] for message in second_messages], list(range(len(second_messages)))
+        )
+
+    def test_updates_reference_stored_versions(self):
+        messages, _ = self.generate(self.create_params())
+        version_id = next(message["value"] for message in messages if message["type"] == "version")
+
+        messages, close_code = self.generate(
+            self.create_params(
+                generationType="update",
+                image=None,
+                parentVersionId=version_id,
+                instruction="Make the header red",
+            )
+        )
+        self.assertEqual(close_code, 1000)
+        self.assertIn("version", [message["type"] for message in messages])
+
+    def test_update_without_instruction_is_rejected(self):
+        messages, close_code = self.generate(
+            self.create_params(generationType="update", image=None, parentVersionId="a-b")
+        )
+        self.assertEqual(close_code, APP_ERROR_WEB_SOCKET_CODE)
+        self.assertEqual(messages[0]["type"], "error")
+
+    def test_unknown_version_asks_for_the_history(self):
+        messages, close_code = self.generate(
+            self.create_params(
+                generationType="update",
+                image=None,
+                parentVersionId="unknown-version",
+                instruction="Make the header red",
+            )
+        )
+        self.assertEqual(close_code, CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE)
+        self.assertEqual(messages, [])
+
+    def test_missing_asset_asks_for_it_inline(self):
+        messages, close_code = self.generate(
+            self.create_params(image="asset:" + "0" * 64 + ".png")
+        )
+        self.assertEqual(close_code, ASSET_NOT_FOUND_WEB_SOCKET_CODE)
+        self.assertEqual([message["type"] for message in messages], ["session"])
+
+    def test_missing_asset_of_a_stored_version_asks_for_it_inline(self):
+        messages, _ = self.generate(self.create_params())
+        version_id = next(message["value"] for message in messages if message["type"] == "version")
+        for name in list(list(self.asset_store.groups.values())[0]):
+            self.asset_store.remove(name)
+
+        _, close_code = self.generate(
+            self.create_params(
+                generationType="update",
+                image=None,
+                parentVersionId=version_id,
+                instruction="Make the header red",
+            )
+        )
+        self.assertEqual(close_code, ASSET_NOT_FOUND_WEB_SOCKET_CODE)
+
+
+    def test_cache_hits_skip_admission_control(self):
+        params = self.create_params()
+        cache = CompletionCache(MemoryKeyValueStore(10, 3600))
+        cache.store.set(get_completion_cache_key(params), "<html>cached</html>")
+        # The queue is full
+        admission = mock.Mock()
+        admission.acquire = mock.AsyncMock(side_effect=AdmissionRejected())
+        with (
+            mock.patch("routes.generate_code.SHOULD_MOCK_AI_RESPONSE", False),
+            mock.patch("routes.generate_code.completion_cache", cache),
+            mock.patch("routes.generate_code.generation_admission", admission),
+        ):
+            messages, close_code = self.generate(params)
+
+        self.assertEqual(close_code, 1000)
+        self.assertIn(
+            {"type": "setCode", "value": "<html>cached</html>", "variantIndex": 0},
+            [{key: value for key, value in message.items() if key != "offset"} for message in messages],
+        )
+        admission.acquire.assert_not_called()
+        admission.release.assert_not_called()
+
+
+if __name__ == "__main__":
+    unittest.main()
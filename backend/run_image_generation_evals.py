@@ -3,7 +3,7 @@ import os
 from typing import List, Optional, Literal
 from dotenv import load_dotenv
 import aiohttp
-from image_generation.core import process_tasks
+from image_generation.core import GeneratedImage, process_tasks
 
 EVALS = [
     "Romantic Background",
@@ -51,14 +51,15 @@ async def generate_and_save_images(
         raise ValueError(f"API key for {model} is not set in the environment variables")
 
     # Generate images
-    results: List[Optional[str]] = await process_tasks(
+    results: List[Optional[GeneratedImage]] = await process_tasks(
         prompts, api_key, None, model=model
     )
 
     # Save images to disk
     async with aiohttp.ClientSession() as session:
-        for i, image_url in enumerate(results):
-            if image_url:
+        for i, image in enumerate(results):
+            if image:
+                image_url = image.url
                 # Get the image data
                 async with session.get(image_url) as response:
                     image_data: bytes = await response.read()
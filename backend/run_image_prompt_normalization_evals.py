@@ -0,0 +1,80 @@
+import os
+import re
+import sys
+from collections import defaultdict
+from typing import Callable, Dict, List
+from bs4 import BeautifulSoup
+from evals.config import EVALS_DIR
+from image_generation.core import normalize_image_prompt
+
+OUTPUT_DIR = EVALS_DIR + "/outputs"
+
+# Used when there are no generated outputs: independent rewordings of the same
+# images, written without looking at what the normalizer strips
+PARAPHRASES: List[List[str]] = [
+    ["Company logo: A stylized green sprout emerging from a circle", "Logo with a green sprout growing out of a circle", "Green sprout logo"],
+    ["Portrait of a woman with long dark hair smiling at the camera", "Smiling woman with long dark hair", "Headshot of a smiling brunette woman"],
+    ["Two hands holding iPhone 14 models with colorful displays", "Hands holding two iPhone 14 phones", "Two iPhone 14s with colorful screens"],
+    ["Threadless logo on a gradient background from light pink to coral", "Threadless logo on a pink to coral gradient", "Threadless logo"],
+    ["Profile picture of Pierre-Louis Labonne", "Pierre-Louis Labonne", "Pierre-Louis Labonne's avatar"],
+    ["Placeholder image of a PDF cover with abstract design", "PDF cover with an abstract design", "Abstract PDF cover"],
+    ["How ASML Dominates Chip Machines", "Thumbnail for How ASML Dominates Chip Machines", "ASML chip machines video thumbnail"],
+    ["Andrej Karpathy", "Andrej Karpathy profile picture", "Photo of Andrej Karpathy"],
+]
+
+
+# Alt texts of the placeholder images in each generated page, grouped by the
+# eval input they were generated from ("<input>_<n>.html")
+def load_generated_alt_texts(directory: str) -> Dict[str, List[List[str]]]:
+    alt_texts: Dict[str, List[List[str]]] = defaultdict(list)
+    for filename in sorted(os.listdir(directory)):
+        if not filename.endswith(".html"):
+            continue
+        eval_name = re.sub(r"_\d+$", "", os.path.splitext(filename)[0])
+        with open(os.path.join(directory, filename)) as f:
+            soup = BeautifulSoup(f.read(), "html.parser")
+        alt_texts[eval_name].append(
+            [
+                img["alt"]
+                for img in soup.find_all("img")
+                if img.get("alt") and img.get("src", "").startswith("https://placehold.co")
+            ]
+        )
+    return alt_texts
+
+
+# Fraction of prompts that would be served by an image generated for an earlier
+# output of the same eval
+def hit_rate(groups: List[List[List[str]]], key: Callable[[str], str]) -> tuple[int, float]:
+    num_prompts = 0
+    num_hits = 0
+    for outputs in groups:
+        seen: set[str] = set()
+        for prompts in outputs:
+            num_prompts += len(prompts)
+            num_hits += sum(1 for prompt in prompts if key(prompt) in seen)
+            seen |= set(key(prompt) for prompt in prompts)
+    return num_prompts, num_hits / num_prompts if num_prompts else 0
+
+
+# Usage: poetry run python run_image_prompt_normalization_evals.py [outputs directory]
+# Reports the image cache hit rate with raw alt text keys vs normalized keys, across
+# the outputs that run_evals.py generated for the same screenshot. Falls back to
+# PARAPHRASES if there are no outputs.
+def main() -> None:
+    directory = sys.argv[1] if len(sys.argv) > 1 else OUTPUT_DIR
+    if os.path.isdir(directory):
+        groups = list(load_generated_alt_texts(directory).values())
+        print(f"Alt texts of {sum(len(outputs) for outputs in groups)} outputs for {len(groups)} evals in {directory}")
+    else:
+        print(f"No outputs in {directory} (run run_evals.py first), using paraphrases")
+        groups = [[[prompt] for prompt in paraphrases] for paraphrases in PARAPHRASES]
+
+    num_prompts, raw_hit_rate = hit_rate(groups, lambda prompt: prompt)
+    _, normalized_hit_rate = hit_rate(groups, normalize_image_prompt)
+    print(f"Raw keys: {num_prompts} prompts, hit rate {raw_hit_rate:.1%}")
+    print(f"Normalized keys: hit rate {normalized_hit_rate:.1%}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,55 @@
+# Load environment variables first
+from dotenv import load_dotenv
+
+load_dotenv()
+
+import asyncio
+import statistics
+import time
+from typing import Dict, List, Tuple
+import boto3
+from config import BEDROCK_ACCESS_KEY, BEDROCK_SECRET_KEY
+from image_generation.core import (
+    IMAGE_SIZE_BUCKETS,
+    build_image_request,
+    invoke_image_model,
+)
+from run_image_generation_evals import EVALS
+
+MODEL = "amazon.nova-canvas-v1:0"
+# Nova Canvas is only available in us-east-1
+REGION = "us-east-1"
+# Number of eval prompts to generate per size bucket
+NUM_PROMPTS = 3
+
+
+# Generates NUM_PROMPTS images per size bucket and reports latency and PNG size
+async def main() -> None:
+    client = boto3.client(
+        service_name="bedrock-runtime",
+        region_name=REGION,
+        aws_access_key_id=BEDROCK_ACCESS_KEY or None,
+        aws_secret_access_key=BEDROCK_SECRET_KEY or None,
+    )
+
+    results: Dict[Tuple[int, int], List[Tuple[float, int]]] = {}
+    for width, height in IMAGE_SIZE_BUCKETS:
+        for prompt in EVALS[:NUM_PROMPTS]:
+            request = build_image_request(prompt, width, height)
+            start_time = time.time()
+            image_data = await asyncio.to_thread(
+                invoke_image_model, client, MODEL, request
+            )
+            latency = time.time() - start_time
+            results.setdefault((width, height), []).append((latency, len(image_data)))
+            print(f"{width}x{height}: {latency:.2f}s, {len(image_data)} bytes")
+
+    print(f"\n{'bucket':>10} {'mean latency':>14} {'mean bytes':>12}")
+    for (width, height), samples in results.items():
+        mean_latency = statistics.mean(latency for latency, _ in samples)
+        mean_bytes = statistics.mean(size for _, size in samples)
+        print(f"{f'{width}x{height}':>10} {mean_latency:>13.2f}s {mean_bytes:>12.0f}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,170 @@
+import asyncio
+import base64
+import io
+import math
+import mimetypes
+import os
+import statistics
+import sys
+import tempfile
+import time
+from typing import Callable, List, cast
+from unittest import mock
+import numpy as np
+from moviepy.editor import VideoClip, VideoFileClip  # type: ignore
+from PIL import Image
+from image_processing.utils import estimate_image_tokens
+from video.utils import (
+    TARGET_NUM_SCREENSHOTS,
+    assemble_claude_prompt_video,
+    split_video_into_screenshots,
+)
+
+VIDEO_DIR = "./video_evals/videos"
+# Number of runs per video and sampler
+NUM_RUNS = 3
+# Frames per image compared for the prompt (1 is one image per frame)
+CONTACT_SHEET_SIZES = [1, 4, 9]
+
+
+# The previous sampler, which decoded every frame (and loaded the audio track)
+# to keep one in every frame_skip frames
+def split_video_into_screenshots_iter_frames(video_data_url: str) -> List[Image.Image]:
+    video_bytes = base64.b64decode(video_data_url.split(",")[1])
+    mime_type = video_data_url.split(";")[0].split(":")[1]
+    suffix = mimetypes.guess_extension(mime_type)
+
+    with tempfile.NamedTemporaryFile(suffix=suffix, delete=True) as temp_video_file:
+        temp_video_file.write(video_bytes)
+        temp_video_file.flush()
+        clip = VideoFileClip(temp_video_file.name)
+        images: List[Image.Image] = []
+        total_frames = cast(int, clip.reader.nframes)  # type: ignore
+        frame_skip = max(1, math.ceil(total_frames / TARGET_NUM_SCREENSHOTS))
+        for i, frame in enumerate(clip.iter_frames()):
+            if i % frame_skip == 0:
+                images.append(Image.fromarray(frame))  # type: ignore
+                if len(images) >= TARGET_NUM_SCREENSHOTS:
+                    break
+        clip.close()
+        return images
+
+
+# Times (in seconds) at which the synthetic recording switches to its next UI
+# state: idle stretches with bursts of quick interactions in between
+SYNTHETIC_STATE_CHANGES = [0, 20, 20.5, 21, 21.5, 22, 40, 40.3, 40.6, 55]
+
+
+def render_synthetic_state(state: int) -> np.ndarray:
+    frame = np.full((720, 1280, 3), 245, dtype=np.uint8)
+    frame[:80] = (40, 60, 120)
+    frame[200:400, 100 + 100 * state : 200 + 100 * state] = (200, 80, 80)
+    return frame
+
+
+# A 60 s, 60 fps, 1280x720 stand-in for a screen recording
+def create_synthetic_recording(path: str) -> None:
+    def make_frame(t: float) -> np.ndarray:
+        state = sum(1 for change in SYNTHETIC_STATE_CHANGES if change <= t) - 1
+        return render_synthetic_state(state)
+
+    clip = VideoClip(make_frame, duration=60)
+    clip.write_videofile(path, fps=60, codec="libx264", audio=False, logger=None)
+
+
+# Number of distinct states of the synthetic recording shown by the frames
+def count_synthetic_states(images: List[Image.Image]) -> int:
+    states = [render_synthetic_state(i) for i in range(len(SYNTHETIC_STATE_CHANGES))]
+    shown = set()
+    for image in images:
+        frame = np.asarray(image.convert("RGB"), dtype=np.int16)
+        differences = [np.abs(frame - state).mean() for state in states]
+        shown.add(int(np.argmin(differences)))
+    return len(shown)
+
+
+def to_data_url(path: str) -> str:
+    mime_type = mimetypes.guess_type(path)[0] or "video/mp4"
+    with open(path, "rb") as f:
+        return f"data:{mime_type};base64,{base64.b64encode(f.read()).decode('utf-8')}"
+
+
+def with_frame_selection(selection: str) -> Callable[[str], List[Image.Image]]:
+    def sampler(video_data_url: str) -> List[Image.Image]:
+        with mock.patch("video.utils.VIDEO_FRAME_SELECTION", selection):
+            return split_video_into_screenshots(video_data_url)
+
+    return sampler
+
+
+SAMPLERS = {
+    "iter_frames": split_video_into_screenshots_iter_frames,
+    "uniform": with_frame_selection("uniform"),
+    "scene": with_frame_selection("scene"),
+}
+
+
+def benchmark(
+    sampler: Callable[[str], List[Image.Image]], video_data_url: str
+) -> tuple[float, List[Image.Image]]:
+    durations: List[float] = []
+    images: List[Image.Image] = []
+    for _ in range(NUM_RUNS):
+        start_time = time.time()
+        images = sampler(video_data_url)
+        durations.append(time.time() - start_time)
+    return statistics.median(durations), images
+
+
+# Request size of the video prompt with frames_per_sheet frames per image
+def measure_prompt(video_data_url: str, frames_per_sheet: int) -> tuple[int, int, int]:
+    with mock.patch("video.utils.VIDEO_FRAMES_PER_SHEET", frames_per_sheet):
+        messages = asyncio.run(assemble_claude_prompt_video(video_data_url))
+    images = [part for part in messages[0]["content"] if part["type"] == "image"]
+    request_bytes = sum(len(part["source"]["data"]) for part in images)
+    image_tokens = sum(
+        estimate_image_tokens(*Image.open(io.BytesIO(base64.b64decode(part["source"]["data"]))).size)
+        for part in images
+    )
+    return len(images), request_bytes, image_tokens
+
+
+# Usage: poetry run python run_video_sampling_benchmark.py [video ...]
+# Defaults to the videos in VIDEO_DIR, or a synthetic recording if there are none.
+# Also compares the size of the video prompt with and without contact sheets.
+# For the synthetic recording, also reports how many of its UI states the
+# sampled frames show.
+def main() -> None:
+    paths = sys.argv[1:]
+    if not paths and os.path.isdir(VIDEO_DIR):
+        paths = [os.path.join(VIDEO_DIR, f) for f in sorted(os.listdir(VIDEO_DIR))]
+
+    with tempfile.TemporaryDirectory() as directory:
+        is_synthetic = not paths
+        if is_synthetic:
+            print("No videos found, generating a synthetic 60 s, 60 fps recording...")
+            paths = [os.path.join(directory, "synthetic.mp4")]
+            create_synthetic_recording(paths[0])
+
+        for path in paths:
+            video_data_url = to_data_url(path)
+            print(os.path.basename(path))
+            for name, sampler in SAMPLERS.items():
+                seconds, images = benchmark(sampler, video_data_url)
+                image_tokens = sum(estimate_image_tokens(*image.size) for image in images)
+                result = f"  {name}: {seconds:.2f}s, {len(images)} frames, ~{image_tokens} image tokens"
+                if is_synthetic:
+                    result += f", {count_synthetic_states(images)}/{len(SYNTHETIC_STATE_CHANGES)} states"
+                print(result)
+            for frames_per_sheet in CONTACT_SHEET_SIZES:
+                num_images, request_bytes, image_tokens = measure_prompt(
+                    video_data_url, frames_per_sheet
+                )
+                print(
+                    f"  {frames_per_sheet} frames per image: {num_images} images, "
+                    f"{request_bytes} request bytes, ~{image_tokens} image tokens"
+                )
+
+
+if __name__ == "__main__":
+    main()
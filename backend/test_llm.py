@@ -1,5 +1,17 @@
+import io
+import tempfile
 import unittest
-from llm import convert_frontend_str_to_llm, Llm
+from unittest import mock
+from PIL import Image
+from assets.core import save_asset
+from image_generation.local_store import LocalImageStore
+from llm import (
+    convert_claude_messages_to_bedrock,
+    convert_frontend_str_to_llm,
+    load_prompt_image,
+    stream_claude_bedrock_response_native,
+    Llm,
+)
 
 
 class TestConvertFrontendStrToLlm(unittest.TestCase):
@@ -22,5 +34,99 @@ class TestConvertFrontendStrToLlm(unittest.TestCase):
             convert_frontend_str_to_llm("another_invalid_string")
 
 
+
+class FakeBedrockRuntime:
+    def __init__(self, responses: list[tuple[str, str]]):
+        self.responses = responses
+        self.requests: list[dict] = []
+
+    def converse_stream(self, **kwargs):
+        self.requests.append(kwargs)
+        text, stop_reason = self.responses[len(self.requests) - 1]
+        return {
+            "stream": [{"contentBlockDelta": {"delta": {"text": text[i : i + 5]}}} for i in range(0, len(text), 5)]
+            + [{"messageStop": {"stopReason": stop_reason}}]
+        }
+
+
+class TestStreamClaudeBedrockResponseNative(unittest.IsolatedAsyncioTestCase):
+    def test_converts_images(self):
+        messages = [
+            {
+                "role": "user",
+                "content": [
+                    {"type": "image", "source": {"type": "base64", "media_type": "image/jpeg", "data": "aGk="}},
+                    {"type": "text", "text": "Build this"},
+                ],
+            },
+            {"role": "assistant", "content": "<thinking>"},
+        ]
+        self.assertEqual(
+            convert_claude_messages_to_bedrock(messages),
+            [
+                {
+                    "role": "user",
+                    "content": [
+                        {"image": {"format": "jpeg", "source": {"bytes": b"hi"}}},
+                        {"text": "Build this"},
+                    ],
+                },
+                {"role": "assistant", "content": [{"text": "<thinking>"}]},
+            ],
+        )
+
+    async def test_streams_each_pass(self):
+        bedrock_runtime = FakeBedrockRuntime(
+            [("plan</thinking><html>1", "max_tokens"), ("</html>", "end_turn"), ("<html>2</html>", "end_turn")]
+        )
+        chunks: list[str] = []
+        passes: list[tuple[int, int]] = []
+
+        async def callback(text: str):
+            chunks.append(text)
+
+        async def on_pass(pass_num: int, num_passes: int):
+            passes.append((pass_num, num_passes))
+
+        with mock.patch("llm.boto3.client", return_value=bedrock_runtime):
+            completion = await stream_claude_bedrock_response_native(
+                "system",
+                [{"role": "user", "content": "Build this"}],
+                "access",
+                "secret",
+                "us-west-2",
+                callback,
+                include_thinking=True,
+                on_pass=on_pass,
+            )
+
+        self.assertEqual(completion, "<html>2</html>")
+        self.assertEqual("".join(chunks), "plan</thinking><html>1</html><html>2</html>")
+        self.assertEqual(passes, [(1, 2), (2, 2)])
+        # The truncated first pass is continued, and the second pass improves on it
+        self.assertEqual(
+            bedrock_runtime.requests[1]["messages"][-1],
+            {"role": "assistant", "content": [{"text": "<thinking>plan</thinking><html>1"}]},
+        )
+        self.assertEqual(
+            bedrock_runtime.requests[2]["messages"][1],
+            {"role": "assistant", "content": [{"text": "<thinking>plan</thinking><html>1</html>"}]},
+        )
+
+
+class TestLoadPromptImage(unittest.TestCase):
+    def test_reads_asset_handles(self):
+        png = io.BytesIO()
+        Image.new("RGB", (10, 10), "red").save(png, format="PNG")
+        with (
+            tempfile.TemporaryDirectory() as directory,
+            mock.patch("assets.core.asset_store", LocalImageStore(directory, max_bytes=10000)),
+        ):
+            handle = save_asset(png.getvalue(), "image/png")
+            media_type, data = load_prompt_image(handle)
+        self.assertEqual(media_type, "image/jpeg")
+        self.assertEqual(Image.open(io.BytesIO(data)).size, (10, 10))
+
+
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,71 @@
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from config import VIDEO_FRAME_CACHE_MAX_BYTES
+
+
+class FrameCache:
+    """
+    Keeps the encoded frames (the prompt content) of recent videos under a byte
+    budget, evicting the least recently used videos first. Keys identify the
+    video's content and the sampling parameters.
+    """
+
+    def __init__(self, max_bytes: int = VIDEO_FRAME_CACHE_MAX_BYTES):
+        self.max_bytes = max_bytes
+        # key -> (size, content), least recently used first
+        self.entries: "OrderedDict[str, Tuple[int, list[dict[str, Any]]]]" = OrderedDict()
+        self.total_bytes = 0
+        # Frames are extracted in worker threads
+        self.lock = threading.Lock()
+
+        # Metrics
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str) -> list[dict[str, Any]] | None:
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self.entries.move_to_end(key)
+            # A copy, so that callers can't change the cached content
+            return list(entry[1])
+
+    def set(self, key: str, content: list[dict[str, Any]]) -> None:
+        size = get_content_size(content)
+        if size > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.total_bytes -= self.entries.pop(key)[0]
+            self.entries[key] = (size, list(content))
+            self.total_bytes += size
+            while self.total_bytes > self.max_bytes:
+                _, (evicted_size, _) = self.entries.popitem(last=False)
+                self.total_bytes -= evicted_size
+                self.evictions += 1
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "videos": len(self.entries),
+            "total_bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
+
+
+# Size of the base64 image data and text in the content
+def get_content_size(content: list[dict[str, Any]]) -> int:
+    return sum(
+        len(part["source"]["data"]) if part["type"] == "image" else len(part.get("text", ""))
+        for part in content
+    )
+
+
+frame_cache = FrameCache()
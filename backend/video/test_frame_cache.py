@@ -0,0 +1,23 @@
+import unittest
+from video.frame_cache import FrameCache
+
+
+class TestFrameCache(unittest.TestCase):
+
+    def test_evicts_least_recently_used_videos(self):
+        frame_cache = FrameCache(max_bytes=10)
+        frame_cache.set("a", [{"type": "text", "text": "1234"}])
+        frame_cache.set("b", [{"type": "image", "source": {"data": "1234"}}])
+        frame_cache.get("a")
+        frame_cache.set("c", [{"type": "text", "text": "1234"}])
+
+        self.assertIsNotNone(frame_cache.get("a"))
+        self.assertIsNone(frame_cache.get("b"))
+        self.assertEqual(frame_cache.stats()["total_bytes"], 8)
+        # Too large to cache at all
+        frame_cache.set("d", [{"type": "text", "text": "12345678901"}])
+        self.assertIsNone(frame_cache.get("d"))
+
+
+if __name__ == "__main__":
+    unittest.main()
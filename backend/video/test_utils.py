@@ -0,0 +1,191 @@
+import base64
+import os
+import tempfile
+import unittest
+from unittest import mock
+import numpy as np
+from moviepy.editor import ImageSequenceClip  # type: ignore
+from PIL import Image
+from assets.core import save_asset
+from image_generation.local_store import LocalImageStore
+from video.frame_cache import FrameCache
+from video.utils import (
+    assemble_claude_prompt_video,
+    get_sample_timestamps,
+    pack_contact_sheets,
+    select_keyframes,
+    split_video_into_screenshots,
+)
+
+
+FPS = 10
+NUM_FRAMES = 40
+
+
+# By default, a video whose nth frame is a solid gray of brightness 6 * n, so
+# that each sampled frame can be traced back to its index
+def create_video_data_url(frames: list[np.ndarray] | None = None) -> str:
+    if frames is None:
+        frames = [np.full((64, 64, 3), 6 * i, dtype=np.uint8) for i in range(NUM_FRAMES)]
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "video.mp4")
+        clip = ImageSequenceClip(frames, fps=FPS)
+        clip.write_videofile(path, codec="libx264", audio=False, logger=None)
+        with open(path, "rb") as f:
+            return f"data:video/mp4;base64,{base64.b64encode(f.read()).decode('utf-8')}"
+
+
+class TestSampleTimestamps(unittest.TestCase):
+
+    def test_evenly_spaced(self):
+        self.assertEqual(get_sample_timestamps(10, 30, 5), [0, 2, 4, 6, 8])
+
+    def test_no_more_than_the_number_of_frames(self):
+        self.assertEqual(get_sample_timestamps(0.5, 6, 20), [0, 1 / 6, 2 / 6])
+        self.assertEqual(get_sample_timestamps(0.01, 30, 20), [0])
+
+
+class TestSelectKeyframes(unittest.TestCase):
+
+    def create_frames(self, states: list[int]) -> np.ndarray:
+        frames = np.zeros((len(states), 40, 40), dtype=np.uint8)
+        for i, state in enumerate(states):
+            # Each state shows a block in a different place
+            frames[i, 10:20, 4 * state : 4 * state + 4] = 200
+        return frames
+
+    def test_one_frame_per_state(self):
+        frames = self.create_frames([0, 0, 0, 0, 1, 2, 2, 2, 3])
+        self.assertEqual(select_keyframes(frames, 20), [3, 4, 7, 8])
+
+    def test_ignores_noise(self):
+        frames = self.create_frames([0, 0, 0, 1, 1])
+        noise = np.random.default_rng(0).integers(0, 10, frames.shape, dtype=np.uint8)
+        self.assertEqual(select_keyframes(frames + noise, 20), [2, 4])
+
+    def test_drops_states_that_came_back(self):
+        frames = self.create_frames([0, 0, 1, 0, 0, 2])
+        self.assertEqual(select_keyframes(frames, 20), [1, 2, 4, 5])
+        frames = self.create_frames([0, 0, 1, 1, 1, 1])
+        frames[3, 0, 0] = 255  # A single pixel blip
+        self.assertEqual(select_keyframes(frames, 20), [1, 5])
+
+    def test_keeps_evenly_spaced_states(self):
+        frames = self.create_frames(list(range(10)))
+        self.assertEqual(select_keyframes(frames, 4), [0, 3, 6, 9])
+        self.assertEqual(select_keyframes(frames[:1], 4), [0])
+
+
+class TestContactSheets(unittest.IsolatedAsyncioTestCase):
+
+    def test_packs_frames_into_grids(self):
+        frames = [Image.new("RGB", (1280, 720), (10 * i, 0, 0)) for i in range(10)]
+        sheets = pack_contact_sheets(frames, 4)
+
+        self.assertEqual(len(sheets), 3)
+        # A 2x2 grid, downscaled to the model's effective resolution
+        self.assertLessEqual(max(sheets[0].size), 1568)
+        self.assertLessEqual(sheets[0].width * sheets[0].height, 1_200_000)
+        self.assertAlmostEqual(sheets[0].width / sheets[0].height, 16 / 9, delta=0.05)
+        # The first frame fills the top left cell, below its label
+        bottom_left = (10, sheets[0].height // 2 - 20)
+        self.assertEqual(sheets[0].getpixel(bottom_left), (0, 0, 0))
+        bottom_right = (sheets[0].width - 20, sheets[0].height - 20)
+        self.assertEqual(sheets[0].getpixel(bottom_right), (30, 0, 0))
+        # The last sheet only has the remaining 2 frames, side by side
+        self.assertGreater(sheets[2].width, sheets[2].height * 2)
+
+    async def test_video_prompt_with_contact_sheets(self):
+        images = [Image.new("RGB", (1280, 720)) for _ in range(20)]
+        with (
+            mock.patch("video.utils.iter_video_screenshots", return_value=iter(images)),
+            mock.patch("video.utils.VIDEO_FRAMES_PER_SHEET", 4),
+            mock.patch("video.utils.frame_cache", FrameCache()),
+        ):
+            messages = await assemble_claude_prompt_video("asset:video")
+
+        content = messages[0]["content"]
+        self.assertEqual(content[0]["type"], "text")
+        self.assertEqual([part["type"] for part in content[1:]], ["image"] * 5)
+
+
+class TestSplitVideoIntoScreenshots(unittest.TestCase):
+
+    @classmethod
+    def setUpClass(cls):
+        cls.video_data_url = create_video_data_url()
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()
+        self.store = LocalImageStore(self.directory.name, max_bytes=10**7)
+        self.patchers = [
+            mock.patch("assets.core.asset_store", self.store),
+            mock.patch("video.utils.VIDEO_FRAME_SELECTION", "uniform"),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.directory.cleanup()
+
+    def assert_sampled_frames(self, images: list):
+        self.assertEqual(len(images), 8)
+        self.assertEqual(images[0].size, (64, 64))
+        # Roughly every 5th frame, from the first to the last
+        indices = [round(image.getpixel((32, 32))[0] / 6) for image in images]
+        self.assertEqual(indices[0], 0)
+        self.assertEqual(indices, sorted(set(indices)))
+        self.assertGreaterEqual(indices[-1], NUM_FRAMES - 6)
+
+    def test_decodes_the_sampled_frames_of_a_data_url(self):
+        with mock.patch("video.utils.TARGET_NUM_SCREENSHOTS", 8):
+            self.assert_sampled_frames(split_video_into_screenshots(self.video_data_url))
+        # Stored once, so that it's decoded from the asset store
+        self.assertEqual(len(self.store.groups), 1)
+
+    def test_decodes_an_uploaded_video(self):
+        handle = save_asset(
+            base64.b64decode(self.video_data_url.split(",")[1]), "video/mp4"
+        )
+        with mock.patch("video.utils.TARGET_NUM_SCREENSHOTS", 8):
+            self.assert_sampled_frames(split_video_into_screenshots(handle))
+
+    def test_selects_frames_at_scene_changes(self):
+        # 10 s at 10 fps: idle, then two quick changes
+        brightness = [0] * 50 + [100] * 5 + [200] * 45
+        video_data_url = create_video_data_url(
+            [np.full((64, 64, 3), value, dtype=np.uint8) for value in brightness]
+        )
+        with mock.patch("video.utils.VIDEO_FRAME_SELECTION", "scene"):
+            images = split_video_into_screenshots(video_data_url)
+        values = [image.getpixel((32, 32))[0] for image in images]
+        self.assertEqual(len(values), 3)
+        for value, expected in zip(values, [0, 100, 200]):
+            self.assertAlmostEqual(value, expected, delta=4)
+
+
+class TestVideoFrameCaching(unittest.IsolatedAsyncioTestCase):
+
+    async def test_repeat_requests_skip_decoding(self):
+        images = [Image.new("RGB", (64, 64)) for _ in range(3)]
+        frame_cache = FrameCache()
+        with (
+            mock.patch("video.utils.iter_video_screenshots", side_effect=lambda _: iter(images)) as iter_video_screenshots,
+            mock.patch("video.utils.frame_cache", frame_cache),
+        ):
+            video = "asset:" + "a" * 64 + ".webm"
+            first = await assemble_claude_prompt_video(video)
+            second = await assemble_claude_prompt_video(video)
+            self.assertEqual(first, second)
+            self.assertEqual(iter_video_screenshots.call_count, 1)
+
+            # Other sampling parameters are cached separately
+            with mock.patch("video.utils.VIDEO_FRAMES_PER_SHEET", 4):
+                await assemble_claude_prompt_video(video)
+            self.assertEqual(iter_video_screenshots.call_count, 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,28 +1,74 @@
 # Extract HTML content from the completion string
+import asyncio
 import base64
 import io
-import mimetypes
-import os
-import tempfile
-import uuid
-from typing import Any, Union, cast
-from moviepy.editor import VideoFileClip  # type: ignore
-from PIL import Image
+import json
+import subprocess
+import time
+from typing import Any, Iterator, Union
+import numpy as np
+from moviepy.config import get_setting  # type: ignore
+from moviepy.video.io.ffmpeg_reader import ffmpeg_parse_infos  # type: ignore
+from PIL import Image, ImageDraw, ImageFont
+from assets.core import get_asset_hash, get_asset_path, save_data_url
+from config import VIDEO_FRAME_SELECTION, VIDEO_FRAMES_PER_SHEET
+from debug.artifacts import debug_artifacts
+from image_processing.utils import estimate_image_tokens, get_effective_image_size
+from video.frame_cache import frame_cache
 import math
 
 
-DEBUG = True
 TARGET_NUM_SCREENSHOTS = (
     20  # Should be max that Claude supports (20) - reduce to save tokens on testing
 )
 
+# Contact sheets: space between frames and size of the frame number labels
+CONTACT_SHEET_GUTTER = 8
+CONTACT_SHEET_LABEL_SIZE = 20
 
-async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
-    images = split_video_into_screenshots(video_data_url)
+# Scene change detection runs on frames decoded at this rate and width
+SCENE_ANALYSIS_FPS = 4
+SCENE_ANALYSIS_WIDTH = 160
+# A pixel has changed if its brightness moved by more than this (out of 255),
+# which ignores compression noise
+SCENE_PIXEL_THRESHOLD = 16
+# The UI has changed if more than this fraction of pixels changed
+SCENE_CHANGE_THRESHOLD = 0.001
 
-    # Save images to tmp if we're debugging
-    if DEBUG:
-        save_images_to_tmp(images)
+
+async def assemble_claude_prompt_video(video: str) -> list[Any]:
+    # Decoding and encoding run in a thread so that they don't block the event loop
+    content_messages = await asyncio.to_thread(create_video_content, video)
+
+    return [
+        {
+            "role": "user",
+            "content": content_messages,
+        },
+    ]
+
+
+def create_video_content(video: str) -> list[dict[str, Any]]:
+    start_time = time.time()
+
+    # Generating from the same video again skips decoding entirely
+    cache_key = get_frame_cache_key(video)
+    cached_content = frame_cache.get(cache_key)
+    print(f"[FRAME CACHE] {'Hit' if cached_content else 'Miss'}, {frame_cache.stats()}")
+    if cached_content is not None:
+        return cached_content
+
+    images: list[Image.Image] = []
+    encoded_images: list[dict[str, Any]] = []
+    for image in iter_video_screenshots(video):
+        images.append(image)
+        # Frames sent as their own images are encoded while the next frame is
+        # being decoded
+        if VIDEO_FRAMES_PER_SHEET <= 1:
+            encoded_images.append(encode_image(image))
+
+    # Keep the frames of a sample of requests for debugging
+    debug_artifacts.save_images("video_frames", images)
 
     # Validate number of images
     print(f"Number of frames extracted from video: {len(images)}")
@@ -31,90 +77,282 @@ async def assemble_claude_prompt_video(video_data_url: str) -> list[Any]:
         raise ValueError("Too many screenshots extracted from video")
 
     # Convert images to the message format for Claude
-    content_messages: list[dict[str, Union[dict[str, str], str]]] = []
-    for image in images:
-
-        # Convert Image to buffer
-        buffered = io.BytesIO()
-        image.save(buffered, format="JPEG")
-
-        # Encode bytes as base64
-        base64_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
-        media_type = "image/jpeg"
-
+    content_messages: list[dict[str, Any]] = []
+    if VIDEO_FRAMES_PER_SHEET > 1:
+        images = pack_contact_sheets(images, VIDEO_FRAMES_PER_SHEET)
+        encoded_images = [encode_image(image) for image in images]
         content_messages.append(
             {
-                "type": "image",
-                "source": {
-                    "type": "base64",
-                    "media_type": media_type,
-                    "data": base64_data,
-                },
+                "type": "text",
+                "text": "The frames of the video are packed in order into grid images, left to right and top to bottom. Each frame is labelled with its number.",
             }
         )
+    content_messages += encoded_images
 
-    return [
+    request_bytes = sum(len(image["source"]["data"]) for image in encoded_images)
+    image_tokens = sum(estimate_image_tokens(*image.size) for image in images)
+    print(
+        f"Sending {len(images)} images from the video: {request_bytes} bytes, about {image_tokens} image tokens, prepared in {time.time() - start_time:.2f}s"
+    )
+    frame_cache.set(cache_key, content_messages)
+    return content_messages
+
+
+# Identifies the video's content and every parameter that changes which frames
+# are sampled and how they are encoded
+def get_frame_cache_key(video: str) -> str:
+    return json.dumps(
         {
-            "role": "user",
-            "content": content_messages,
+            "video": get_asset_hash(video),
+            "target_num_screenshots": TARGET_NUM_SCREENSHOTS,
+            "selection": VIDEO_FRAME_SELECTION,
+            "frames_per_sheet": VIDEO_FRAMES_PER_SHEET,
+            "scene": [
+                SCENE_ANALYSIS_FPS,
+                SCENE_ANALYSIS_WIDTH,
+                SCENE_PIXEL_THRESHOLD,
+                SCENE_CHANGE_THRESHOLD,
+            ],
         },
-    ]
+        sort_keys=True,
+    )
+
+
+# Converts an image to the message format for Claude
+def encode_image(image: Image.Image) -> dict[str, Union[dict[str, str], str]]:
+
+    # Convert Image to buffer
+    buffered = io.BytesIO()
+    image.save(buffered, format="JPEG")
+
+    # Encode bytes as base64
+    base64_data = base64.b64encode(buffered.getvalue()).decode("utf-8")
+    media_type = "image/jpeg"
+
+    return {
+        "type": "image",
+        "source": {
+            "type": "base64",
+            "media_type": media_type,
+            "data": base64_data,
+        },
+    }
+
 
+# Returns a list of images/frame (RGB format). Takes the handle of an uploaded
+# video, or a data URL.
+def split_video_into_screenshots(video: str) -> list[Image.Image]:
+    return list(iter_video_screenshots(video))
 
-# Returns a list of images/frame (RGB format)
-def split_video_into_screenshots(video_data_url: str) -> list[Image.Image]:
+
+# Yields the sampled frames as they are decoded
+def iter_video_screenshots(video: str) -> Iterator[Image.Image]:
     target_num_screenshots = TARGET_NUM_SCREENSHOTS
 
-    # Decode the base64 URL to get the video bytes
-    video_encoded_data = video_data_url.split(",")[1]
-    video_bytes = base64.b64decode(video_encoded_data)
+    # ffmpeg reads uploaded videos straight from the asset store. Videos sent
+    # as data URLs are added to the store first, once per distinct video.
+    video_path = get_asset_path(save_data_url(video))
+
+    infos = ffmpeg_parse_infos(video_path)
+    width, height = infos["video_size"]
+    # ffmpeg rotates the frames according to the video's rotation metadata
+    if infos.get("video_rotation") in (90, 270):
+        width, height = height, width
+
+    if VIDEO_FRAME_SELECTION == "scene":
+        timestamps = get_scene_change_timestamps(
+            video_path, width, height, infos["video_fps"], target_num_screenshots
+        )
+    else:
+        timestamps = get_sample_timestamps(
+            infos["duration"], infos["video_fps"], target_num_screenshots
+        )
+    for t, frame in zip(timestamps, read_frames_at(video_path, timestamps, width, height)):
+        if frame is None:
+            print(f"Could not decode the frame at {t:.2f}s, skipping it")
+            continue
+        yield frame
+
 
-    mime_type = video_data_url.split(";")[0].split(":")[1]
-    suffix = mimetypes.guess_extension(mime_type)
+# Packs frames, in order, into grid images ("contact sheets") of up to
+# frames_per_sheet frames, labelled with their frame numbers
+def pack_contact_sheets(
+    images: list[Image.Image], frames_per_sheet: int
+) -> list[Image.Image]:
+    return [
+        create_contact_sheet(images[start : start + frames_per_sheet], start)
+        for start in range(0, len(images), frames_per_sheet)
+    ]
 
-    with tempfile.NamedTemporaryFile(suffix=suffix, delete=True) as temp_video_file:
-        print(temp_video_file.name)
-        temp_video_file.write(video_bytes)
-        temp_video_file.flush()
-        clip = VideoFileClip(temp_video_file.name)
-        images: list[Image.Image] = []
-        total_frames = cast(int, clip.reader.nframes)  # type: ignore
 
-        # Calculate frame skip interval by dividing total frames by the target number of screenshots
-        # Ensuring a minimum skip of 1 frame
-        frame_skip = max(1, math.ceil(total_frames / target_num_screenshots))
+def create_contact_sheet(images: list[Image.Image], first_index: int) -> Image.Image:
+    columns = math.ceil(math.sqrt(len(images)))
+    rows = math.ceil(len(images) / columns)
+    frame_width, frame_height = images[0].size
+    # Sized to the resolution the model downscales images to, as anything
+    # larger costs request bytes without adding detail
+    sheet_width, sheet_height = get_effective_image_size(
+        columns * frame_width, rows * frame_height
+    )
+    cell_width, cell_height = sheet_width // columns, sheet_height // rows
 
-        # Iterate over each frame in the clip
-        for i, frame in enumerate(clip.iter_frames()):
-            # Save every nth frame
-            if i % frame_skip == 0:
-                frame_image = Image.fromarray(frame)  # type: ignore
-                images.append(frame_image)
-                # Ensure that we don't capture more than the desired number of frames
-                if len(images) >= target_num_screenshots:
-                    break
+    sheet = Image.new("RGB", (cell_width * columns, cell_height * rows), "white")
+    draw = ImageDraw.Draw(sheet)
+    font = ImageFont.load_default(size=CONTACT_SHEET_LABEL_SIZE)
+    for i, image in enumerate(images):
+        x = (i % columns) * cell_width
+        y = (i // columns) * cell_height
+        # Frames are separated by a white gutter
+        frame = image.convert("RGB").resize(
+            (cell_width - CONTACT_SHEET_GUTTER, cell_height - CONTACT_SHEET_GUTTER),
+            Image.Resampling.LANCZOS,
+        )
+        sheet.paste(frame, (x, y))
 
-        # Close the video file to release resources
-        clip.close()
+        label = f"Frame {first_index + i + 1}"
+        left, top, right, bottom = draw.textbbox((x + 6, y + 6), label, font=font)
+        draw.rectangle((left - 4, top - 4, right + 4, bottom + 4), fill="black")
+        draw.text((x + 6, y + 6), label, fill="white", font=font)
+    return sheet
 
-        return images
 
+# Timestamps (in seconds) of the frames that show each UI state of the video,
+# at most max_frames of them
+def get_scene_change_timestamps(
+    path: str, width: int, height: int, fps: float, max_frames: int
+) -> list[float]:
+    frames = read_analysis_frames(path, width, height)
+    if len(frames) == 0:
+        return [0]
+    keyframes = select_keyframes(frames, max_frames)
+    print(f"Selected {len(keyframes)} keyframes out of {len(frames)} analyzed frames")
+    # Analysis frame i is the last frame at or before i / SCENE_ANALYSIS_FPS,
+    # while seeking lands on the first frame at or after the timestamp, so seek
+    # one frame earlier to stay within the same UI state
+    return [max(0, i / SCENE_ANALYSIS_FPS - 1 / fps) for i in keyframes]
+
+
+# Decodes the video at SCENE_ANALYSIS_FPS into small grayscale frames, as an
+# array of shape (frames, height, width)
+def read_analysis_frames(path: str, width: int, height: int) -> np.ndarray:
+    analysis_width = SCENE_ANALYSIS_WIDTH
+    analysis_height = max(2, round(height * analysis_width / width / 2) * 2)
+    cmd = [
+        get_setting("FFMPEG_BINARY"),
+        "-loglevel",
+        "error",
+        "-i",
+        path,
+        "-an",
+        "-vf",
+        f"fps={SCENE_ANALYSIS_FPS}:round=up,scale={analysis_width}:{analysis_height}",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "gray",
+        "-",
+    ]
+    result = subprocess.run(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
+    frame_size = analysis_width * analysis_height
+    num_frames = len(result.stdout) // frame_size
+    return np.frombuffer(
+        result.stdout[: num_frames * frame_size], dtype=np.uint8
+    ).reshape(num_frames, analysis_height, analysis_width)
+
+
+# Fraction of pixels that visibly differ between each frame of a and b
+def get_frame_differences(a: np.ndarray, b: np.ndarray) -> np.ndarray:
+    changed = np.abs(a.astype(np.int16) - b.astype(np.int16)) > SCENE_PIXEL_THRESHOLD
+    return changed.mean(axis=(-2, -1))
+
+
+def select_keyframes(frames: np.ndarray, max_frames: int) -> list[int]:
+    """
+    Picks the indices of the frames that show each UI state: the video is split
+    wherever consecutive frames differ, and each state is represented by its
+    last frame, once the UI has settled. States that look the same as the one
+    before them (e.g. a hover that came and went) are dropped, and if there
+    are still more than max_frames, evenly spaced ones are kept.
+    """
+    differences = get_frame_differences(frames[1:], frames[:-1])
+    state_starts = np.flatnonzero(differences > SCENE_CHANGE_THRESHOLD) + 1
+    keyframes = np.append(state_starts - 1, len(frames) - 1)
+
+    duplicates = (
+        get_frame_differences(frames[keyframes[1:]], frames[keyframes[:-1]])
+        <= SCENE_CHANGE_THRESHOLD
+    )
+    keyframes = np.append(keyframes[0], keyframes[1:][~duplicates])
+
+    if len(keyframes) > max_frames:
+        keep = np.unique(np.linspace(0, len(keyframes) - 1, max_frames).round())
+        keyframes = keyframes[keep.astype(int)]
+    return keyframes.tolist()
+
+
+# Decodes the frames at the given times (in seconds), one ffmpeg process per
+# frame. Seeking on the input makes ffmpeg jump to the closest keyframe instead
+# of decoding every frame before t, and the audio track is never read. The next
+# frame is decoded while the caller handles the current one.
+def read_frames_at(
+    path: str, timestamps: list[float], width: int, height: int
+) -> Iterator[Image.Image | None]:
+    processes = [start_frame_read(path, t) for t in timestamps[:1]]
+    try:
+        for next_t in timestamps[1:]:
+            processes.append(start_frame_read(path, next_t))
+            yield finish_frame_read(processes.pop(0), width, height)
+        if processes:
+            yield finish_frame_read(processes.pop(0), width, height)
+    finally:
+        for process in processes:
+            process.kill()
+            process.communicate()
+
+
+def start_frame_read(path: str, t: float) -> subprocess.Popen[bytes]:
+    cmd = [
+        get_setting("FFMPEG_BINARY"),
+        "-loglevel",
+        "error",
+        "-ss",
+        "%.06f" % t,
+        "-i",
+        path,
+        "-an",
+        "-frames:v",
+        "1",
+        "-f",
+        "rawvideo",
+        "-pix_fmt",
+        "rgb24",
+        "-",
+    ]
+    return subprocess.Popen(
+        cmd, stdin=subprocess.DEVNULL, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+    )
 
-# Save a list of PIL images to a random temporary directory
-def save_images_to_tmp(images: list[Image.Image]):
 
-    # Create a unique temporary directory
-    unique_dir_name = f"screenshots_{uuid.uuid4()}"
-    tmp_screenshots_dir = os.path.join(tempfile.gettempdir(), unique_dir_name)
-    os.makedirs(tmp_screenshots_dir, exist_ok=True)
+def finish_frame_read(
+    process: subprocess.Popen[bytes], width: int, height: int
+) -> Image.Image | None:
+    stdout, _ = process.communicate()
+    frame_size = width * height * 3
+    if len(stdout) < frame_size:
+        return None
+    return Image.frombytes("RGB", (width, height), stdout[:frame_size])
 
-    for idx, image in enumerate(images):
-        # Generate a unique image filename using index
-        image_filename = f"screenshot_{idx}.jpg"
-        tmp_filepath = os.path.join(tmp_screenshots_dir, image_filename)
-        image.save(tmp_filepath, format="JPEG")
 
-    print("Saved to " + tmp_screenshots_dir)
+# Evenly spaced timestamps (in seconds) of the frames to sample, starting with
+# the first frame and never sampling the same frame twice
+def get_sample_timestamps(
+    duration: float, fps: float, target_num_screenshots: int
+) -> list[float]:
+    total_frames = max(1, math.floor(duration * fps))
+    num_screenshots = min(target_num_screenshots, total_frames)
+    return [i * duration / num_screenshots for i in range(num_screenshots)]
 
 
 def extract_tag_content(tag: str, text: str) -> str:
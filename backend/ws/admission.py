@@ -0,0 +1,110 @@
+import asyncio
+import time
+from collections import deque
+from typing import Awaitable, Callable, Deque
+from config import MAX_CONCURRENT_GENERATIONS, MAX_QUEUED_GENERATIONS
+
+# How often waiting clients are told their queue position
+QUEUE_STATUS_INTERVAL = 2.0
+# Starting estimate for a generation's duration, before any have finished
+INITIAL_GENERATION_SECONDS = 30.0
+DURATION_SMOOTHING = 0.2
+
+
+class AdmissionRejected(Exception):
+    pass
+
+
+class AdmissionController:
+    """
+    Limits the number of code generations running in this process.
+
+    Requests beyond the limit wait in a FIFO queue (up to max_queued) and are
+    periodically told their position and estimated wait. Requests beyond the
+    queue are rejected.
+    """
+
+    def __init__(
+        self,
+        max_concurrent: int = MAX_CONCURRENT_GENERATIONS,
+        max_queued: int = MAX_QUEUED_GENERATIONS,
+    ):
+        self.max_concurrent = max_concurrent
+        self.max_queued = max_queued
+        self.active = 0
+        self.waiters: Deque["asyncio.Future[None]"] = deque()
+        self.average_duration = INITIAL_GENERATION_SECONDS
+
+        # Metrics
+        self.admitted = 0
+        self.queued = 0
+        self.rejected = 0
+
+    def estimated_wait(self, position: int) -> float:
+        # Generations finish at roughly max_concurrent per average_duration
+        return position * self.average_duration / self.max_concurrent
+
+    async def acquire(
+        self, on_wait: Callable[[int, float], Awaitable[None]]
+    ) -> float:
+        """
+        Waits for a generation slot, calling on_wait(position, estimated_wait)
+        while queued. Returns the start time to pass to release().
+        """
+        if self.active < self.max_concurrent and not self.waiters:
+            self.active += 1
+        else:
+            if len(self.waiters) >= self.max_queued:
+                self.rejected += 1
+                raise AdmissionRejected()
+
+            future: asyncio.Future[None] = asyncio.get_running_loop().create_future()
+            self.waiters.append(future)
+            self.queued += 1
+            try:
+                while not future.done():
+                    position = self.waiters.index(future) + 1
+                    await on_wait(position, self.estimated_wait(position))
+                    await asyncio.wait([future], timeout=QUEUE_STATUS_INTERVAL)
+            except BaseException:
+                if future.done() and not future.cancelled():
+                    # We were granted a slot but are giving up on it
+                    self._release_slot()
+                else:
+                    future.cancel()
+                    if future in self.waiters:
+                        self.waiters.remove(future)
+                raise
+
+        self.admitted += 1
+        return time.monotonic()
+
+    def release(self, start_time: float) -> None:
+        duration = time.monotonic() - start_time
+        self.average_duration = (
+            DURATION_SMOOTHING * duration
+            + (1 - DURATION_SMOOTHING) * self.average_duration
+        )
+        self._release_slot()
+
+    def _release_slot(self) -> None:
+        self.active -= 1
+        while self.waiters and self.active < self.max_concurrent:
+            future = self.waiters.popleft()
+            if future.done():
+                continue
+            self.active += 1
+            future.set_result(None)
+
+    def stats(self) -> dict[str, float]:
+        return {
+            "active": self.active,
+            "queue_depth": len(self.waiters),
+            "admitted": self.admitted,
+            "queued": self.queued,
+            "rejected": self.rejected,
+            "average_duration": self.average_duration,
+        }
+
+
+generation_admission = AdmissionController()
@@ -1,2 +1,13 @@
 # WebSocket protocol (RFC 6455) allows for the use of custom close codes in the range 4000-4999
 APP_ERROR_WEB_SOCKET_CODE = 4332
+# Sent by the frontend when the user cancels a generation
+USER_CLOSE_WEB_SOCKET_CODE = 4333
+
+# Sent when the generation queue is full, so that clients (or the load balancer) can retry elsewhere
+SERVER_BUSY_WEB_SOCKET_CODE = 4503
+
+# Sent when an update references a version that is no longer stored, so that the client resends the full history
+CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE = 4404
+
+# Sent when an uploaded screenshot or video is no longer stored, so that the client resends it inline
+ASSET_NOT_FOUND_WEB_SOCKET_CODE = 4410
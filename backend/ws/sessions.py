@@ -0,0 +1,158 @@
+import asyncio
+import time
+import uuid
+from typing import Any, AsyncIterator, Dict, List, Tuple
+from config import GENERATION_SESSION_BUFFER_SIZE, GENERATION_SESSION_TTL_SECONDS
+
+# A queued generation with no connected client for this long is dropped
+SESSION_RESUME_GRACE_SECONDS = 30.0
+
+
+class SessionExpired(Exception):
+    pass
+
+
+class GenerationSession:
+    """
+    The outgoing message stream of one generation.
+
+    Messages are numbered with increasing offsets and the latest buffer_size
+    (up to twice as many, as old messages are dropped in batches) are kept, so
+    that a client that reconnects can resume from the last offset it received
+    while the generation keeps running.
+    """
+
+    def __init__(
+        self, key: str | None = None, buffer_size: int = GENERATION_SESSION_BUFFER_SIZE
+    ):
+        self.id = str(uuid.uuid4())
+        # Identical requests share a session (see GenerationSessions.find_running)
+        self.key = key
+        self.buffer_size = buffer_size
+        # The messages from offset buffer_start on, in a list so that replaying
+        # from an offset doesn't have to walk the buffer
+        self.buffer: List[Dict[str, Any]] = []
+        self.buffer_start = 0
+        self.next_offset = 0
+        self.done = False
+        self.close_code = 1000
+        self.finished_at: float | None = None
+        self.changed = asyncio.Event()
+        self.task: "asyncio.Task[None] | None" = None
+
+        self.subscribers = 0
+        self.detached_at = time.monotonic()
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        if self.done:
+            return
+        self.buffer.append(message)
+        self.next_offset += 1
+        if len(self.buffer) >= 2 * self.buffer_size:
+            dropped = len(self.buffer) - self.buffer_size
+            del self.buffer[:dropped]
+            self.buffer_start += dropped
+        self._notify()
+
+    def finish(self, close_code: int = 1000) -> None:
+        if self.done:
+            return
+        self.done = True
+        self.close_code = close_code
+        self.finished_at = time.monotonic()
+        self._notify()
+
+    def _notify(self) -> None:
+        self.changed.set()
+        self.changed = asyncio.Event()
+
+    def is_abandoned(self) -> bool:
+        return (
+            self.subscribers == 0
+            and time.monotonic() - self.detached_at > SESSION_RESUME_GRACE_SECONDS
+        )
+
+    async def subscribe(
+        self, offset: int, ping_interval: float
+    ) -> AsyncIterator[Tuple[int, Dict[str, Any]] | None]:
+        """
+        Yields (offset, message) from the given offset until the session is
+        finished, and None whenever nothing was published for ping_interval.
+        """
+        self.subscribers += 1
+        try:
+            while True:
+                while offset < self.next_offset:
+                    if offset < self.buffer_start:
+                        raise SessionExpired()
+                    yield offset, self.buffer[offset - self.buffer_start]
+                    offset += 1
+
+                if self.done:
+                    return
+
+                changed = self.changed
+                try:
+                    await asyncio.wait_for(changed.wait(), ping_interval)
+                except asyncio.TimeoutError:
+                    yield None
+        finally:
+            self.subscribers -= 1
+            if self.subscribers == 0:
+                self.detached_at = time.monotonic()
+
+
+class GenerationSessions:
+    def __init__(self, ttl: float = GENERATION_SESSION_TTL_SECONDS):
+        self.ttl = ttl
+        self.sessions: Dict[str, GenerationSession] = {}
+        self.sessions_by_key: Dict[str, GenerationSession] = {}
+
+        # Metrics
+        self.created = 0
+        self.coalesced = 0
+
+    def create(self, key: str | None = None) -> GenerationSession:
+        self.remove_expired()
+        session = GenerationSession(key)
+        self.sessions[session.id] = session
+        if key is not None:
+            self.sessions_by_key[key] = session
+        self.created += 1
+        return session
+
+    def find_running(self, key: str) -> GenerationSession | None:
+        """
+        Returns the running session for an identical request, if its whole
+        stream can still be replayed to a new subscriber.
+        """
+        session = self.sessions_by_key.get(key)
+        if session is None or session.done or session.task is None:
+            return None
+        if session.buffer_start != 0:
+            return None
+        self.coalesced += 1
+        return session
+
+    def get(self, session_id: str) -> GenerationSession | None:
+        self.remove_expired()
+        return self.sessions.get(session_id)
+
+    # Finished sessions are kept for a while so that clients can still fetch the end of the stream
+    def remove_expired(self) -> None:
+        now = time.monotonic()
+        for session_id, session in list(self.sessions.items()):
+            if session.finished_at is not None and now - session.finished_at > self.ttl:
+                del self.sessions[session_id]
+                if session.key is not None and self.sessions_by_key.get(session.key) is session:
+                    del self.sessions_by_key[session.key]
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "sessions": len(self.sessions),
+            "created": self.created,
+            "coalesced": self.coalesced,
+        }
+
+
+generation_sessions = GenerationSessions()
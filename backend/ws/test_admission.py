@@ -0,0 +1,49 @@
+import asyncio
+import unittest
+from ws.admission import AdmissionController, AdmissionRejected
+
+
+class TestAdmissionController(unittest.IsolatedAsyncioTestCase):
+
+    async def test_queues_and_rejects_beyond_limits(self):
+        controller = AdmissionController(max_concurrent=1, max_queued=1)
+        positions: list[int] = []
+
+        async def on_wait(position: int, estimated_wait: float):
+            positions.append(position)
+
+        start_time = await controller.acquire(on_wait)
+        queued = asyncio.create_task(controller.acquire(on_wait))
+        await asyncio.sleep(0)
+        self.assertEqual(positions, [1])
+
+        with self.assertRaises(AdmissionRejected):
+            await controller.acquire(on_wait)
+        self.assertEqual(controller.stats()["rejected"], 1)
+
+        controller.release(start_time)
+        controller.release(await queued)
+        self.assertEqual(controller.active, 0)
+
+    async def test_disconnected_waiter_leaves_the_queue(self):
+        controller = AdmissionController(max_concurrent=1, max_queued=5)
+
+        async def on_wait(position: int, estimated_wait: float):
+            raise ConnectionError("client went away")
+
+        start_time = await controller.acquire(on_wait)
+        with self.assertRaises(ConnectionError):
+            await controller.acquire(on_wait)
+        self.assertEqual(len(controller.waiters), 0)
+
+        controller.release(start_time)
+        self.assertEqual(controller.active, 0)
+
+    def test_estimated_wait(self):
+        controller = AdmissionController(max_concurrent=4, max_queued=5)
+        controller.average_duration = 20
+        self.assertEqual(controller.estimated_wait(8), 40)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,100 @@
+import asyncio
+import unittest
+import unittest.mock
+from ws.sessions import GenerationSession, GenerationSessions, SessionExpired
+
+
+async def collect(session: GenerationSession, offset: int, ping_interval: float = 1.0):
+    return [item async for item in session.subscribe(offset, ping_interval)]
+
+
+class TestGenerationSession(unittest.IsolatedAsyncioTestCase):
+
+    async def test_resumes_from_offset(self):
+        session = GenerationSession()
+        for i in range(5):
+            session.publish({"type": "chunk", "value": str(i)})
+        session.finish()
+
+        items = await collect(session, 3)
+        self.assertEqual([offset for offset, _ in items], [3, 4])
+        self.assertEqual(items[0][1]["value"], "3")
+
+    async def test_live_subscriber_receives_new_messages(self):
+        session = GenerationSession()
+        subscriber = asyncio.create_task(collect(session, 0))
+        await asyncio.sleep(0)
+        self.assertEqual(session.subscribers, 1)
+
+        session.publish({"type": "chunk", "value": "a"})
+        session.publish({"type": "chunk", "value": "b"})
+        session.finish(4332)
+
+        items = await subscriber
+        self.assertEqual([message["value"] for _, message in items], ["a", "b"])
+        self.assertEqual(session.close_code, 4332)
+        self.assertEqual(session.subscribers, 0)
+
+    async def test_rotated_out_offset_expires(self):
+        session = GenerationSession(buffer_size=2)
+        for i in range(5):
+            session.publish({"type": "chunk", "value": str(i)})
+        session.finish()
+
+        with self.assertRaises(SessionExpired):
+            await collect(session, 1)
+        self.assertEqual(len(await collect(session, 3)), 2)
+
+    async def test_keeps_offsets_when_old_messages_are_dropped(self):
+        session = GenerationSession(buffer_size=3)
+        for i in range(10):
+            session.publish({"type": "chunk", "value": str(i)})
+        session.finish()
+
+        items = await collect(session, 7)
+        self.assertEqual([(offset, message["value"]) for offset, message in items], [(7, "7"), (8, "8"), (9, "9")])
+        self.assertLessEqual(len(session.buffer), 6)
+
+    async def test_yields_none_when_idle(self):
+        session = GenerationSession()
+        subscription = session.subscribe(0, ping_interval=0.01)
+        self.assertIsNone(await subscription.__anext__())
+        await subscription.aclose()
+
+
+class TestGenerationSessions(unittest.TestCase):
+
+    def test_removes_finished_sessions_after_ttl(self):
+        sessions = GenerationSessions(ttl=0)
+        running = sessions.create()
+        finished = sessions.create()
+        finished.finish()
+
+        self.assertIsNone(sessions.get(finished.id))
+        self.assertIs(sessions.get(running.id), running)
+
+    def test_finds_running_session_by_key(self):
+        sessions = GenerationSessions()
+        session = sessions.create("key")
+        self.assertIsNone(sessions.find_running("key"))  # Not started yet
+
+        session.task = unittest.mock.Mock()
+        self.assertIs(sessions.find_running("key"), session)
+        self.assertIsNone(sessions.find_running("other"))
+        self.assertEqual(sessions.stats()["coalesced"], 1)
+
+        session.finish()
+        self.assertIsNone(sessions.find_running("key"))
+
+    def test_does_not_share_session_without_full_replay(self):
+        sessions = GenerationSessions()
+        session = sessions.create("key")
+        session.task = unittest.mock.Mock()
+        session.buffer_size = 1
+        for i in range(3):
+            session.publish({"type": "chunk", "value": str(i)})
+        self.assertIsNone(sessions.find_running("key"))
+
+
+if __name__ == "__main__":
+    unittest.main()
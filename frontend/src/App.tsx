@@ -5,6 +5,7 @@ import { AppState, CodeGenerationParams, EditorTheme, Settings } from "./types";
 import { usePersistedState } from "./hooks/usePersistedState";
 import { USER_CLOSE_WEB_SOCKET_CODE } from "./constants";
 import { extractHistory } from "./components/history/utils";
+import { getElementPath } from "./components/select-and-edit/utils";
 import toast from "react-hot-toast";
 import { Stack } from "./lib/stacks";
 import { CodeGenerationModel, ImageGenerationModel } from "./lib/models";
@@ -38,6 +39,7 @@ function App() {
     setHead,
     appendCommitCode,
     setCommitCode,
+    setCommitVersionId,
     resetCommits,
     resetHead,
 
@@ -241,6 +243,10 @@ function App() {
       // On complete
       () => {
         setAppState(AppState.CODE_READY);
+      },
+      // On version (stored on the backend)
+      (versionId, variantIndex) => {
+        setCommitVersionId(commit.hash, variantIndex, versionId);
       }
     );
   }
@@ -302,6 +308,9 @@ function App() {
     }
 
     const updatedHistory = [...historyTree, modifiedUpdateInstruction];
+    const headCommit = commits[head];
+    const parentVersionId =
+      headCommit.variants[headCommit.selectedVariantIndex].versionId;
     const resultImage = shouldIncludeResultImage
       ? await takeScreenshot()
       : undefined;
@@ -313,6 +322,15 @@ function App() {
       resultImage,
       history: updatedHistory,
       isImportedFromCode,
+      parentVersionId,
+      // Lets the backend regenerate only the selected element
+      ...(selectedElement && {
+        updateInstruction,
+        selectedElement: {
+          path: getElementPath(selectedElement),
+          tagName: selectedElement.tagName.toLowerCase(),
+        },
+      }),
     });
 
     setUpdateInstruction("");
@@ -49,8 +49,9 @@ export function UrlInputSection({ doCreate, screenshotOneApiKey }: Props) {
           throw new Error("Failed to capture screenshot");
         }
 
+        // The backend stores the screenshot and only returns its handle
         const res = await response.json();
-        doCreate([res.url], "image");
+        doCreate([res.handle], "image");
       } catch (error) {
         console.error(error);
         toast.error(
@@ -2,6 +2,8 @@ export type CommitHash = string;
 
 export type Variant = {
   code: string;
+  // Id of this version on the backend, so that updates can reference it
+  versionId?: string;
 };
 
 export type BaseCommit = {
@@ -20,3 +20,15 @@ export function getAdjustedCoordinates(
 
   return { x: x + offsetX, y: y + offsetY };
 }
+
+// Position of the element in the page as child element indices from <body>,
+// so that the backend can find it in the generated code
+export function getElementPath(element: HTMLElement): number[] {
+  const path: number[] = [];
+  let current: Element = element;
+  while (current.parentElement && current.tagName !== "BODY") {
+    path.unshift(Array.from(current.parentElement.children).indexOf(current));
+    current = current.parentElement;
+  }
+  return path;
+}
@@ -13,6 +13,7 @@ import { Textarea } from "../ui/textarea";
 import { useEffect, useRef } from "react";
 import HistoryDisplay from "../history/HistoryDisplay";
 import Variants from "../variants/Variants";
+import { getAssetDisplayUrl } from "../../lib/assets";
 
 interface SidebarProps {
   showSelectAndEditFeature: boolean;
@@ -149,7 +150,7 @@ function Sidebar({
               {inputMode === "image" && (
                 <img
                   className="w-[340px] border border-gray-200 rounded-md"
-                  src={referenceImages[0]}
+                  src={getAssetDisplayUrl(referenceImages[0])}
                   alt="Reference"
                 />
               )}
@@ -159,7 +160,7 @@ function Sidebar({
                   autoPlay
                   loop
                   className="w-[340px] border border-gray-200 rounded-md"
-                  src={referenceImages[0]}
+                  src={getAssetDisplayUrl(referenceImages[0])}
                 />
               )}
             </div>
@@ -1,3 +1,9 @@
 //  WebSocket protocol (RFC 6455) allows for the use of custom close codes in the range 4000-4999
 export const APP_ERROR_WEB_SOCKET_CODE = 4332;
 export const USER_CLOSE_WEB_SOCKET_CODE = 4333;
+// Sent by the backend when its generation queue is full
+export const SERVER_BUSY_WEB_SOCKET_CODE = 4503;
+// Sent by the backend when an update references a version it no longer has
+export const CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE = 4404;
+// Sent by the backend when an uploaded screenshot or video is no longer stored
+export const ASSET_NOT_FOUND_WEB_SOCKET_CODE = 4410;
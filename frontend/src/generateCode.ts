@@ -2,19 +2,36 @@ import toast from "react-hot-toast";
 import { WS_BACKEND_URL, BEHIND_SAME_ALB} from "./config";
 import {
   APP_ERROR_WEB_SOCKET_CODE,
+  ASSET_NOT_FOUND_WEB_SOCKET_CODE,
+  CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE,
+  SERVER_BUSY_WEB_SOCKET_CODE,
   USER_CLOSE_WEB_SOCKET_CODE,
 } from "./constants";
 import { FullGenerationSettings } from "./types";
+import { forgetAssetHandle, isAssetHandle, toAssetHandle } from "./lib/assets";
 
 const ERROR_MESSAGE =
   "Error generating code. Check the Developer Console AND the backend logs for details. Feel free to open a Github issue.";
 
 const CANCEL_MESSAGE = "Code generation cancelled";
 
+// Reconnect attempts after an unexpected disconnect; the backend keeps the
+// generation running and replays what was missed
+const MAX_RECONNECT_ATTEMPTS = 3;
+const RECONNECT_DELAY_MS = 1000;
+
 type WebSocketResponse = {
-  type: "chunk" | "status" | "setCode" | "error";
+  type:
+    | "chunk"
+    | "status"
+    | "setCode"
+    | "error"
+    | "session"
+    | "ping"
+    | "version";
   value: string;
   variantIndex: number;
+  offset: number;
 };
 
 export function generateCode(
@@ -24,7 +41,8 @@ export function generateCode(
   onSetCode: (code: string, variantIndex: number) => void,
   onStatusUpdate: (status: string, variantIndex: number) => void,
   onCancel: () => void,
-  onComplete: () => void
+  onComplete: () => void,
+  onVersion: (versionId: string, variantIndex: number) => void
 ) {
   const protocol = window.location.protocol === 'https:' ? 'wss:' : 'ws:';
   const hostname = window.location.hostname;
@@ -37,46 +55,146 @@ export function generateCode(
   //const wsUrl = `${WS_BACKEND_URL}/generate-code`;
   console.log("Connecting to backend @ ", wsUrl);
 
-  const ws = new WebSocket(wsUrl);
-  wsRef.current = ws;
+  let sessionId: string | null = null;
+  let lastOffset = -1;
+  let reconnectAttempts = 0;
+  // The screenshot or video as given (before upload), to resend inline if the
+  // backend no longer has the uploaded asset. Screenshots of URLs are only
+  // ever handles, so there's nothing to resend for them.
+  const inlineParams = params;
+  let canResendInline = [params.image, params.resultImage].some(
+    (value) => value && !isAssetHandle(value)
+  );
 
-  ws.addEventListener("open", () => {
-    ws.send(JSON.stringify(params));
-  });
+  // Updates reference the version they build on, rather than resending the
+  // screenshot and the whole history (which the backend already has)
+  let useVersionReference =
+    params.generationType === "update" && !!params.parentVersionId;
 
-  ws.addEventListener("message", async (event: MessageEvent) => {
-    const response = JSON.parse(event.data) as WebSocketResponse;
-    if (response.type === "chunk") {
-      onChange(response.value, response.variantIndex);
-    } else if (response.type === "status") {
-      onStatusUpdate(response.value, response.variantIndex);
-    } else if (response.type === "setCode") {
-      onSetCode(response.value, response.variantIndex);
-    } else if (response.type === "error") {
-      console.error("Error generating code", response.value);
-      toast.error(response.value);
+  function getRequest() {
+    if (useVersionReference && params.history) {
+      return {
+        ...params,
+        image: undefined,
+        history: undefined,
+        instruction: params.history[params.history.length - 1],
+      };
     }
-  });
+    return { ...params, parentVersionId: undefined };
+  }
 
-  ws.addEventListener("close", (event) => {
-    console.log("Connection closed", event.code, event.reason);
-    if (event.code === USER_CLOSE_WEB_SOCKET_CODE) {
-      toast.success(CANCEL_MESSAGE);
-      onCancel();
-    } else if (event.code === APP_ERROR_WEB_SOCKET_CODE) {
-      console.error("Known server error", event);
-      onCancel();
-    } else if (event.code !== 1000) {
-      console.error("Unknown server or connection error", event);
-      toast.error(ERROR_MESSAGE);
-      onCancel();
-    } else {
-      onComplete();
-    }
-  });
+  function connect() {
+    const ws = new WebSocket(wsUrl);
+    wsRef.current = ws;
+
+    ws.addEventListener("open", () => {
+      if (sessionId) {
+        ws.send(
+          JSON.stringify({
+            resumeSessionId: sessionId,
+            resumeOffset: lastOffset + 1,
+          })
+        );
+      } else {
+        ws.send(JSON.stringify(getRequest()));
+      }
+    });
+
+    ws.addEventListener("message", async (event: MessageEvent) => {
+      const response = JSON.parse(event.data) as WebSocketResponse;
+      if (response.offset !== undefined) {
+        lastOffset = response.offset;
+        reconnectAttempts = 0;
+      }
+      if (response.type === "chunk") {
+        onChange(response.value, response.variantIndex);
+      } else if (response.type === "status") {
+        onStatusUpdate(response.value, response.variantIndex);
+      } else if (response.type === "setCode") {
+        onSetCode(response.value, response.variantIndex);
+      } else if (response.type === "version") {
+        onVersion(response.value, response.variantIndex);
+      } else if (response.type === "session") {
+        sessionId = response.value;
+      } else if (response.type === "error") {
+        console.error("Error generating code", response.value);
+        toast.error(response.value);
+      }
+    });
+
+    ws.addEventListener("close", (event) => {
+      console.log("Connection closed", event.code, event.reason);
+      if (event.code === USER_CLOSE_WEB_SOCKET_CODE) {
+        toast.success(CANCEL_MESSAGE);
+        onCancel();
+      } else if (event.code === APP_ERROR_WEB_SOCKET_CODE) {
+        console.error("Known server error", event);
+        onCancel();
+      } else if (
+        event.code === CONVERSATION_NOT_FOUND_WEB_SOCKET_CODE &&
+        useVersionReference
+      ) {
+        // The backend no longer has the version, so send everything
+        console.warn("Version not found on the backend, resending the history");
+        useVersionReference = false;
+        connect();
+      } else if (event.code === ASSET_NOT_FOUND_WEB_SOCKET_CODE && canResendInline) {
+        // The backend no longer has the upload (or the version's screenshot),
+        // so send the data URLs and the full history
+        console.warn("Uploaded asset not found on the backend, resending it inline");
+        [params.image, params.resultImage].forEach(
+          (value) => value && forgetAssetHandle(value)
+        );
+        params = {
+          ...params,
+          image: inlineParams.image,
+          resultImage: inlineParams.resultImage,
+        };
+        useVersionReference = false;
+        canResendInline = false;
+        sessionId = null;
+        lastOffset = -1;
+        connect();
+      } else if (event.code === ASSET_NOT_FOUND_WEB_SOCKET_CODE) {
+        toast.error("The screenshot or video is no longer available. Please upload it again.");
+        onCancel();
+      } else if (event.code === SERVER_BUSY_WEB_SOCKET_CODE) {
+        // The error message was already shown
+        console.error("Server busy", event);
+        onCancel();
+      } else if (
+        event.code !== 1000 &&
+        sessionId &&
+        reconnectAttempts < MAX_RECONNECT_ATTEMPTS
+      ) {
+        reconnectAttempts++;
+        console.warn(
+          `Connection lost, resuming from offset ${lastOffset + 1} (attempt ${reconnectAttempts})`
+        );
+        setTimeout(connect, RECONNECT_DELAY_MS * reconnectAttempts);
+      } else if (event.code !== 1000) {
+        console.error("Unknown server or connection error", event);
+        toast.error(ERROR_MESSAGE);
+        onCancel();
+      } else {
+        onComplete();
+      }
+    });
+
+    ws.addEventListener("error", (error) => {
+      console.error("WebSocket error", error);
+      if (!sessionId) {
+        toast.error(ERROR_MESSAGE);
+      }
+    });
+  }
 
-  ws.addEventListener("error", (error) => {
-    console.error("WebSocket error", error);
-    toast.error(ERROR_MESSAGE);
+  // Upload the screenshot or video first, so that the request only carries handles
+  Promise.all([
+    params.image ? toAssetHandle(params.image) : params.image,
+    params.resultImage ? toAssetHandle(params.resultImage) : params.resultImage,
+  ]).then(([image, resultImage]) => {
+    params = { ...params, image, resultImage };
+    connect();
   });
 }
@@ -0,0 +1,59 @@
+import { BEHIND_SAME_ALB, HTTP_BACKEND_URL } from "../config";
+
+// Screenshots and videos are uploaded once as binary and then referred to by
+// handle ("asset:<sha256>.<extension>") instead of being sent as data URLs
+const ASSET_HANDLE_PREFIX = "asset:";
+
+// Data URL -> handle, so that the same asset isn't uploaded twice
+const uploadedAssets = new Map<string, string>();
+
+function getAssetsUrl() {
+  return BEHIND_SAME_ALB
+    ? `${window.location.origin}/api/assets`
+    : `${HTTP_BACKEND_URL}/api/assets`;
+}
+
+export function isAssetHandle(value: string) {
+  return value.startsWith(ASSET_HANDLE_PREFIX);
+}
+
+// URL to display an asset (data URLs are displayed as they are)
+export function getAssetDisplayUrl(value: string) {
+  if (!isAssetHandle(value)) return value;
+  return `${getAssetsUrl()}/${value.slice(ASSET_HANDLE_PREFIX.length)}`;
+}
+
+// Forgets a handle that the backend no longer has, so that its data URL is
+// uploaded (or sent inline) again
+export function forgetAssetHandle(handle: string) {
+  for (const [value, uploaded] of uploadedAssets) {
+    if (uploaded === handle) uploadedAssets.delete(value);
+  }
+}
+
+// Uploads a data URL and returns its handle. Falls back to the data URL if the
+// upload fails, since the backend also accepts data URLs.
+export async function toAssetHandle(value: string): Promise<string> {
+  if (!value.startsWith("data:")) return value;
+
+  const uploaded = uploadedAssets.get(value);
+  if (uploaded) return uploaded;
+
+  try {
+    const blob = await (await fetch(value)).blob();
+    const response = await fetch(getAssetsUrl(), {
+      method: "POST",
+      body: blob,
+      headers: { "Content-Type": blob.type },
+    });
+    if (!response.ok) {
+      throw new Error(`Upload failed with status ${response.status}`);
+    }
+    const { handle } = await response.json();
+    uploadedAssets.set(value, handle);
+    return handle;
+  } catch (error) {
+    console.error("Failed to upload asset, sending it inline", error);
+    return value;
+  }
+}
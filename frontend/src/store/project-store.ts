@@ -25,6 +25,11 @@ interface ProjectStore {
     code: string
   ) => void;
   setCommitCode: (hash: CommitHash, numVariant: number, code: string) => void;
+  setCommitVersionId: (
+    hash: CommitHash,
+    numVariant: number,
+    versionId: string
+  ) => void;
   updateSelectedVariantIndex: (hash: CommitHash, index: number) => void;
 
   setHead: (hash: CommitHash) => void;
@@ -111,6 +116,25 @@ export const useProjectStore = create<ProjectStore>((set) => ({
         },
       };
     }),
+  setCommitVersionId: (
+    hash: CommitHash,
+    numVariant: number,
+    versionId: string
+  ) =>
+    set((state) => {
+      const commit = state.commits[hash];
+      return {
+        commits: {
+          ...state.commits,
+          [hash]: {
+            ...commit,
+            variants: commit.variants.map((variant, index) =>
+              index === numVariant ? { ...variant, versionId } : variant
+            ),
+          },
+        },
+      };
+    }),
   updateSelectedVariantIndex: (hash: CommitHash, index: number) =>
     set((state) => {
       const commit = state.commits[hash];
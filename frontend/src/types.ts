@@ -39,6 +39,16 @@ export interface CodeGenerationParams {
   resultImage?: string;
   history?: string[];
   isImportedFromCode?: boolean;
+  // Backend id of the version an update builds on
+  parentVersionId?: string;
+  // Set when the update refers to an element picked with select-and-edit
+  updateInstruction?: string;
+  selectedElement?: SelectedElement;
+}
+
+export interface SelectedElement {
+  path: number[];
+  tagName: string;
 }
 
 export type FullGenerationSettings = CodeGenerationParams & Settings;